@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Benchmark catalog indexing, rescanning and coverage queries.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_catalog.py [NUM_FONTS] [NUM_GLYPHS]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from kvenjoy.gfont import *
+from kvenjoy.catalog import Catalog
+
+def make_library(d, num_fonts, num_glyphs):
+    """Write fonts covering random subsets of CJK unified ideographs."""
+    rng = random.Random(1989)
+    stroke = [Stroke([Point(0.0, 0.0), Point(1.0, 1.0)])]
+    for i in range(num_fonts):
+        codes = sorted(rng.sample(range(0x4e00, 0x9fa6), num_glyphs))
+        with open(os.path.join(d, '{:05d}.gfont'.format(i)), 'wb') as f:
+            with FontWriter(f, 7, 'kvenjoy', 4, 'Font {}'.format(i), 'Benchmark', '', 300, '', b'',
+                            '00000000-0000-0000-0000-{:012d}'.format(i), len(codes)) as w:
+                w.write_glyphs(Glyph(c, stroke) for c in codes)
+
+def main(num_fonts, num_glyphs):
+    with tempfile.TemporaryDirectory() as d:
+        make_library(d, num_fonts, num_glyphs)
+        with Catalog(os.path.join(d, 'index.sqlite')) as catalog:
+            t = time.perf_counter()
+            catalog.update(d)
+            print('Index {} fonts\t{:.3f} s'.format(num_fonts, time.perf_counter() - t))
+            t = time.perf_counter()
+            catalog.update(d)
+            print('Rescan (unchanged)\t{:.3f} s'.format(time.perf_counter() - t))
+            t = time.perf_counter()
+            n = 100
+            for code in range(0x4e2d, 0x4e2d + n):
+                catalog.find(code)
+            print('Find\t\t{:.3f} ms'.format((time.perf_counter() - t) / n * 1e3))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 6900)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark stroke codec and font save/load time.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_codec.py [NUM_GLYPHS]
+"""
+import io
+import sys
+import time
+from kvenjoy.gfont import *
+from synth import make_font
+
+def bench(name, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    print('{}\t{:.3f} s'.format(name, best))
+
+def main(num_glyphs):
+    font = make_font(num_glyphs)
+
+    def encode():
+        stm = io.BytesIO()
+        for g in font.glyphs:
+            g.save(stm)
+        return stm.getvalue()
+    glyph_block = encode()
+
+    def decode():
+        stm = io.BytesIO(glyph_block)
+        for _ in range(num_glyphs):
+            Glyph.load(stm)
+
+    saved = io.BytesIO()
+    font.save(saved)
+    font_bytes = saved.getvalue()
+
+    bench('Encode glyphs', encode)
+    bench('Decode glyphs', decode)
+    bench('Font.save', lambda: font.save(io.BytesIO()))
+    bench('Font.load', lambda: Font.load(io.BytesIO(font_bytes)))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
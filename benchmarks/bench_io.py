@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark GFONT/GAP parse throughput.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_io.py [NUM_GLYPHS]
+"""
+import io
+import sys
+import gzip
+import time
+import zipfile
+from kvenjoy.gfont import *
+from kvenjoy.gap import *
+from synth import make_font_bytes, make_gap_bytes
+
+def bench(name, func, size, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    print('{}\t{:.3f} s\t{:.1f} MB/s'.format(name, best, size / best / 1000000))
+
+def main(num_glyphs):
+    font_bytes = make_font_bytes(num_glyphs)
+    z = zipfile.ZipFile(io.BytesIO(font_bytes))
+    font_size = sum(zi.file_size for zi in z.infolist())
+    gap_bytes = make_gap_bytes(num_glyphs)
+    gap_size = len(gzip.decompress(gap_bytes))
+
+    stm = io.BytesIO()
+    for zi in z.infolist():
+        stm.write(z.read(zi))
+    records = stm.getvalue()
+
+    def parse_records(stm):
+        for _ in range(num_glyphs):
+            Glyph.load(stm)
+
+    bench('GFONT', lambda: Font.load(io.BytesIO(font_bytes)), font_size)
+    bench('GAP', lambda: Gap.load(io.BytesIO(gap_bytes)), gap_size)
+    bench('Glyphs (stream)', lambda: parse_records(io.BytesIO(records)), len(records))
+    if 'BinaryReader' in globals():
+        bench('Glyphs (reader)', lambda: parse_records(BinaryReader(records)), len(records))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
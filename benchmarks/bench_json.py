@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON export/import of a font, verbose and compact schema.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_json.py [NUM_GLYPHS]
+"""
+import sys
+import time
+import kvenjoy.converter
+from kvenjoy.converter import *
+from synth import make_font
+
+def run(font, compact, indent):
+    t = time.perf_counter()
+    text = json_dumps(gfont_to_json(font, compact), indent)
+    t_export = time.perf_counter() - t
+    t = time.perf_counter()
+    gfont_from_json(json_loads(text))
+    t_import = time.perf_counter() - t
+    print('{:8} {:6} {:8}\t{:7.1f} MiB\texport {:.3f} s\timport {:.3f} s'.format(
+        'compact' if compact else 'verbose', str(indent), 'orjson' if kvenjoy.converter.orjson else 'json',
+        len(text) / 1024 / 1024, t_export, t_import))
+
+def main(num_glyphs):
+    font = make_font(num_glyphs)
+    orjson = kvenjoy.converter.orjson
+    for backend in ([None, orjson] if orjson else [None]):
+        kvenjoy.converter.orjson = backend
+        for compact in (False, True):
+            for indent in (4, None):
+                run(font, compact, indent)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Benchmark parallel font loading/saving with different number of workers.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_parallel.py [NUM_GLYPHS]
+"""
+import io
+import os
+import sys
+import time
+from kvenjoy.gfont import *
+from synth import make_font_bytes
+
+def main(num_glyphs):
+    font_bytes = make_font_bytes(num_glyphs)
+    workers = [None] + [n for n in (2, 4, 8, 16) if n <= (os.cpu_count() or 1)]
+    for n in workers:
+        t = time.perf_counter()
+        Font.load(io.BytesIO(font_bytes), workers=n)
+        print('Load workers {}\t{:.3f} s'.format(n or 1, time.perf_counter() - t))
+    font = Font.load(io.BytesIO(font_bytes))
+    for level in (1, -1, 9):
+        for n in workers:
+            t = time.perf_counter()
+            font.save(io.BytesIO(), workers=n, compresslevel=level)
+            print('Save workers {} level {}\t{:.3f} s'.format(n or 1, level, time.perf_counter() - t))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
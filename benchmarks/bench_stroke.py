@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory footprint and load time of glyph strokes.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_stroke.py [NUM_GLYPHS]
+"""
+import io
+import sys
+import time
+import tracemalloc
+from kvenjoy.gfont import *
+from synth import make_font_bytes
+
+def main(num_glyphs):
+    bs = make_font_bytes(num_glyphs)
+
+    t = time.perf_counter()
+    font = Font.load(io.BytesIO(bs))
+    elapsed = time.perf_counter() - t
+    del font
+
+    tracemalloc.start()
+    font = Font.load(io.BytesIO(bs))
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('Glyphs\t\t{}'.format(len(font.glyphs)))
+    print('Load time\t{:.3f} s'.format(elapsed))
+    print('Memory\t\t{:.1f} MiB'.format(size / 1024 / 1024))
+    print('Per glyph\t{:.0f} bytes'.format(size / len(font.glyphs)))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
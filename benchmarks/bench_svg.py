@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Benchmark SVG export of a font, with and without a path data cache.
+
+Usage: PYTHONPATH=./ python benchmarks/bench_svg.py [NUM_GLYPHS]
+"""
+import io
+import sys
+import time
+import tempfile
+from kvenjoy.gfont import *
+from kvenjoy.converter import *
+from synth import make_font
+
+def export(font, precision=None, cache=None):
+    t = time.perf_counter()
+    write_svg(io.StringIO(), iter_gfont_svg(font, precision=precision, cache=cache))
+    return time.perf_counter() - t
+
+def main(num_glyphs):
+    font = make_font(num_glyphs)
+    print('Glyphs\t\t\t{}'.format(len(font.glyphs)))
+    for precision in (None, 2):
+        print('Precision {}'.format(precision))
+        print('  No cache\t\t{:.3f} s'.format(export(font, precision)))
+        cache = PathCache(max_size=num_glyphs)
+        print('  Memory cache, cold\t{:.3f} s'.format(export(font, precision, cache)))
+        print('  Memory cache, warm\t{:.3f} s'.format(export(font, precision, cache)))
+        with tempfile.TemporaryDirectory() as d:
+            print('  Disk cache, cold\t{:.3f} s'.format(export(font, precision, PathCache(directory=d))))
+            print('  Disk cache, warm\t{:.3f} s'.format(export(font, precision, PathCache(directory=d))))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6900)
@@ -0,0 +1,47 @@
+"""
+Synthetic fonts for benchmarks.
+"""
+import io
+import random
+from kvenjoy.gfont import *
+from kvenjoy.gap import *
+
+def make_glyph(code, rng, num_strokes=8, num_points=12):
+    """Make a glyph with random strokes (about one third are Bezier points)."""
+    strokes = []
+    for _ in range(num_strokes):
+        points = [Point(rng.uniform(-150, 150), rng.uniform(-150, 150))]
+        for _ in range(num_points - 1):
+            if rng.random() < 0.3:
+                points.append(BezierPoint(*[rng.uniform(-150, 150) for _ in range(6)]))
+            else:
+                points.append(Point(rng.uniform(-150, 150), rng.uniform(-150, 150)))
+        strokes.append(Stroke(points))
+    return Glyph(code, strokes)
+
+def make_font(num_glyphs=6900, seed=1989):
+    """Make a font with given number of random glyphs."""
+    rng = random.Random(seed)
+    glyphs = [make_glyph(0x4e00 + i, rng) for i in range(num_glyphs)]
+    return Font(7, 'kvenjoy', 4, 'Synthetic', 'Benchmark', 'Synthetic font', 300,
+                '', b'', '00000000-0000-0000-0000-000000000000', glyphs)
+
+def make_font_bytes(num_glyphs=6900, seed=1989):
+    """Make a serialized font with given number of random glyphs."""
+    stm = io.BytesIO()
+    make_font(num_glyphs, seed).save(stm)
+    return stm.getvalue()
+
+def make_gap(num_groups=2000, seed=1989):
+    """Make a GAP with given number of random stroke groups."""
+    rng = random.Random(seed)
+    variables = [Variable(rng.uniform(-150, 150), rng.uniform(-150, 150), 'V{}'.format(i)) for i in range(16)]
+    stroke_groups = [make_glyph(0, rng, num_strokes=2).strokes for _ in range(num_groups)]
+    return Gap(1, '00000000-0000-0000-0000-000000000000', 'Synthetic', 'Benchmark', 'Synthetic GAP',
+               variables, stroke_groups)
+
+def make_gap_bytes(num_groups=2000, seed=1989):
+    """Make a serialized GAP with given number of random stroke groups."""
+    stm = io.BytesIO()
+    make_gap(num_groups, seed).save(stm)
+    return stm.getvalue()
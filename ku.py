@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
+import io
+import os
 import re
-import json
-from kvenjoy.gfont import *
-from kvenjoy.gap import *
-from kvenjoy.converter import *
+import sys
+import time
+import zlib
+
+# Modules of kvenjoy (and costly standard modules) are imported by the
+# functions that need them, so that every command only pays for what it uses.
 
 def format_point(p):
+    from kvenjoy.graph import Point, BezierPoint
     if isinstance(p, Point):
         return 'P({}, {})'.format(p.x, p.y)
     elif isinstance(p, BezierPoint):
@@ -14,9 +19,11 @@ def format_point(p):
     else:
         raise Exception('Unknown point type "{}"'.format(type(p).__name__))
 
-def dump_gfont(fn, verbose):
-    with open(fn, 'rb') as f:
-        font = Font.load(f)
+def dump_gfont(fn, verbose, jobs=None):
+    from kvenjoy.gfont import open_font
+    # Glyphs are only needed in verbose mode, parse them all up front if
+    # there are workers to do so.
+    with open_font(fn, lazy=not (verbose and jobs), workers=jobs) as font:
         print('File\t\t{}'.format(fn))
         print('Version\t\t{}'.format(font.version))
         print('Vendor\t\t{}'.format(font.vendor))
@@ -34,66 +41,82 @@ def dump_gfont(fn, verbose):
                     print('\t\t{}'.format(', '.join([format_point(p) for p in s.points])))
 
 def dump_gap(fn, verbose):
-    with open(fn, 'rb') as f:
-        gap = Gap.load(f)
-        print('File\t\t{}'.format(fn))
-        print('Version\t\t{}'.format(gap.version))
-        print('UUID\t\t{}'.format(gap.uuid))
-        print('Name\t\t{}'.format(gap.name))
-        print('Author\t\t{}'.format(gap.author))
-        print('Description\t{}'.format(gap.description))
-        print('# Variables\t{}'.format(len(gap.variables)))
-        print('# Strokes\t{}'.format(sum([len(sg) for sg in gap.stroke_groups])))
-        if verbose:
-            for v in gap.variables:
-                print('\t{}({}, {})'.format(v.name, v.x, v.y))
-            for sg in gap.stroke_groups:
-                print('\t--')
-                for s in sg:
-                    print('\t\t{}'.format(', '.join([format_point(p) for p in s.points])))
+    from kvenjoy.gap import open_gap
+    gap = open_gap(fn)
+    print('File\t\t{}'.format(fn))
+    print('Version\t\t{}'.format(gap.version))
+    print('UUID\t\t{}'.format(gap.uuid))
+    print('Name\t\t{}'.format(gap.name))
+    print('Author\t\t{}'.format(gap.author))
+    print('Description\t{}'.format(gap.description))
+    print('# Variables\t{}'.format(len(gap.variables)))
+    print('# Strokes\t{}'.format(sum([len(sg) for sg in gap.stroke_groups])))
+    if verbose:
+        for v in gap.variables:
+            print('\t{}({}, {})'.format(v.name, v.x, v.y))
+        for sg in gap.stroke_groups:
+            print('\t--')
+            for s in sg:
+                print('\t\t{}'.format(', '.join([format_point(p) for p in s.points])))
 
-def export_gap_to_svg(gap, ofn):
-    svg = gap_to_svg(gap)
-    with open(ofn, 'w') as f:
-        f.writelines(svg)
+def export_gap_to_svg(gap, ofn, precision=None):
+    from kvenjoy.converter import write_svg, iter_gap_svg
+    with open(ofn, 'w', encoding='utf-8') as f:
+        write_svg(f, iter_gap_svg(gap, precision=precision))
 
-def export_gap_to_json(gap, ofn):
-    jo = gap_to_json(gap)
-    with open(ofn, 'w') as f:
-        f.write(json.dumps(jo, indent=4))
+def export_gap_to_json(gap, ofn, compact=False, indent=4):
+    from kvenjoy.converter import gap_to_json, json_dumps
+    jo = gap_to_json(gap, compact)
+    with open(ofn, 'w', encoding='utf-8') as f:
+        f.write(json_dumps(jo, indent))
 
-def export_gap(fn, fmt, ofn):
-    with open(fn, 'rb') as f:
-        gap = Gap.load(f)
+def export_gap(fn, fmt, ofn, precision=None, compact=False, indent=4):
+    from kvenjoy.gap import open_gap
+    gap = open_gap(fn)
     if fmt == 'svg':
-        export_gap_to_svg(gap, ofn)
+        export_gap_to_svg(gap, ofn, precision)
     elif fmt == 'json':
-        export_gap_to_json(gap, ofn)
+        export_gap_to_json(gap, ofn, compact, indent)
+    elif fmt == 'jsonl':
+        raise Exception('Export GAP to JSON Lines not supported')
 
-def export_gfont_to_svg(font, ofn):
-    svg = gfont_to_svg(font)
-    with open(ofn, 'w') as f:
-        f.writelines(svg)
+def export_gfont_to_svg(font, ofn, precision=None, cache=None):
+    from kvenjoy.converter import write_svg, iter_gfont_svg
+    with open(ofn, 'w', encoding='utf-8') as f:
+        write_svg(f, iter_gfont_svg(font, precision=precision, cache=cache))
 
-def export_gfont_to_json(font, ofn):
-    jo = gfont_to_json(font)
-    with open(ofn, 'w') as f:
-        f.write(json.dumps(jo, indent=4))
+def export_gfont_to_json(font, ofn, compact=False, indent=4):
+    from kvenjoy.converter import gfont_to_json, json_dumps
+    jo = gfont_to_json(font, compact)
+    with open(ofn, 'w', encoding='utf-8') as f:
+        f.write(json_dumps(jo, indent))
 
-def export_gfont(fn, fmt, ofn):
-    with open(fn, 'rb') as f:
-        font = Font.load(f)
-    if fmt == 'svg':
-        export_gfont_to_svg(font, ofn)
-    elif fmt == 'json':
-        export_gfont_to_json(font, ofn)
+def export_gfont_to_jsonl(font, ofn, compact=False):
+    from kvenjoy.converter import iter_gfont_jsonl
+    with open(ofn, 'w', encoding='utf-8') as f:
+        f.writelines(iter_gfont_jsonl(font, compact))
+
+def export_gfont(fn, fmt, ofn, jobs=None, precision=None, cache_dir=None, compact=False, indent=4):
+    from kvenjoy.gfont import open_font
+    from kvenjoy.converter import PathCache
+    # SVG/JSON Lines are written glyph by glyph, so glyphs could be loaded on
+    # demand unless there are workers to parse them all up front.
+    with open_font(fn, lazy=(fmt in ('svg', 'jsonl') and not jobs), workers=jobs) as font:
+        if fmt == 'svg':
+            cache = None if cache_dir is None else PathCache(directory=cache_dir)
+            export_gfont_to_svg(font, ofn, precision, cache)
+        elif fmt == 'json':
+            export_gfont_to_json(font, ofn, compact, indent)
+        elif fmt == 'jsonl':
+            export_gfont_to_jsonl(font, ofn, compact)
 
 def import_gap_from_svg(ifn):
     raise Exception('Import GAP from SVG not supported yet')
 
 def import_gap_from_json(ifn):
-    with open(ifn) as f:
-        jo = json.load(f)
+    from kvenjoy.converter import gap_from_json, json_loads
+    with open(ifn, 'rb') as f:
+        jo = json_loads(f.read())
     return gap_from_json(jo)
 
 def import_gap(fn, fmt, ifn):
@@ -101,39 +124,232 @@ def import_gap(fn, fmt, ifn):
         gap = import_gap_from_svg(ifn)
     elif fmt == 'json':
         gap = import_gap_from_json(ifn)
+    elif fmt == 'jsonl':
+        raise Exception('Import GAP from JSON Lines not supported')
     with open(fn, 'wb') as f:
-        Gap.save(f, gap)
+        gap.save(f)
 
 def import_gfont_from_svg(ifn):
     raise Exception('Import GFONT from SVG not supported yet')
 
 def import_gfont_from_json(ifn):
-    with open(ifn) as f:
-        jo = json.load(f)
+    from kvenjoy.converter import gfont_from_json, json_loads
+    with open(ifn, 'rb') as f:
+        jo = json_loads(f.read())
     return gfont_from_json(jo)
 
-def import_gfont(fn, fmt, ifn):
+def import_gfont_from_jsonl(fn, ifn, jobs=None, level=zlib.Z_DEFAULT_COMPRESSION):
+    from kvenjoy.gfont import FontWriter
+    from kvenjoy.converter import read_gfont_jsonl
+    # Glyphs are parsed line by line and streamed into the output font
+    with open(ifn, 'rb') as f:
+        (jo, glyphs) = read_gfont_jsonl(f)
+        with open(fn, 'wb') as o:
+            with FontWriter(o, jo['version'], jo['vendor'], jo['type'], jo['name'], jo['author'], jo['description'],
+                            jo['boundary'], jo['password'], bytes(jo['unknown']), jo['uuid'], jo.get('num_glyphs'),
+                            jobs, level) as w:
+                w.write_glyphs(glyphs)
+
+def import_gfont(fn, fmt, ifn, jobs=None, level=zlib.Z_DEFAULT_COMPRESSION):
+    if fmt == 'jsonl':
+        return import_gfont_from_jsonl(fn, ifn, jobs, level)
     if fmt == 'svg':
         font = import_gfont_from_svg(ifn)
     elif fmt == 'json':
         font = import_gfont_from_json(ifn)
     with open(fn, 'wb') as f:
-        Font.save(f, font)
+        font.save(f, workers=jobs, compresslevel=level)
+
+def subset_gfont(fn, text, ofn):
+    from kvenjoy.gfont import open_font
+    codes = set(ord(c) for c in text)
+    # Written aside and moved into place, output could be the input which is
+    # mapped in memory while being read
+    tmp = '{}.{}.tmp'.format(ofn, os.getpid())
+    with open_font(fn) as font:
+        try:
+            with open(tmp, 'xb') as f:
+                n = font.subset(f, codes)
+            os.replace(tmp, ofn)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        missing = codes.difference(font.glyphs.codes())
+    print('Wrote {} of {} glyph(s) to {}'.format(n, len(codes), ofn))
+    if missing:
+        print('Missing: {}'.format(' '.join('U+{:04X}'.format(c) for c in sorted(missing))), file=sys.stderr)
+
+def dump_file(fn, verbose, jobs=None):
+    if file_type(fn) == 'gap':
+        dump_gap(fn, verbose)
+    else:
+        dump_gfont(fn, verbose, jobs)
+
+def export_file(fn, fmt, ofn, jobs=None, precision=None, cache_dir=None, compact=False, indent=4):
+    if file_type(fn) == 'gap':
+        export_gap(fn, fmt, ofn, precision, compact, indent)
+    else:
+        export_gfont(fn, fmt, ofn, jobs, precision, cache_dir, compact, indent)
+
+def import_file(fn, fmt, ifn, jobs=None, level=zlib.Z_DEFAULT_COMPRESSION):
+    if output_type(fn) == 'gap':
+        import_gap(fn, fmt, ifn)
+    else:
+        import_gfont(fn, fmt, ifn, jobs, level)
+
+def parse_code(s):
+    # Accept a single character, "U+4E2D" or "0x4e2d"
+    m = re.match(r'^(?:[uU]\+|0[xX])([0-9a-fA-F]+)$', s)
+    if m:
+        return int(m.group(1), 16)
+    if len(s) == 1:
+        return ord(s)
+    raise Exception('Invalid character "{}"'.format(s))
+
+def index_dir(d, db, codes, scan, verbose):
+    from kvenjoy.catalog import Catalog
+    with Catalog(db or os.path.join(d, '.kvenjoy.sqlite')) as catalog:
+        if scan:
+            r = catalog.update(d)
+            print('Added {}, updated {}, removed {}, unchanged {}'.format(r.added, r.updated, r.removed, r.unchanged))
+        if verbose:
+            for f in catalog.files():
+                if f.error is not None:
+                    print('{}\tERROR: {}'.format(f.path, f.error))
+                else:
+                    print('{}\t{}\t{}\t{}\t{}'.format(f.path, f.type, f.name, f.uuid, f.num_glyphs))
+        for code in codes:
+            fonts = catalog.find(code)
+            print('U+{:04X}\t{} font(s)'.format(code, len(fonts)))
+            for f in fonts:
+                print('\t{}\t{}'.format(f.path, f.name))
+
+def run_task(func, args, capture=False):
+    # Exceptions are returned rather than raised, so that one bad file does
+    # not abort a batch.
+    import contextlib
+    out = io.StringIO()
+    t = time.perf_counter()
+    try:
+        if capture:
+            with contextlib.redirect_stdout(out):
+                func(*args)
+        else:
+            func(*args)
+        error = None
+    except Exception as e:
+        error = '{}: {}'.format(e.__class__.__name__, e)
+    return (error, time.perf_counter() - t, out.getvalue())
+
+def run_batch(tasks, jobs=None, capture=False):
+    # Yields (task, error, elapsed, output) of (input, output, func, args)
+    # tasks as they finish, at most jobs tasks run at once in worker
+    # processes.
+    import concurrent.futures
+    if not jobs or jobs <= 1:
+        for task in tasks:
+            yield (task,) + run_task(task[2], task[3], capture)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(run_task, task[2], task[3], capture): task for task in tasks}
+        for f in concurrent.futures.as_completed(futures):
+            try:
+                r = f.result()
+            except Exception as e:
+                # Worker process died
+                r = ('{}: {}'.format(e.__class__.__name__, e), None, '')
+            yield (futures[f],) + r
+
+def batch(command, tasks, jobs=None, summary=None, capture=False):
+    # Output of tasks goes to stdout and results to stderr as tasks finish,
+    # return number of failed tasks.
+    t = time.perf_counter()
+    results = {}
+    for (task, error, elapsed, output) in run_batch(tasks, jobs, capture):
+        if output:
+            sys.stdout.write(output)
+            print()
+            sys.stdout.flush()
+        (ifn, ofn) = task[:2]
+        name = ifn if ofn is None else '{} -> {}'.format(ifn, ofn)
+        if error is None:
+            print('OK\t{:.3f} s\t{}'.format(elapsed, name), file=sys.stderr)
+        else:
+            print('FAILED\t{}\t{}'.format(name, error), file=sys.stderr)
+        results[id(task)] = {'input': ifn, 'output': ofn, 'elapsed': elapsed, 'error': error}
+    failed = sum(1 for r in results.values() if r['error'] is not None)
+    elapsed = time.perf_counter() - t
+    print('{} file(s), {} failed, {:.3f} s'.format(len(tasks), failed, elapsed), file=sys.stderr)
+    if summary is not None:
+        jo = {'command': command, 'jobs': jobs, 'elapsed': elapsed,
+              'succeeded': len(tasks) - failed, 'failed': failed,
+              'files': [results[id(task)] for task in tasks]}
+        from kvenjoy.converter import json_dumps
+        with open(summary, 'w', encoding='utf-8') as f:
+            f.write(json_dumps(jo, 2))
+    return failed
+
+def run_single(name, func, args):
+    # A single file fails like a task of a batch: the error is reported
+    # without a traceback and the exit status is non-zero.
+    try:
+        func(*args)
+    except Exception as e:
+        print('{}: {}'.format(name, e), file=sys.stderr)
+        sys.exit(1)
+
+def split_jobs(jobs, num_files):
+    # Jobs are processes to run files through if there are many files,
+    # workers of the file otherwise: return (batch jobs, jobs of a file)
+    if num_files > 1:
+        return (jobs, None)
+    return (None, jobs)
+
+def batch_output(ofn, num_files):
+    # Output is a directory if there are many files or it's an existing one
+    if num_files > 1 or os.path.isdir(ofn):
+        os.makedirs(ofn, exist_ok=True)
+        return True
+    return False
+
+def imported_name(ifn, fmt):
+    # a.gfont.json -> a.gfont
+    name = os.path.basename(ifn)
+    if not name.endswith('.' + fmt):
+        raise Exception('Cannot name imported file of "{}" (no ".{}" suffix)'.format(ifn, fmt))
+    return name[:-len(fmt) - 1]
+
+def serve(socket_path, host, port, cache_size, root, verbose):
+    from kvenjoy.server import Service, make_unix_server, make_http_server
+    service = Service(cache_size, root)
+    if socket_path is not None:
+        server = make_unix_server(socket_path, service)
+        print('Listening on {}'.format(socket_path), file=sys.stderr)
+    else:
+        server = make_http_server(host, port, service, verbose)
+        print('Listening on http://{}:{}/'.format(*server.server_address[:2]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
 
 def file_type(fn):
-    # Check extension name first
-    if re.search(r'\.gap$', fn):
-        return 'gap'
-    if re.search(r'\.gfont$', fn):
-        return 'gfont'
+    # File content decides, unknown files are rejected
+    from kvenjoy.sniff import detect
+    return detect(fn).type
 
-    # Check file content
-    with open(fn, 'rb') as f:
-        bs = f.read(4)
-        (magic,) = struct.unpack_from('>H', bs, 0)
-    # GAP file is gzipped so check against GZIP magic would work
-    if magic == 0x1f8b:
+def output_type(fn):
+    # Extension decides for files to be written, content if there is none
+    if fn.endswith('.gap'):
         return 'gap'
+    if fn.endswith('.gfont'):
+        return 'gfont'
+    if os.path.exists(fn):
+        return file_type(fn)
     return 'gfont'
 
 if __name__ == '__main__':
@@ -144,41 +360,146 @@ if __name__ == '__main__':
     sp = p.add_subparsers(dest='command')
 
     p_dump = sp.add_parser('dump', description='Dump GFONT/GAP files(s)')
+    p_dump.add_argument('-j', '--jobs', metavar='N', type=int,
+                        help='Number of worker processes to parse glyphs (to process files if many)')
+    p_dump.add_argument('--summary', metavar='FILE',
+                        help='Write results of many files to a JSON file')
     p_dump.add_argument('gfiles', metavar='GFILE', type=str, nargs='+',
                         help='A GFONT/GAP file')
 
-    p_export = sp.add_parser('export', description='Export a GFONT/GAP file')
-    p_export.add_argument('-f', '--format', choices=['svg', 'json'],
+    p_export = sp.add_parser('export', description='Export GFONT/GAP file(s)')
+    p_export.add_argument('-f', '--format', choices=['svg', 'json', 'jsonl'], required=True,
                           help='Ouput format')
     p_export.add_argument('-o', '--output', metavar='OUTPUT', required=True,
-                          help='Ouput file')
-    p_export.add_argument('gfile', metavar='GFILE', type=str,
+                          help='Ouput file (directory if many files, outputs are named GFILE.FORMAT)')
+    p_export.add_argument('-j', '--jobs', metavar='N', type=int,
+                          help='Number of worker processes to parse glyphs (to process files if many)')
+    p_export.add_argument('--summary', metavar='FILE',
+                          help='Write results of many files to a JSON file')
+    p_export.add_argument('-p', '--precision', metavar='DIGITS', type=int,
+                          help='Number of digits after decimal point of SVG coordinates (default: exact)')
+    p_export.add_argument('--cache', metavar='DIR',
+                          help='Directory to cache SVG path data of glyphs across exports')
+    p_export.add_argument('-c', '--compact', action='store_true',
+                          help='Store strokes of JSON as flat coordinates arrays (compact schema)')
+    p_export.add_argument('--no-indent', dest='indent', action='store_const', const=None, default=4,
+                          help='Do not indent JSON (orjson is used if installed)')
+    p_export.add_argument('gfiles', metavar='GFILE', type=str, nargs='+',
                           help='A GFONT/GAP file')
 
-    p_import = sp.add_parser('import', description='Import a GFONT/GAP file')
-    p_import.add_argument('-f', '--format', choices=['svg', 'json'],
+    p_import = sp.add_parser('import', description='Import GFONT/GAP file(s)',
+                             epilog='Either "-i INPUT GFILE" or "-o OUTPUT INPUT..." (outputs of many '
+                                    'files are named after inputs without ".FORMAT" suffix)')
+    p_import.add_argument('-f', '--format', choices=['svg', 'json', 'jsonl'], required=True,
                           help='Input format')
-    p_import.add_argument('-i', '--input', metavar='INPUT', required=True,
+    p_import.add_argument('-i', '--input', metavar='INPUT',
                           help='Input file')
-    p_import.add_argument('gfile', metavar='GFILE', type=str,
-                          help='A GFONT/GAP file')
+    p_import.add_argument('-o', '--output', metavar='OUTPUT',
+                          help='Output file (directory if many files)')
+    p_import.add_argument('-j', '--jobs', metavar='N', type=int,
+                          help='Number of worker threads to compress glyphs (processes to process files if many)')
+    p_import.add_argument('--summary', metavar='FILE',
+                          help='Write results of many files to a JSON file')
+    p_import.add_argument('-l', '--level', metavar='LEVEL', type=int, choices=range(-1, 10),
+                          default=zlib.Z_DEFAULT_COMPRESSION,
+                          help='Compression level of glyphs (0-9, -1 for default)')
+    p_import.add_argument('gfiles', metavar='FILE', type=str, nargs='+',
+                          help='Output GFONT/GAP file (with -i) or input files (with -o)')
+
+    p_subset = sp.add_parser('subset', description='Extract glyphs of some characters from a GFONT file',
+                             epilog='Zipped glyphs are copied as is, strokes are never parsed')
+    p_subset.add_argument('--chars', metavar='TEXT', required=True,
+                          help='Characters to keep')
+    p_subset.add_argument('-o', '--output', metavar='OUTPUT', required=True,
+                          help='Output GFONT file')
+    p_subset.add_argument('gfile', metavar='GFILE', type=str,
+                          help='A GFONT file')
+
+    p_index = sp.add_parser('index', description='Index GFONT/GAP files under a directory and search the index')
+    p_index.add_argument('--db', metavar='DB',
+                         help='Index database (default: DIR/.kvenjoy.sqlite)')
+    p_index.add_argument('-c', '--covers', metavar='CHAR', type=parse_code, action='append', default=[],
+                         help='Find fonts covering a character (e.g. U+4E2D)')
+    p_index.add_argument('-n', '--no-scan', action='store_true',
+                         help='Do not rescan the directory')
+    p_index.add_argument('dir', metavar='DIR', type=str,
+                         help='A directory')
+
+    p_serve = sp.add_parser('serve', description='Answer dump/export/render requests from fonts kept in memory',
+                            epilog='Requests are JSON lines ({"op": "render", "path": "a.gfont", "code": "U+4E2D"}) '
+                                   'over the socket or HTTP GET requests (/render?path=a.gfont&code=U%2B4E2D)')
+    g_serve = p_serve.add_mutually_exclusive_group(required=True)
+    g_serve.add_argument('-s', '--socket', metavar='PATH',
+                         help='Listen on a Unix socket')
+    g_serve.add_argument('-p', '--port', metavar='PORT', type=int,
+                         help='Listen on a HTTP port')
+    p_serve.add_argument('--host', metavar='HOST', default='127.0.0.1',
+                         help='Address of HTTP port (default: 127.0.0.1)')
+    p_serve.add_argument('-n', '--cache-size', metavar='N', type=int, default=256,
+                         help='Maximum number of fonts kept open (default: 256)')
+    g_root = p_serve.add_mutually_exclusive_group()
+    g_root.add_argument('-r', '--root', metavar='DIR', default=os.curdir,
+                        help='Only serve files under this directory (default: current directory)')
+    g_root.add_argument('--any-path', dest='root', action='store_const', const=None,
+                        help='Serve any file readable by this process')
 
     args = p.parse_args()
 
+    # With many files, jobs are processes to run files through and each
+    # file is processed by a single process. A single file with a summary
+    # goes through a batch too, processed in this process with its workers.
     if args.command == 'dump':
-        for fn in args.gfiles:
-            if file_type(fn) == 'gap':
-                dump_gap(fn, args.verbose)
-            else:
-                dump_gfont(fn, args.verbose)
+        if len(args.gfiles) == 1 and args.summary is None:
+            run_single(args.gfiles[0], dump_file, (args.gfiles[0], args.verbose, args.jobs))
             print()
+        else:
+            (batch_jobs, file_jobs) = split_jobs(args.jobs, len(args.gfiles))
+            tasks = [(fn, None, dump_file, (fn, args.verbose, file_jobs)) for fn in args.gfiles]
+            if batch('dump', tasks, batch_jobs, args.summary, capture=True):
+                sys.exit(1)
     elif args.command == 'export':
-        if file_type(args.gfile) == 'gap':
-            export_gap(args.gfile, args.format, args.output)
+        directory = batch_output(args.output, len(args.gfiles))
+        if not directory and args.summary is None:
+            run_single(args.gfiles[0], export_file, (args.gfiles[0], args.format, args.output, args.jobs,
+                                                     args.precision, args.cache, args.compact, args.indent))
         else:
-            export_gfont(args.gfile, args.format, args.output)
+            (batch_jobs, file_jobs) = split_jobs(args.jobs, len(args.gfiles))
+            tasks = []
+            for fn in args.gfiles:
+                ofn = args.output
+                if directory:
+                    ofn = os.path.join(args.output, os.path.basename(fn) + '.' + args.format)
+                tasks.append((fn, ofn, export_file, (fn, args.format, ofn, file_jobs, args.precision, args.cache,
+                                                     args.compact, args.indent)))
+            if batch('export', tasks, batch_jobs, args.summary):
+                sys.exit(1)
     elif args.command == 'import':
-        if file_type(args.gfile) == 'gap':
-            import_gap(args.gfile, args.format, args.input)
+        if args.input is not None:
+            if args.output is not None or len(args.gfiles) != 1:
+                p_import.error('-i INPUT takes exactly one output GFILE and no -o')
+            (directory, pairs) = (False, [(args.input, args.gfiles[0])])
+        elif args.output is None:
+            p_import.error('either -i INPUT or -o OUTPUT is required')
+        else:
+            directory = batch_output(args.output, len(args.gfiles))
+            pairs = []
+            for ifn in args.gfiles:
+                try:
+                    fn = os.path.join(args.output, imported_name(ifn, args.format)) if directory else args.output
+                except Exception as e:
+                    p_import.error(str(e))
+                pairs.append((ifn, fn))
+        if not directory and args.summary is None:
+            (ifn, fn) = pairs[0]
+            run_single(ifn, import_file, (fn, args.format, ifn, args.jobs, args.level))
         else:
-            import_gfont(args.gfile, args.format, args.input)
+            (batch_jobs, file_jobs) = split_jobs(args.jobs, len(pairs))
+            tasks = [(ifn, fn, import_file, (fn, args.format, ifn, file_jobs, args.level)) for (ifn, fn) in pairs]
+            if batch('import', tasks, batch_jobs, args.summary):
+                sys.exit(1)
+    elif args.command == 'subset':
+        run_single(args.gfile, subset_gfont, (args.gfile, args.chars, args.output))
+    elif args.command == 'serve':
+        serve(args.socket, args.host, args.port, args.cache_size, args.root, args.verbose)
+    elif args.command == 'index':
+        index_dir(args.dir, args.db, args.covers, not args.no_scan, args.verbose)
@@ -0,0 +1,44 @@
+"""
+Utilities to manipulate Kvenjoy GFONT/GAP files.
+
+Main classes and functions of submodules are exposed as attributes of the
+package (e.g. kvenjoy.open_font), submodules are only imported on first
+access of their attributes so importing the package costs next to nothing.
+"""
+import importlib
+
+_submodules = ('archive', 'catalog', 'cipher', 'converter', 'gap', 'gfont', 'graph', 'io', 'server', 'sniff', 'tea')
+
+# Public names and submodules providing them
+_exports = {
+    'Font': 'gfont',
+    'FontWriter': 'gfont',
+    'Glyph': 'gfont',
+    'LazyGlyphList': 'gfont',
+    'open_font': 'gfont',
+    'Gap': 'gap',
+    'Variable': 'gap',
+    'open_gap': 'gap',
+    'Point': 'graph',
+    'BezierPoint': 'graph',
+    'Stroke': 'graph',
+    'PathCache': 'converter',
+    'Catalog': 'catalog',
+    'FileInfo': 'sniff',
+    'detect': 'sniff',
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('kvenjoy.' + name)
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError("module 'kvenjoy' has no attribute '{}'".format(name))
+    value = getattr(importlib.import_module('kvenjoy.' + module), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules) | set(_exports))
@@ -0,0 +1,225 @@
+"""
+Low level access to members of the zipped glyphs archive.
+
+Members are read directly from the stream (or memory mapping) at the offsets
+recorded in the ZIP central directory, without going through ZipFile.open().
+ZipWriter writes members with already compressed content.
+"""
+import time
+import zlib
+import struct
+import collections
+
+# Compression methods (same as zipfile's), zipfile itself is only imported
+# for archives not handled here since it's costly to import
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Lightweight (and picklable) stand-in for ZipInfo, has all the fields used here
+MemberInfo = collections.namedtuple('MemberInfo', ('filename', 'header_offset', 'compress_type', 'CRC',
+                                                   'compress_size', 'file_size'))
+
+# ZIP local file header (see APPNOTE.TXT 4.3.7)
+_local_header = struct.Struct('<4s2B4HL2L2H')
+_local_magic = b'PK\x03\x04'
+
+def read_raw_member(stm, zi):
+    """Read the compressed content of a ZIP member.
+
+    Arguments:
+    stm    -- Seekable input stream or mmap of the archive.
+    zi     -- ZipInfo of the member (from the central directory).
+    return -- Compressed bytes of the member.
+    """
+    stm.seek(zi.header_offset)
+    header = stm.read(_local_header.size)
+    if len(header) != _local_header.size:
+        raise Exception('Truncated ZIP member "{}"'.format(zi.filename))
+    fields = _local_header.unpack(header)
+    if fields[0] != _local_magic:
+        raise Exception('Bad ZIP local header for "{}"'.format(zi.filename))
+    (name_size, extra_size) = fields[-2:]
+    stm.seek(zi.header_offset + _local_header.size + name_size + extra_size)
+    raw = stm.read(zi.compress_size)
+    if len(raw) != zi.compress_size:
+        raise Exception('Truncated ZIP member "{}"'.format(zi.filename))
+    return raw
+
+def inflate_member(raw, zi):
+    """Decompress and verify raw content of a ZIP member.
+
+    Arguments:
+    raw    -- Compressed bytes of the member.
+    zi     -- ZipInfo of the member.
+    return -- Decompressed bytes.
+    """
+    if zi.compress_type == ZIP_DEFLATED:
+        data = zlib.decompress(raw, -zlib.MAX_WBITS)
+    elif zi.compress_type == ZIP_STORED:
+        data = raw
+    else:
+        raise Exception('Unsupported compression method {} for "{}"'.format(zi.compress_type, zi.filename))
+    if zlib.crc32(data) != zi.CRC:
+        raise Exception('Bad CRC-32 for ZIP member "{}"'.format(zi.filename))
+    return data
+
+def read_member(stm, zi):
+    """Read and decompress a ZIP member.
+
+    Arguments:
+    stm    -- Seekable input stream or mmap of the archive.
+    zi     -- ZipInfo of the member.
+    return -- Decompressed bytes.
+    """
+    return inflate_member(read_raw_member(stm, zi), zi)
+
+# ZIP central directory file header and end of central directory record
+_central_header = struct.Struct('<4s4B4HL2L5H2L')
+_central_magic = b'PK\x01\x02'
+_end_record = struct.Struct('<4s4H2LH')
+_end_magic = b'PK\x05\x06'
+
+def read_directory(stm):
+    """Read the central directory of a ZIP archive.
+
+    This is much cheaper than zipfile.ZipFile(stm).infolist() for archives of
+    many small members. Archives that use features not handled here (e.g.
+    ZIP64) are handed over to zipfile.
+
+    Arguments:
+    stm    -- Seekable input stream or mmap of the archive (data might be
+              prepended to the archive).
+    return -- List of MemberInfo (or ZipInfo) in central directory order.
+    """
+    stm.seek(0, 2)
+    file_size = stm.tell()
+    # Look for the end record, without archive comment first
+    tail_size = min(file_size, _end_record.size)
+    stm.seek(file_size - tail_size)
+    tail = stm.read(tail_size)
+    pos = tail.rfind(_end_magic)
+    if pos < 0 or len(tail) - pos < _end_record.size:
+        tail_size = min(file_size, _end_record.size + 0xffff)
+        stm.seek(file_size - tail_size)
+        tail = stm.read(tail_size)
+        pos = tail.rfind(_end_magic)
+        if pos < 0 or len(tail) - pos < _end_record.size:
+            raise Exception('Bad ZIP archive (end of central directory not found)')
+    (_, disk, cd_disk, _, count, cd_size, cd_offset, _) = _end_record.unpack_from(tail, pos)
+    end_pos = file_size - tail_size + pos
+    if disk != 0 or cd_disk != 0 or count == 0xffff or cd_offset == 0xffffffff or end_pos < cd_size:
+        return _infolist(stm)
+
+    # Offsets are relative to the archive which might not start at 0
+    concat = end_pos - cd_size - cd_offset
+    stm.seek(end_pos - cd_size)
+    cd = stm.read(cd_size)
+    if len(cd) != cd_size:
+        raise Exception('Truncated ZIP central directory')
+    infos = []
+    unpack_from = _central_header.unpack_from
+    header_size = _central_header.size
+    offset = 0
+    for _ in range(count):
+        if offset + header_size > cd_size:
+            raise Exception('Truncated ZIP central directory')
+        (magic, _, _, _, _, flags, compress_type, _, _, crc, compress_size, size,
+         name_size, extra_size, comment_size, _, _, _, header_offset) = unpack_from(cd, offset)
+        if magic != _central_magic:
+            raise Exception('Bad ZIP central directory')
+        if compress_size == 0xffffffff or size == 0xffffffff or header_offset == 0xffffffff:
+            return _infolist(stm)
+        offset += header_size
+        name = cd[offset:offset + name_size]
+        if name.isascii():
+            name = name.decode('ascii')
+        else:
+            name = name.decode('utf-8' if flags & 0x800 else 'cp437')
+        offset += name_size + extra_size + comment_size
+        infos.append(MemberInfo(name, header_offset + concat, compress_type, crc, compress_size, size))
+    return infos
+
+def _infolist(stm):
+    import zipfile
+    return zipfile.ZipFile(stm).infolist()
+
+def deflate(data, level=zlib.Z_DEFAULT_COMPRESSION):
+    """Compress data as raw DEFLATE stream (as stored in ZIP members).
+
+    Arguments:
+    data   -- Data to be compressed.
+    level  -- Compression level (0-9, -1 for zlib default).
+    return -- Compressed bytes.
+    """
+    c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+class ZipWriter:
+    """Writes a ZIP archive member by member to an output stream.
+
+    Members are written with already compressed content, so compression could
+    be done elsewhere (e.g. in parallel) or skipped entirely for members
+    copied from another archive. The output stream does not need to be
+    seekable, member offsets are relative to the start of the archive.
+
+    NOTE: ZIP64 extensions are not supported.
+    """
+
+    def __init__(self, stm, date_time=None):
+        """Arguments:
+        stm       -- The output stream.
+        date_time -- Modification time (time.struct_time) of members, now if None.
+        """
+        if date_time is None:
+            date_time = time.localtime()
+        (year, month, day, hour, minute, second) = date_time[:6]
+        self._dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+        self._dos_time = hour << 11 | minute << 5 | (second // 2)
+        self._stm = stm
+        self._offset = 0
+        self._entries = []
+
+    def write(self, name, data, level=zlib.Z_DEFAULT_COMPRESSION):
+        """Compress and write a member.
+
+        Arguments:
+        name  -- Member file name.
+        data  -- Uncompressed content.
+        level -- Compression level (0-9, -1 for zlib default).
+        """
+        self.write_raw(name, deflate(data, level), zlib.crc32(data), len(data))
+
+    def write_raw(self, name, raw, crc, size, compress_type=ZIP_DEFLATED):
+        """Write a member with already compressed content.
+
+        Arguments:
+        name          -- Member file name.
+        raw           -- Compressed content.
+        crc           -- CRC-32 of uncompressed content.
+        size          -- Size of uncompressed content.
+        compress_type -- ZIP_DEFLATED or ZIP_STORED.
+        """
+        if len(self._entries) >= 0xffff or self._offset + len(raw) > 0xffffffff:
+            raise Exception('ZIP archive too big (ZIP64 is not supported)')
+        name = name.encode('utf-8')
+        header = _local_header.pack(_local_magic, 20, 0, 0, compress_type, self._dos_time, self._dos_date,
+                                    crc, len(raw), size, len(name), 0)
+        self._stm.write(header)
+        self._stm.write(name)
+        self._stm.write(raw)
+        self._entries.append((name, compress_type, crc, len(raw), size, self._offset))
+        self._offset += len(header) + len(name) + len(raw)
+
+    def close(self):
+        """Write central directory, the stream is not closed."""
+        start = self._offset
+        for (name, compress_type, crc, compress_size, size, offset) in self._entries:
+            header = _central_header.pack(_central_magic, 20, 3, 20, 0, 0, compress_type,
+                                          self._dos_time, self._dos_date, crc, compress_size, size,
+                                          len(name), 0, 0, 0, 0, 0o600 << 16, offset)
+            self._stm.write(header)
+            self._stm.write(name)
+            self._offset += len(header) + len(name)
+        self._stm.write(_end_record.pack(_end_magic, 0, 0, len(self._entries), len(self._entries),
+                                         self._offset - start, start, 0))
+        self._entries = []
@@ -0,0 +1,197 @@
+"""
+Catalog of GFONT/GAP files backed by a SQLite database.
+
+Only headers (and the ZIP central directory of fonts) are read when files are
+indexed, files with unchanged size and modification time are not read again
+on later scans. Character codes covered by fonts are kept in an inverted
+index so fonts covering a character could be found without touching files.
+"""
+import os
+import sys
+import sqlite3
+import collections
+from array import array
+import kvenjoy.gfont
+import kvenjoy.gap
+import kvenjoy.sniff
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    type        TEXT NOT NULL,
+    mtime       INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    version     INTEGER,
+    vendor      TEXT,
+    name        TEXT,
+    author      TEXT,
+    description TEXT,
+    uuid        TEXT,
+    num_glyphs  INTEGER,
+    error       TEXT,
+    codes       BLOB
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    code INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    PRIMARY KEY (code, file)
+) WITHOUT ROWID;
+'''
+
+# File extensions of indexed files
+_TYPES = {'.gfont': 'gfont', '.gap': 'gap'}
+
+FileRecord = collections.namedtuple('FileRecord', ('path', 'type', 'mtime', 'size', 'version', 'vendor', 'name',
+                                                   'author', 'description', 'uuid', 'num_glyphs', 'error'))
+
+ScanResult = collections.namedtuple('ScanResult', ('added', 'updated', 'removed', 'unchanged'))
+
+class Catalog:
+    """Index of GFONT/GAP files.
+
+    Files are identified by absolute path, modification time is recorded in
+    nanoseconds. Files that could not be read are recorded with an error
+    message so they're not read again until they change.
+    """
+
+    def __init__(self, path):
+        """Arguments:
+        path -- Path of the SQLite database (created if not exist).
+        """
+        self._db = sqlite3.connect(path)
+        # Coverage of a font is spread all over the index, a bigger page cache
+        # saves most of the disk round trips when inserting it
+        self._db.execute('PRAGMA cache_size = -65536')
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def update(self, root):
+        """Scan a directory recursively and update the catalog.
+
+        Arguments:
+        root   -- The directory.
+        return -- ScanResult with number of added/updated/removed/unchanged files.
+        """
+        root = os.path.abspath(root)
+        known = {path: (fid, mtime, size) for (fid, path, mtime, size)
+                 in self._db.execute('SELECT id, path, mtime, size FROM files')}
+        (added, updated, unchanged) = (0, 0, 0)
+        seen = set()
+        with self._db:
+            for (path, type) in _walk(root):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                old = known.get(path)
+                if old is not None:
+                    if old[1:] == (st.st_mtime_ns, st.st_size):
+                        unchanged += 1
+                        continue
+                    self._remove(old[0])
+                    updated += 1
+                else:
+                    added += 1
+                self._add(path, type, st)
+
+            prefix = os.path.join(root, '')
+            removed = 0
+            for (path, (fid, mtime, size)) in known.items():
+                if path.startswith(prefix) and path not in seen:
+                    self._remove(fid)
+                    removed += 1
+        return ScanResult(added, updated, removed, unchanged)
+
+    def files(self):
+        """Return FileRecord of all files in the catalog (sorted by path)."""
+        return [FileRecord(*row) for row in self._db.execute(
+            'SELECT {} FROM files ORDER BY path'.format(', '.join(FileRecord._fields)))]
+
+    def find(self, code):
+        """Find fonts covering given character code.
+
+        Arguments:
+        code   -- Character code (UNICODE).
+        return -- List of FileRecord (sorted by path).
+        """
+        return [FileRecord(*row) for row in self._db.execute(
+            'SELECT {} FROM coverage JOIN files ON files.id = coverage.file WHERE code = ? ORDER BY path'.format(
+                ', '.join('files.' + f for f in FileRecord._fields)), (code,))]
+
+    def coverage(self, path):
+        """Return character codes covered by a font (in archive order).
+
+        Arguments:
+        path   -- Path of the font.
+        return -- List of character codes, None if the file is not in the catalog.
+        """
+        row = self._db.execute('SELECT codes FROM files WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        return list(_unpack_codes(row[0]))
+
+    def _add(self, path, type, st):
+        fields = dict(version=None, vendor=None, name=None, author=None, description=None, uuid=None,
+                      num_glyphs=None, error=None)
+        codes = array('I')
+        try:
+            # Files of other formats are rejected without being loaded
+            if kvenjoy.sniff.detect(path).type != type:
+                raise Exception('Not a {} file'.format(type.upper()))
+            if type == 'gfont':
+                with kvenjoy.gfont.open_font(path) as font:
+                    codes = array('I', font.glyphs.codes())
+                    fields.update(version=font.version, vendor=font.vendor, name=font.name, author=font.author,
+                                  description=font.description, uuid=font.uuid, num_glyphs=len(codes))
+            else:
+                with open(path, 'rb') as f:
+                    (version, uuid, name, author, description) = kvenjoy.gap.Gap.load_header(f)
+                fields.update(version=version, name=name, author=author, description=description, uuid=uuid)
+        except Exception as e:
+            fields['error'] = str(e) or e.__class__.__name__
+        cur = self._db.execute(
+            'INSERT INTO files (path, type, mtime, size, {}, codes) VALUES (?, ?, ?, ?, {}, ?)'.format(
+                ', '.join(fields), ', '.join('?' * len(fields))),
+            (path, type, st.st_mtime_ns, st.st_size, *fields.values(), _pack_codes(codes)))
+        fid = cur.lastrowid
+        self._db.executemany('INSERT OR IGNORE INTO coverage (code, file) VALUES (?, ?)', ((c, fid) for c in codes))
+
+    def _remove(self, fid):
+        (blob,) = self._db.execute('SELECT codes FROM files WHERE id = ?', (fid,)).fetchone()
+        self._db.executemany('DELETE FROM coverage WHERE code = ? AND file = ?',
+                             ((c, fid) for c in _unpack_codes(blob)))
+        self._db.execute('DELETE FROM files WHERE id = ?', (fid,))
+
+def _walk(root):
+    """Yield (path, type) of all GFONT/GAP files under a directory."""
+    for (dirpath, dirnames, filenames) in os.walk(root):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            type = _TYPES.get(os.path.splitext(fn)[1].lower())
+            if type is not None:
+                yield (os.path.join(dirpath, fn), type)
+
+def _pack_codes(codes):
+    """Pack character codes into a big endian blob."""
+    if sys.byteorder == 'little':
+        codes = array('I', codes)
+        codes.byteswap()
+    return codes.tobytes()
+
+def _unpack_codes(blob):
+    """Unpack character codes from a big endian blob."""
+    codes = array('I')
+    codes.frombytes(blob)
+    if sys.byteorder == 'little':
+        codes.byteswap()
+    return codes
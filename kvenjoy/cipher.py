@@ -1,79 +1,234 @@
 """
 Implements a cipher that encrypts/decrypts a given buffer of arbitrary size.
+
+Blocks are processed as 64-bit integers, ciphertext/plaintext is written into a
+preallocated output buffer and input buffer is never copied, so any object that
+supports buffer protocol ('bytes', 'bytearray', 'memoryview', 'mmap', ...) can be
+used as input.
+
+Encryptor/Decryptor carry the chaining state across calls so that big buffers
+could be processed in chunks.
 """
 import random
+import struct
 import kvenjoy.tea
 
+_block = struct.Struct('>Q')
+
+class Encryptor:
+    """Incremental encryptor.
+
+    Plaintext is fed in chunks of arbitrary size through update(), ciphertext
+    of all complete blocks is returned right away, so memory usage does not
+    depend on plaintext size.
+
+    NOTE: Total plaintext size must be known in advance since the padding
+    size is stored in the very first block.
+    """
+
+    def __init__(self, key, size):
+        """Arguments:
+        key  -- Encryption key (128 bits) or a kvenjoy.tea.KeySchedule.
+        size -- Total size of plaintext.
+        """
+        self.size = size
+        self._ks = kvenjoy.tea.key_schedule(key)
+        self._fed = 0
+        self._lpb = 0
+        self._lcb = 0
+
+        # Prepend indicator and random salts
+        padding_size = (size + 10) % 8
+        if padding_size != 0:
+            padding_size = 8 - padding_size
+        self._pending = bytearray([0x20 | padding_size])
+        self._pending.extend([_random() for i in range(padding_size + 2)])
+
+    def update(self, chunk):
+        """Encrypt a chunk of plaintext.
+
+        Arguments:
+        chunk  -- Plaintext chunk (any object that supports buffer protocol).
+        return -- Ciphertext produced so far (bytearray).
+        """
+        chunk = memoryview(chunk)
+        self._fed += len(chunk)
+        if self._fed > self.size:
+            raise Exception('Plaintext exceeds declared size {}'.format(self.size))
+        pending = self._pending
+        n = (len(pending) + len(chunk)) // 8 * 8
+        if len(pending) >= n:
+            buf = pending[:n]
+            self._pending = pending[n:]
+            self._pending.extend(chunk)
+        else:
+            buf = bytearray(n)
+            buf[:len(pending)] = pending
+            buf[len(pending):] = chunk[:n - len(pending)]
+            self._pending = bytearray(chunk[n - len(pending):])
+        (self._lpb, self._lcb) = _encrypt_blocks(buf, self._ks, self._lpb, self._lcb)
+        return buf
+
+    def finalize(self):
+        """Finish encryption.
+
+        return -- Remaining ciphertext (bytearray).
+        """
+        if self._fed != self.size:
+            raise Exception('Plaintext size {} does not match declared size {}'.format(self._fed, self.size))
+        # Append trailing zero paddings
+        buf = self._pending
+        buf.extend(bytes(7))
+        self._pending = bytearray()
+        (self._lpb, self._lcb) = _encrypt_blocks(buf, self._ks, self._lpb, self._lcb)
+        return buf
+
+class Decryptor:
+    """Incremental decryptor.
+
+    Ciphertext is fed in chunks of arbitrary size through update(), plaintext
+    is returned as soon as it is known not to be part of the trailing padding.
+    """
+
+    def __init__(self, key):
+        """Arguments:
+        key -- Decryption key (128 bits) or a kvenjoy.tea.KeySchedule.
+        """
+        self._ks = kvenjoy.tea.key_schedule(key)
+        self._lpb = 0
+        self._lcb = 0
+        self._pending = bytearray()
+        self._held = bytearray()
+        self._skip = None
+
+    def update(self, chunk):
+        """Decrypt a chunk of ciphertext.
+
+        Arguments:
+        chunk  -- Ciphertext chunk (any object that supports buffer protocol).
+        return -- Plaintext produced so far (bytearray).
+        """
+        chunk = memoryview(chunk)
+        held = len(self._held)
+        n = (len(self._pending) + len(chunk)) // 8 * 8
+        buf = bytearray(held + n)
+        buf[:held] = self._held
+        with memoryview(buf) as view:
+            offset = held
+            if self._pending:
+                # Complete pending block with head of the chunk
+                k = min(8 - len(self._pending), len(chunk))
+                self._pending.extend(chunk[:k])
+                chunk = chunk[k:]
+                if len(self._pending) == 8:
+                    (self._lpb, self._lcb) = _decrypt_blocks(self._pending, view[offset:], self._ks, self._lpb, self._lcb)
+                    offset += 8
+                    self._pending = bytearray()
+            m = len(chunk) // 8 * 8
+            (self._lpb, self._lcb) = _decrypt_blocks(chunk[:m], view[offset:], self._ks, self._lpb, self._lcb)
+            self._pending.extend(chunk[m:])
+
+        # Skip indicator, padding and prefix
+        if self._skip is None and len(buf) > 0:
+            self._skip = 3 + (buf[0] & 0x07)
+        if self._skip:
+            k = min(self._skip, len(buf))
+            del buf[:k]
+            self._skip -= k
+
+        # Hold back what might be trailing zero paddings
+        self._held = buf[-7:]
+        del buf[-7:]
+        return buf
+
+    def finalize(self):
+        """Finish decryption.
+
+        return -- Remaining plaintext (bytearray).
+        """
+        if self._pending:
+            raise Exception('Ciphertext size is not multiple of 8')
+        self._held = bytearray()
+        return bytearray()
+
 def encrypt(plain, key):
     """Encrypt given plaintext buffer.
 
-    Both input and output are of type 'bytes' or 'bytearray'.
+    Input is any object that supports buffer protocol, output is of type
+    'bytearray'.
 
     Arguments:
     plain  -- Plaintext to be encrypted.
-    key    -- Encryption key (128 bits).
+    key    -- Encryption key (128 bits) or a kvenjoy.tea.KeySchedule.
     return -- Ciphertext.
     """
-    plain_buf = bytearray()
-
-    # Prepend indicator and random salts
-    plain_size = len(plain) + 10
-    padding_size = plain_size % 8
-    if padding_size != 0:
-        padding_size = 8 - padding_size
-    plain_size += padding_size
-    plain_buf.append(0x20 | padding_size)
-    plain_buf.extend([_random() for i in range(padding_size + 2)])
-
-    # Append plaintext
-    plain_buf.extend(plain)
-
-    # Append trailing zero paddings
-    plain_buf.extend([0] * (plain_size - len(plain_buf)))
-
-    # Encrypt each block
-    cipher = bytearray()
-    lcb = bytearray([0] * 8)
-    lpb = bytearray([0] * 8)
-    for i in range(len(plain_buf) // 8):
-        pb = plain_buf[i * 8:i * 8 + 8]
-        cpb = _xor(pb, lcb, 8)
-        lcb = kvenjoy.tea.encrypt(cpb, key)
-        lcb = _xor(lcb, lpb, 8)
-        cipher.extend(lcb)
-        lpb = cpb
+    plain = memoryview(plain)
+    encryptor = Encryptor(key, len(plain))
+    cipher = encryptor.update(plain)
+    cipher.extend(encryptor.finalize())
     return cipher
 
 def decrypt(cipher, key):
     """Decrypt given ciphertext buffer.
 
-    Both input and output are of type 'bytes' or 'bytearray'.
+    Input is any object that supports buffer protocol, output is of type
+    'bytearray'.
 
     Arguments:
     cipher -- Ciphertext to be decrypt.
-    key    -- Decryption key (128 bits).
+    key    -- Decryption key (128 bits) or a kvenjoy.tea.KeySchedule.
     return -- Plaintext.
     """
-    lpb = bytearray([0] * 8)
-    lcb = bytearray([0] * 8)
-    plain = bytearray()
-    for i in range(len(cipher) // 8):
-        cb = cipher[i * 8:i * 8 + 8]
-        ccb = _xor(cb, lpb, 8)
-        lpb = kvenjoy.tea.decrypt(ccb, key)
-        plain.extend(_xor(lpb, lcb, 8))
+    decryptor = Decryptor(key)
+    plain = decryptor.update(cipher)
+    plain.extend(decryptor.finalize())
+    return plain
+
+def _encrypt_blocks(buf, ks, lpb, lcb):
+    """Encrypt all 64-bit blocks of a writable buffer in place.
+
+    Arguments:
+    buf    -- Plaintext buffer, size must be multiple of 8.
+    ks     -- kvenjoy.tea.KeySchedule.
+    lpb    -- Last plaintext block (64-bit integer).
+    lcb    -- Last ciphertext block (64-bit integer).
+    return -- Updated (lpb, lcb).
+    """
+    encrypt_words = ks.encrypt_words
+    unpack_from = _block.unpack_from
+    pack_into = _block.pack_into
+    for offset in range(0, len(buf), 8):
+        (pb,) = unpack_from(buf, offset)
+        cpb = pb ^ lcb
+        (x0, x1) = encrypt_words(cpb >> 32, cpb & 0xffffffff)
+        lcb = ((x0 << 32) | x1) ^ lpb
+        pack_into(buf, offset, lcb)
+        lpb = cpb
+    return (lpb, lcb)
+
+def _decrypt_blocks(src, dst, ks, lpb, lcb):
+    """Decrypt all complete 64-bit blocks of source buffer into destination.
+
+    Arguments:
+    src    -- Ciphertext buffer.
+    dst    -- Writable plaintext buffer, at least as big as complete blocks.
+    ks     -- kvenjoy.tea.KeySchedule.
+    lpb    -- Last plaintext block (64-bit integer).
+    lcb    -- Last ciphertext block (64-bit integer).
+    return -- Updated (lpb, lcb).
+    """
+    decrypt_words = ks.decrypt_words
+    unpack_from = _block.unpack_from
+    pack_into = _block.pack_into
+    for offset in range(0, len(src) // 8 * 8, 8):
+        (cb,) = unpack_from(src, offset)
+        ccb = cb ^ lpb
+        (x0, x1) = decrypt_words(ccb >> 32, ccb & 0xffffffff)
+        lpb = (x0 << 32) | x1
+        pack_into(dst, offset, lpb ^ lcb)
         lcb = cb
-    padding_size = plain[0] & 0x07
-    plain_size = len(cipher) - 10 - padding_size
-    return plain[3 + padding_size:3 + padding_size + plain_size]
+    return (lpb, lcb)
 
 def _random():
     """Make a random number in range [50, 128)"""
     return 50 + random.randint(0, 77)
-
-def _xor(bs1, bs2, n):
-    """Return exclusive or of two given byte arrays"""
-    bs = bytearray()
-    for (b1, b2) in zip(bs1, bs2):
-        bs.append(b1 ^ b2)
-    return bs
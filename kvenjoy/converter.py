@@ -1,8 +1,56 @@
 
+import os
+import re
+import sys
+import threading
+import json
+import collections
+from array import array
 import kvenjoy.gap
 import kvenjoy.gfont
 from kvenjoy.graph import *
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Version of compact JSON schema, strokes are stored as flat coordinates
+# arrays and command strings rather than lists of points
+JSON_SCHEMA_COMPACT = 2
+
+# Stroke commands in compact JSON schema
+_cmds_to_json = bytes.maketrans(b'\x00\x01\x02', b'MLC')
+_cmds_from_json = bytes.maketrans(b'MLC', b'\x00\x01\x02')
+
+def json_dumps(jo, indent=None):
+    """Serialize a dict/json struct to JSON text.
+
+    orjson is used if it is installed and indentation is either disabled or
+    2 (the only indentation it supports), otherwise the json module is used.
+
+    Arguments:
+    jo     -- The dict/json struct.
+    indent -- Indentation, None for compact output.
+    return -- JSON text (str).
+    """
+    if orjson is not None and indent in (None, 2):
+        return orjson.dumps(jo, option=0 if indent is None else orjson.OPT_INDENT_2).decode('utf-8')
+    if indent is None:
+        return json.dumps(jo, separators=(',', ':'))
+    return json.dumps(jo, indent=indent)
+
+def json_loads(s):
+    """Deserialize JSON text (str or bytes) to dict/json struct, with orjson if it is installed"""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+def _check_json_schema(jo):
+    schema = jo.get('schema', 1)
+    if schema not in (1, JSON_SCHEMA_COMPACT):
+        raise Exception('Unsupported JSON schema version "{}"'.format(schema))
+
 def variable_to_json(var):
     """Converts a Variable object to dict/json struct"""
     o = {}
@@ -15,9 +63,10 @@ def variable_from_json(jo):
     """Converts a dict/json struct to a Variable object"""
     return kvenjoy.gap.Variable(jo['x'], jo['y'], jo['name'])
 
-def variable_to_svg(var):
+def variable_to_svg(var, precision=None):
     """Converts a Variable object to SVG element"""
-    return ['<text x="{}" y="{}" font-size="16px" font-family="serif" text-anchor="middle" fill="#ff0000">{}</text>'.format(var.x, var.y, var.name)]
+    fmt = number_formatter(precision)
+    return ['<text x="{}" y="{}" font-size="16px" font-family="serif" text-anchor="middle" fill="#ff0000">{}</text>'.format(fmt(var.x), fmt(var.y), var.name)]
 
 def point_to_json(point):
     """Converts a Point/BezierPoint object to dict/json struct"""
@@ -37,51 +86,235 @@ def point_from_json(jo):
     else:
         raise Exception('Wrong point coordinates length "{}"'.format(len(jo)))
 
-def stroke_to_json(stroke):
-    """Converts a Stroke object to dict/json struct"""
+def stroke_to_json(stroke, compact=False):
+    """Converts a Stroke object to dict/json struct
+
+    A compact stroke is stored as flat coordinates array and a string of
+    commands ('M', 'L' or 'C' per point), no point objects are created.
+    """
     o = {}
-    o['points'] = [point_to_json(p) for p in stroke.points]
+    if compact:
+        o['floats'] = stroke.floats.tolist()
+        o['cmds'] = stroke.cmds.translate(_cmds_to_json).decode('ascii')
+    else:
+        o['points'] = [point_to_json(p) for p in stroke.points]
     return o
 
 def stroke_from_json(jo):
-    """Converts a dict/json struct to Stroke object"""
-    return Stroke([point_from_json(x) for x in jo['points']])
+    """Converts a dict/json struct (either verbose or compact) to Stroke object"""
+    if 'cmds' not in jo:
+        return Stroke([point_from_json(x) for x in jo['points']])
+    cmds = jo['cmds'].encode('ascii')
+    bad = cmds.translate(None, b'MLC')
+    if bad:
+        raise Exception('Unknown stroke command "{}"'.format(chr(bad[0])))
+    if cmds and (cmds[0] != ord('M') or cmds.count(b'M') != 1):
+        raise Exception('Stroke commands must start with a single "M"')
+    floats = array('f', jo['floats'])
+    if len(floats) != 2 * len(cmds) + 4 * cmds.count(b'C'):
+        raise Exception('Wrong stroke coordinates length "{}"'.format(len(floats)))
+    return Stroke.from_buffers(floats, cmds.translate(_cmds_from_json))
 
-def stroke_to_svg(stroke):
-    """Converts a Stroke object to SVG element"""
-    o = '<path d="'
-    o += ' M {} {}'.format(stroke.points[0].x, stroke.points[0].y)
-    for p in stroke.points[1:]:
-        if isinstance(p, Point):
-            o += ' L {} {}'.format(p.x, p.y)
-        elif isinstance(p, BezierPoint):
-            o += ' C {} {}, {} {}, {} {}'.format(p.cx1, p.cy1, p.cx2, p.cy2, p.x, p.y)
+# A whole number "-0" (after zeros are stripped)
+_negative_zero = re.compile(r'(?<![\d.])-0(?=[ ,]|$)')
+
+def _strip_zeros(s, precision):
+    """Strip trailing zeros of fixed point numbers separated by ' ' or ','.
+
+    Every number has a decimal point if precision is not 0, so a zero right
+    before a separator is always a trailing zero of the fraction.
+    """
+    if precision > 0:
+        for _ in range(precision):
+            s = s.replace('0 ', ' ').replace('0,', ',')
+        s = s.replace('. ', ' ').replace('.,', ',').rstrip('0').rstrip('.')
+    # Negative zero
+    if '-0' in s:
+        s = _negative_zero.sub('0', s)
+    return s
+
+def number_formatter(precision=None):
+    """Make a function that formats numbers for SVG output.
+
+    With a precision numbers are written in fixed point notation with trailing
+    zeros stripped, which makes output much smaller.
+
+    Arguments:
+    precision -- Number of digits after decimal point, None for exact (shortest round-trip) representation.
+    return    -- Function that converts a number to string.
+    """
+    if precision is None:
+        return str
+    fixed = '%.{}f'.format(precision)
+    return lambda v: _strip_zeros(fixed % v, precision)
+
+def stroke_to_path_data(stroke, precision=None):
+    """Converts a Stroke object to SVG path data (the 'd' attribute)
+
+    Path data is built straight from the buffers of the stroke, all numbers
+    are formatted at once by a template made from the command buffer.
+    """
+    floats = stroke.floats
+    cmds = stroke.cmds
+    if not cmds:
+        return ''
+    n = '%r' if precision is None else '%.{}f'.format(precision)
+    line = ' L {0} {0}'.format(n)
+    segments = (line, line, ' C {0} {0}, {0} {0}, {0} {0}'.format(n))
+    if cmds[0] == 2:
+        # Move to end point of a leading curve
+        floats = floats[4:]
+    d = (' M {0} {0}'.format(n) + ''.join([segments[cmd] for cmd in cmds[1:]])) % tuple(floats)
+    if precision is not None:
+        d = _strip_zeros(d, precision)
+    return d
+
+class PathCache:
+    """LRU cache of SVG path data of glyphs.
+
+    Path data of all strokes of a glyph is cached under a hash of the glyph
+    content (coordinates and command buffers of strokes) and precision, so
+    glyphs that did not change are never formatted again no matter where
+    they come from. Entries could also be persisted in a directory, one file
+    per glyph, which is consulted on misses of the in-memory cache.
+    """
+
+    def __init__(self, max_size=8192, directory=None):
+        """Arguments:
+        max_size  -- Maximum number of glyphs kept in memory.
+        directory -- Directory of persistent entries (created if not exist), None for memory only.
+        """
+        self.max_size = max_size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(glyph, precision=None):
+        """Calculate cache key of a glyph.
+
+        Arguments:
+        glyph     -- The Glyph object.
+        precision -- Precision of coordinates (see number_formatter).
+        return    -- Hex digest of glyph content.
+        """
+        import hashlib
+        h = hashlib.blake2b(digest_size=16)
+        h.update('{}:{}'.format(sys.byteorder, precision).encode('ascii'))
+        for s in glyph.strokes:
+            floats = s.floats
+            cmds = s.cmds
+            h.update(len(floats).to_bytes(4, 'big'))
+            h.update(floats)
+            h.update(len(cmds).to_bytes(4, 'big'))
+            h.update(cmds)
+        return h.hexdigest()
+
+    def paths(self, glyph, precision=None):
+        """Return path data of all strokes of a glyph, formatted only on miss.
+
+        Arguments:
+        glyph     -- The Glyph object.
+        precision -- Precision of coordinates (see number_formatter).
+        return    -- Tuple of path data strings (one per stroke).
+        """
+        key = PathCache.key(glyph, precision)
+        with self._lock:
+            paths = self._entries.get(key)
+            if paths is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return paths
+        paths = self._load(key)
+        if paths is None:
+            paths = tuple(stroke_to_path_data(s, precision) for s in glyph.strokes)
+            self._store(key, paths)
+            with self._lock:
+                self.misses += 1
         else:
-            raise Exception('Unknown point type "{}"'.format(type(p).__name__))
-    o += '" stroke="black" fill="transparent" vector-effect="non-scaling-stroke"/>'
-    return [o]
+            with self._lock:
+                self.hits += 1
+        with self._lock:
+            self._entries[key] = paths
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return paths
+
+    def clear(self):
+        """Drop in-memory entries (persistent entries are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), encoding='ascii') as f:
+                content = f.read()
+        except OSError:
+            return None
+        return tuple(content.split('\n')) if content else ()
 
-def gap_to_json(gap):
+    def _store(self, key, paths):
+        if self.directory is None:
+            return
+        # Write to a temporary file first so that readers never see partial entries
+        import tempfile
+        d = os.path.dirname(self._path(key))
+        os.makedirs(d, exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(dir=d)
+        try:
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write('\n'.join(paths))
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+# SVG element of a stroke, from its path data
+_SVG_PATH = '<path d="{}" stroke="black" fill="transparent" vector-effect="non-scaling-stroke"/>'
+
+def stroke_to_svg(stroke, precision=None):
+    """Converts a Stroke object to SVG element"""
+    return [_SVG_PATH.format(stroke_to_path_data(stroke, precision))]
+
+def gap_to_json(gap, compact=False):
     """Converts a Gap object to dict/json struct"""
     o = {}
+    if compact:
+        o['schema'] = JSON_SCHEMA_COMPACT
     o['version'] = gap.version
     o['name'] = gap.name
     o['uuid'] = gap.uuid
     o['author'] = gap.author
     o['description'] = gap.description
     o['variables'] = [variable_to_json(v) for v in gap.variables]
-    o['stroke_groups'] = [[stroke_to_json(s) for s in sg] for sg in gap.stroke_groups]
+    o['stroke_groups'] = [[stroke_to_json(s, compact) for s in sg] for sg in gap.stroke_groups]
     return o
 
 def gap_from_json(jo):
     """Converts a dict/json struct to Gap object"""
+    _check_json_schema(jo)
     return kvenjoy.gap.Gap(jo['version'], jo['uuid'], jo['name'], jo['author'], jo['description'],
                            [variable_from_json(x) for x in jo['variables']],
                            [[stroke_from_json(s) for s in sg] for sg in jo['stroke_groups']])
 
-def gap_to_svg(gap, standalone=True):
+def gap_to_svg(gap, standalone=True, precision=None):
     """Converts a Gap object to SVG elements"""
-    o = []
+    return list(iter_gap_svg(gap, standalone, precision))
+
+def iter_gap_svg(gap, standalone=True, precision=None):
+    """Generates SVG elements of a Gap object one by one"""
     if standalone:
         (x0, y0, x1, y1) = gap.bounding_box()
         px = (x1 - x0) / 10
@@ -90,43 +323,50 @@ def gap_to_svg(gap, standalone=True):
         vh = (y1 - y0) + 2 * py
         vx = x0 - px
         vy = y0 - py
-        o.append('<svg version="1.1" viewBox="{} {} {} {}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vx, vy, vw, vh))
+        yield '<svg version="1.1" viewBox="{} {} {} {}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vx, vy, vw, vh)
     for v in gap.variables:
-        o.extend(variable_to_svg(v))
+        yield from variable_to_svg(v, precision)
     for sg in gap.stroke_groups:
         for s in sg:
-            o.extend(stroke_to_svg(s))
+            yield from stroke_to_svg(s, precision)
     if standalone:
-        o.append('</svg>')
-    return o
+        yield '</svg>'
 
-def glyph_to_json(g):
+def glyph_to_json(g, compact=False):
     """Converts a Glyph object to dict/json struct"""
     o = {}
     o['code'] = g.code
-    o['strokes'] = [stroke_to_json(s) for s in g.strokes]
+    o['strokes'] = [stroke_to_json(s, compact) for s in g.strokes]
     return o
 
 def glyph_from_json(jo):
     """Converts a dict/json struct to Glyph object"""
     return kvenjoy.gfont.Glyph(jo['code'], [stroke_from_json(s) for s in jo['strokes']])
 
-def glyph_to_svg(g, transform=None):
-    """Converts a Glyph object to SVG elements"""
+def glyph_to_svg(g, transform=None, precision=None, cache=None):
+    """Converts a Glyph object to SVG elements
+
+    Path data is taken from cache (a PathCache) if there is one.
+    """
     o = []
     if transform is None:
         o.append('<g>')
     else:
         o.append('<g transform="{}">'.format(transform))
     o.append('<title>{:04x}</title>'.format(g.code))
-    for s in g.strokes:
-        o.extend(stroke_to_svg(s))
+    if cache is None:
+        for s in g.strokes:
+            o.extend(stroke_to_svg(s, precision))
+    else:
+        for d in cache.paths(g, precision):
+            o.append(_SVG_PATH.format(d))
     o.append('</g>')
     return o
 
-def gfont_to_json(font):
-    """Converts a Font object to dict/json struct"""
+def _gfont_header_to_json(font, compact):
     o = {}
+    if compact:
+        o['schema'] = JSON_SCHEMA_COMPACT
     o['version'] = font.version
     o['vendor'] = font.vendor
     o['type'] = font.type
@@ -137,19 +377,73 @@ def gfont_to_json(font):
     o['password'] = font.password
     o['unknown'] = [b for b in font.unknown]
     o['uuid'] = font.uuid
-    o['glyphs'] = [glyph_to_json(g) for g in font.glyphs]
     return o
 
+def gfont_to_json(font, compact=False):
+    """Converts a Font object to dict/json struct"""
+    o = _gfont_header_to_json(font, compact)
+    o['glyphs'] = [glyph_to_json(g, compact) for g in font.glyphs]
+    return o
+
+def iter_gfont_jsonl(font, compact=False):
+    """Generates JSON Lines of a Font object one by one
+
+    The first line is the header (as gfont_to_json but 'num_glyphs' instead
+    of 'glyphs'), followed by one glyph per line. Each glyph is converted
+    when it's reached so glyphs could be loaded lazily.
+    """
+    o = _gfont_header_to_json(font, compact)
+    o['num_glyphs'] = len(font.glyphs)
+    yield json_dumps(o) + '\n'
+    for g in font.glyphs:
+        yield json_dumps(glyph_to_json(g, compact)) + '\n'
+
+def read_gfont_jsonl(lines):
+    """Reads JSON Lines of a font (see iter_gfont_jsonl).
+
+    Glyph lines are only parsed as the returned generator is consumed, blank
+    lines are ignored.
+
+    Arguments:
+    lines  -- Iterable of lines (str or bytes), e.g. a file opened for reading.
+    return -- (header, glyphs) Header dict/json struct and generator of Glyph objects.
+    """
+    lines = iter(lines)
+    header = None
+    for line in lines:
+        if line.strip():
+            header = json_loads(line)
+            break
+    if header is None or 'code' in header or 'glyphs' in header:
+        raise Exception('JSON Lines font header not found')
+    _check_json_schema(header)
+
+    def glyphs():
+        for line in lines:
+            if line.strip():
+                yield glyph_from_json(json_loads(line))
+    return (header, glyphs())
+
 def gfont_from_json(jo):
     """Converts a dict/json struct to a Font object"""
+    _check_json_schema(jo)
     return kvenjoy.gfont.Font(jo['version'], jo['vendor'], jo['type'],
                               jo['name'], jo['author'], jo['description'],
                               jo['boundary'], jo['password'], bytes(jo['unknown']), jo['uuid'],
                               [glyph_from_json(g) for g in jo['glyphs']])
 
-def gfont_to_svg(font, standalone=True):
+def gfont_to_svg(font, standalone=True, precision=None, cache=None):
     """Converts a Font object to SVG elements"""
-    o = []
+    return list(iter_gfont_svg(font, standalone, precision, cache))
+
+def iter_gfont_svg(font, standalone=True, precision=None, cache=None):
+    """Generates SVG elements of a Font object one by one
+
+    Glyphs are laid out as a sheet of 16 columns, each glyph is converted
+    when it's reached so glyphs could be loaded lazily. Precision applies to
+    glyph coordinates only. Path data of glyphs is taken from cache (a
+    PathCache) if there is one.
+    """
     n_cols = 16
     n_rows = len(font.glyphs) // n_cols + (1 if len(font.glyphs) % n_cols else 0)
     cell_w = 64
@@ -166,15 +460,52 @@ def gfont_to_svg(font, standalone=True):
         vh = (y1 - y0) + 2 * py
         vx = x0 - px
         vy = y0 - py
-        # o.append('<svg version="1.1" viewBox="{} {} {} {}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vx, vy, vw, vh))
-        o.append('<svg version="1.1" width="{}" height="{}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vw, vh))
+        # yield '<svg version="1.1" viewBox="{} {} {} {}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vx, vy, vw, vh)
+        yield '<svg version="1.1" width="{}" height="{}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(vw, vh)
     i = 0
     for g in font.glyphs:
         row = i // n_cols
         col = i % n_cols
         transform = 'translate({}, {}) scale({} {})'.format(col * cell_w + cell_base_x, row * cell_h + cell_base_y, scale_x, scale_y)
-        o.extend(glyph_to_svg(g, transform=transform))
+        yield from glyph_to_svg(g, transform=transform, precision=precision, cache=cache)
         i += 1
     if standalone:
-        o.append('</svg>')
-    return o
+        yield '</svg>'
+
+def iter_glyph_svg(g, boundary, size=64, precision=None, cache=None):
+    """Generates a standalone SVG document of a single glyph
+
+    The glyph is laid out as a cell of the sheet of iter_gfont_svg scaled to
+    given size.
+
+    Arguments:
+    g         -- The Glyph object.
+    boundary  -- Boundary of the font.
+    size      -- Width and height of the document.
+    precision -- Precision of glyph coordinates (see number_formatter).
+    cache     -- PathCache of path data (optional).
+    """
+    yield '<svg version="1.1" width="{}" height="{}" baseProfile="full" xmlns="http://www.w3.org/2000/svg">'.format(size, size)
+    transform = 'translate({}, {}) scale({} {})'.format(size / 2, size * 3 / 4, size / boundary, size / boundary)
+    yield from glyph_to_svg(g, transform=transform, precision=precision, cache=cache)
+    yield '</svg>'
+
+def write_svg(stm, elements, chunk_size=1 << 16):
+    """Write SVG elements to a text stream in chunks.
+
+    Arguments:
+    stm        -- The output text stream.
+    elements   -- Iterable of SVG element strings (e.g. from iter_gfont_svg).
+    chunk_size -- Approximate number of characters written at once.
+    """
+    chunk = []
+    size = 0
+    for e in elements:
+        chunk.append(e)
+        size += len(e)
+        if size >= chunk_size:
+            stm.write(''.join(chunk))
+            chunk = []
+            size = 0
+    if chunk:
+        stm.write(''.join(chunk))
@@ -1,6 +1,6 @@
 
-import io
 import gzip
+import mmap
 import kvenjoy.graph
 from kvenjoy.io import *
 
@@ -52,49 +52,70 @@ class Gap:
     def bounding_box(self):
         """Calculate bounding box that could just hold this gap
 
+        Boxes of strokes are cached by the strokes themselves.
+
         Arguments:
         return -- (x0, y0, x1, y1) Left top and right bottom coordinates of the bounding box.
         """
-        (x0, y0, x1, y1) = (None, None, None, None)
-        for v in self.variables:
-                if x0 is None or x0 > v.x:
-                    x0 = v.x
-                if y0 is None or y0 > v.y:
-                    y0 = v.y
-                if x1 is None or x1 < v.x:
-                    x1 = v.x
-                if y1 is None or y1 < v.y:
-                    y1 = v.y
-        for sg in self.stroke_groups:
-            for s in sg:
-                for p in s.points:
-                    (px0, py0, px1, py1) = p.bounding_box()
-                    if x0 is None or x0 > px0:
-                        x0 = px0
-                    if y0 is None or y0 > py0:
-                        y0 = py0
-                    if x1 is None or x1 < px1:
-                        x1 = px1
-                    if y1 is None or y1 < py1:
-                        y1 = py1
-        return (x0, y0, x1, y1)
+        boxes = [(v.x, v.y, v.x, v.y) for v in self.variables]
+        boxes.extend(s.bounding_box() for sg in self.stroke_groups for s in sg)
+        return kvenjoy.graph.union_boxes(boxes)
 
     @classmethod
     def load(cls, stm):
         """Construct a GAP object from given input stream.
 
+        Content is decompressed and parsed incrementally, neither the whole
+        compressed nor the whole decompressed content is held in memory.
+
         Arguments:
         stm    -- The input stream.
         return -- GAP object constructed from input stream.
         """
-        bs = gzip.decompress(stm.read())
-        zstm = io.BytesIO(bs)
+        return cls._parse(StreamReader(gzip.GzipFile(fileobj=stm, mode='rb')))
+
+    @staticmethod
+    def iter_stroke_groups(stm):
+        """Read stroke groups of a GAP file one by one from given input stream.
+
+        Header fields and variables are skipped (see load_header).
+
+        Arguments:
+        stm    -- The input stream.
+        return -- Generator of stroke groups (list of Stroke).
+        """
+        zstm = StreamReader(gzip.GzipFile(fileobj=stm, mode='rb'))
+        read_int(zstm)
+        read_utf_string(zstm, 4)
+        (num_vars,) = read_int(zstm)
+        for i in range(num_vars):
+            zstm.skip(8)
+            read_raw_string(zstm)
+        yield from _iter_stroke_groups(zstm)
+
+    @staticmethod
+    def load_header(stm):
+        """Read header fields of a GAP file from given input stream.
+
+        Only the beginning of the GZIP stream is decompressed.
+
+        Arguments:
+        stm    -- The input stream.
+        return -- (version, uuid, name, author, description).
+        """
+        zstm = gzip.GzipFile(fileobj=stm, mode='rb')
+        (version,) = read_int(zstm)
+        (uuid, name, author, description) = read_utf_string(zstm, 4)
+        return (version, uuid, name, author, description)
+
+    @classmethod
+    def _parse(cls, zstm):
+        """Construct a GAP object from decompressed content."""
         (version,) = read_int(zstm)
         (uuid, name, author, description) = read_utf_string(zstm, 4)
         (num_vars,) = read_int(zstm)
         variables = [Variable.load(zstm) for i in range(num_vars)]
-        (num_groups,) = read_int(zstm)
-        stroke_groups = [kvenjoy.graph.Stroke.load_list(zstm) for i in range(num_groups)]
+        stroke_groups = list(_iter_stroke_groups(zstm))
 
         return cls(version, uuid, name, author, description, variables, stroke_groups)
 
@@ -104,7 +125,7 @@ class Gap:
         Arguments:
         stm    -- The output stream.
         """
-        zstm = io.BytesIO()
+        zstm = BinaryWriter()
         write_int(zstm, self.version)
         write_utf_string(zstm, self.uuid, self.name, self.author, self.description)
         write_int(zstm, len(self.variables))
@@ -114,3 +135,25 @@ class Gap:
         for g in self.stroke_groups:
             kvenjoy.graph.Stroke.save_list(zstm, g)
         stm.write(gzip.compress(zstm.getvalue()))
+
+def _iter_stroke_groups(zstm):
+    """Read number of stroke groups and yield the groups one by one."""
+    (num_groups,) = read_int(zstm)
+    for i in range(num_groups):
+        yield kvenjoy.graph.Stroke.load_list(zstm)
+
+def open_gap(path):
+    """Open a GAP file through a read-only memory mapping.
+
+    The mapping is decompressed and parsed incrementally (see Gap.load), so
+    neither the whole compressed nor the whole decompressed content is ever
+    read into memory.
+
+    Arguments:
+    path   -- Path of the GAP file.
+    return -- A new Gap object.
+    """
+    with open(path, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with m:
+        return Gap.load(m)
@@ -1,7 +1,11 @@
 
-import io
-import zipfile
+import mmap
+import zlib
+import weakref
+import collections
+from array import array
 import kvenjoy.cipher
+import kvenjoy.archive
 from kvenjoy.graph import *
 from kvenjoy.io import *
 
@@ -10,11 +14,26 @@ class Glyph:
 
     A glyph has a associated character code (UNICODE) and several Stroke that
     forms the glyph.
+
+    A glyph loaded from a font remembers its original zipped file ('member'),
+    which is copied as is when the font is saved if the glyph is still encoded
+    the same (any change, in place or not, is thus detected).
     """
 
     def __init__(self, code, strokes):
         self.code = code
         self.strokes = strokes
+        self.member = None
+
+    def bounding_box(self):
+        """Calculate bounding box that could just hold this glyph
+
+        Boxes of strokes are cached by the strokes themselves.
+
+        Arguments:
+        return -- (x0, y0, x1, y1) Left top and right bottom coordinates of the bounding box.
+        """
+        return union_boxes(s.bounding_box() for s in self.strokes)
 
     @classmethod
     def load(cls, stm):
@@ -32,6 +51,23 @@ class Glyph:
 
         return cls(code, strokes)
 
+    @staticmethod
+    def skip(stm):
+        """Skip a glyph in given input stream without parsing it.
+
+        Only the length prefixes of coordinates and command buffers are read.
+
+        Arguments:
+        stm    -- The input stream.
+        return -- Character code of the skipped glyph.
+        """
+        (code,) = read_short(stm)
+        (num_floats,) = read_int(stm)
+        skip(stm, 4 * num_floats)
+        (num_cmds,) = read_int(stm)
+        skip(stm, num_cmds)
+        return code
+
     def save(self, stm):
         """ Write a glyph to given stream.
 
@@ -46,6 +82,114 @@ class Glyph:
         # Write glyphs
         Stroke.save_list(stm, self.strokes)
 
+class LazyGlyphList:
+    """Read-only list of glyphs that are loaded on demand.
+
+    The list is backed by the central directory of the zipped glyphs archive,
+    each zipped file is only inflated and parsed when the glyph is actually
+    accessed. Parsed glyphs are kept in a LRU cache of bounded size, glyphs
+    that were changed are kept apart when evicted so that changes are not lost
+    before the font is saved. Glyphs still referenced elsewhere are found
+    again rather than parsed anew.
+
+    NOTE: Underlying stream must stay open as long as the list is in use.
+    """
+
+    def __init__(self, stm, infos, cache_size=256):
+        """Arguments:
+        stm        -- Seekable input stream (or mmap) of the font.
+        infos      -- ZipInfo of all zipped glyphs.
+        cache_size -- Maximum number of parsed glyphs to be cached.
+        """
+        self._stm = stm
+        self._owned = None
+        self._infos = infos
+        self._index = {int(zi.filename): i for (i, zi) in enumerate(self._infos)}
+        self._cache = collections.OrderedDict()
+        self._edited = {}
+        self._live = weakref.WeakValueDictionary()
+        self.cache_size = cache_size
+
+    def __len__(self):
+        return len(self._infos)
+
+    def __iter__(self):
+        for i in range(len(self._infos)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[x] for x in range(*i.indices(len(self._infos)))]
+        return self._load(self._infos[i])
+
+    def close(self):
+        """Close the stream if it is owned by the list."""
+        self._cache.clear()
+        self._edited.clear()
+        self._live.clear()
+        if self._owned is not None:
+            self._owned.close()
+            self._owned = None
+
+    def codes(self):
+        """Return list of character codes of all glyphs (in archive order)."""
+        return [int(zi.filename) for zi in self._infos]
+
+    def get(self, code, default=None):
+        """Find glyph by its character code.
+
+        Arguments:
+        code    -- Character code of the glyph.
+        default -- Value returned when no glyph has given code.
+        return  -- The Glyph object or default.
+        """
+        i = self._index.get(code)
+        if i is None:
+            return default
+        return self._load(self._infos[i])
+
+    def _members(self, infos=None):
+        """Yield cached glyphs or raw members of glyphs not loaded yet (in archive order).
+
+        Arguments:
+        infos -- ZipInfo of the glyphs to yield, None for all glyphs.
+        """
+        for zi in self._infos if infos is None else infos:
+            g = self._edited.get(zi.filename)
+            if g is None:
+                g = self._live.get(zi.filename)
+            if g is not None:
+                yield g
+            else:
+                raw = kvenjoy.archive.read_raw_member(self._stm, zi)
+                yield (zi.filename, raw, zi.CRC, zi.file_size, zi.compress_type)
+
+    def _load(self, zi):
+        # Cached glyphs come with a snapshot of their content, to tell cheaply
+        # whether they were changed when they're evicted
+        name = zi.filename
+        e = self._cache.get(name)
+        if e is not None:
+            self._cache.move_to_end(name)
+            return e[0]
+        g = self._edited.get(name)
+        if g is not None:
+            return g
+        g = self._live.get(name)
+        if g is None:
+            g = _load_member(kvenjoy.archive.read_raw_member(self._stm, zi), zi)
+            self._live[name] = g
+        elif _changed(g):
+            # Changed after being evicted
+            self._edited[name] = g
+            return g
+        self._cache[name] = (g, _snapshot(g))
+        if len(self._cache) > self.cache_size:
+            (name, (g1, snapshot)) = self._cache.popitem(last=False)
+            if _snapshot(g1) != snapshot:
+                self._edited[name] = g1
+        return g
+
 class Font:
     """Represents a font.
 
@@ -63,19 +207,45 @@ class Font:
         self.unknown = unknown
         self.uuid = uuid
         self.glyphs = glyphs
+        self.preview = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the stream behind lazily loaded glyphs (if any)."""
+        if isinstance(self.glyphs, LazyGlyphList):
+            self.glyphs.close()
 
     # Font file encryption/decryption key
     key = bytes([1, 9, 8, 9, 0, 8, 2, 6, 1, 9, 9, 2, 0, 8, 2, 8])
 
     @classmethod
-    def load(cls, stm):
+    def load(cls, stm, lazy=False, cache_size=256, workers=None, keep_preview=False):
         """Construct a font from given input stream.
 
         For detailed layout of a font, please see README.md.
 
+        In lazy mode glyphs are not loaded until they're accessed, the 'glyphs'
+        member will be a LazyGlyphList and the input stream must stay open as
+        long as the glyphs are in use.
+
+        Otherwise zipped glyphs could be inflated and parsed by a pool of
+        worker processes, glyph order is kept as is in the archive.
+
+        Non-zipped glyphs are skipped unless keep_preview is True, in which
+        case they're parsed into the 'preview' member.
+
         Arguments:
-        stm    -- The input stream.
-        return -- A new Font object.
+        stm          -- The input stream.
+        lazy         -- Load glyphs on demand.
+        cache_size   -- Maximum number of parsed glyphs cached in lazy mode.
+        workers      -- Number of worker processes (eager mode only).
+        keep_preview -- Parse non-zipped glyphs.
+        return       -- A new Font object.
         """
         # Load font header fields
         (version,) = read_int(stm)
@@ -83,7 +253,7 @@ class Font:
         header_block = stm.read(header_size)
         if version >= 5:
             header_block = kvenjoy.cipher.decrypt(header_block, Font.key)
-        header_stm = io.BytesIO(header_block)
+        header_stm = BinaryReader(header_block)
         (vendor,) = read_utf_string(header_stm)
         (type,) = read_int(header_stm)
         (name,) = read_utf_string(header_stm)
@@ -101,66 +271,386 @@ class Font:
         if version >= 7:
             (uuid,) = read_utf_string(header_stm)
 
-        # Read and ignore non-zipped glyphs (at most 30)
+        # Skip or read non-zipped glyphs (at most 30)
         # TODO: Find out what exactly these non-zipped glyphs are for.
         (num_non_zipped_glyphs,) = read_int(stm)
-        for i in range(num_non_zipped_glyphs):
-            g = Glyph.load(stm)
+        preview = None
+        if keep_preview:
+            preview = [Glyph.load(stm) for i in range(num_non_zipped_glyphs)]
+        else:
+            for i in range(num_non_zipped_glyphs):
+                Glyph.skip(stm)
 
         # Load zipped glyphs
-        z = zipfile.ZipFile(stm)
-        glyphs = []
-        for zfn in z.namelist():
-            zstm = io.BytesIO(z.read(zfn))
-            g = Glyph.load(zstm)
-            glyphs.append(g)
+        infos = kvenjoy.archive.read_directory(stm)
+        if lazy:
+            glyphs = LazyGlyphList(stm, infos, cache_size)
+        elif workers is not None and workers > 1 and len(infos) > 1:
+            glyphs = _load_glyphs_parallel(stm, infos, workers)
+        else:
+            glyphs = []
+            for zi in infos:
+                g = _load_member(kvenjoy.archive.read_raw_member(stm, zi), zi)
+                glyphs.append(g)
 
         # Construct font
-        return cls(version, vendor, type, name, author, description, boundary, password, unknown, uuid, glyphs)
+        font = cls(version, vendor, type, name, author, description, boundary, password, unknown, uuid, glyphs)
+        font.preview = preview
+        return font
 
-    def save(self, stm):
+    def save(self, stm, workers=None, compresslevel=zlib.Z_DEFAULT_COMPRESSION, reuse=True):
         """Write a font to given input stream.
 
         For detailed layout of a font, please see README.md.
 
+        Glyphs could be encoded and compressed by a pool of worker threads,
+        zlib releases the GIL while compressing.
+
+        Unless reuse is False, zipped files of glyphs loaded from a font are
+        copied as is if the glyphs are still encoded the same. Glyphs of a
+        lazily loaded font that were never accessed are copied without being
+        parsed at all.
+
         Arguments:
-        stm  -- The output stream.
+        stm           -- The output stream.
+        workers       -- Number of worker threads.
+        compresslevel -- Compression level of zipped glyphs (0-9, -1 for zlib default).
+        reuse         -- Copy zipped files of unchanged glyphs.
         """
+        if reuse and isinstance(self.glyphs, LazyGlyphList):
+            items = self.glyphs._members()
+        else:
+            items = self.glyphs
+        with FontWriter(stm, self.version, self.vendor, self.type, self.name, self.author, self.description,
+                        self.boundary, self.password, self.unknown, self.uuid, len(self.glyphs),
+                        workers, compresslevel, reuse) as w:
+            w.write_glyphs(items)
 
-        # Write header
-        write_int(stm, self.version)
-        head_stm = io.BytesIO()
-        write_utf_string(head_stm, self.vendor)
-        write_int(head_stm, self.type)
-        write_utf_string(head_stm, self.name)
-        write_utf_string(head_stm, self.author)
-        write_utf_string(head_stm, self.description)
-        write_int(head_stm, self.boundary)
-        write_int(head_stm, len(self.glyphs))
-        if self.version >= 2:
-            write_utf_string(head_stm, self.password)
-        if self.version >= 4:
-            write_raw_string(head_stm, self.unknown)
-        if self.version >= 7:
-            write_utf_string(head_stm, self.uuid)
-        head_block = head_stm.getvalue()
-        if self.version >= 5:
-            head_block = kvenjoy.cipher.encrypt(head_block, Font.key)
+    def subset(self, stm, codes):
+        """Write a font made of the glyphs of given character codes only.
+
+        Glyphs are written in font order, codes without glyph are ignored.
+        Zipped files of glyphs are copied as is (see Font.save), glyphs of a
+        lazily loaded font are never parsed: selection goes by name of the
+        zipped files, only the header and non-zipped glyphs are rewritten.
+
+        Arguments:
+        stm    -- The output stream.
+        codes  -- Iterable of character codes.
+        return -- Number of glyphs written.
+        """
+        codes = set(codes)
+        if isinstance(self.glyphs, LazyGlyphList):
+            infos = [zi for zi in self.glyphs._infos if int(zi.filename) in codes]
+            (items, count) = (self.glyphs._members(infos), len(infos))
+        else:
+            items = [g for g in self.glyphs if g.code in codes]
+            count = len(items)
+        with FontWriter(stm, self.version, self.vendor, self.type, self.name, self.author, self.description,
+                        self.boundary, self.password, self.unknown, self.uuid, count) as w:
+            w.write_glyphs(items)
+        return w.count
+
+class FontWriter:
+    """Writes a font to an output stream glyph by glyph.
+
+    Header is written right away, the first glyphs are held back until the
+    non-zipped glyph block is complete, all other glyphs go straight into the
+    zipped glyphs archive on the output stream. Thus memory usage does not
+    depend on number of glyphs and the output stream does not need to be
+    seekable.
+
+    If number of glyphs is not known in advance (e.g. glyphs come from a
+    generator), it is patched into the header on close, which requires a
+    seekable output stream.
+    """
+
+    # Maximum number of non-zipped glyphs
+    max_preview = 30
+
+    def __init__(self, stm, version, vendor, type, name, author, description, boundary, password, unknown, uuid,
+                 num_glyphs=None, workers=None, compresslevel=zlib.Z_DEFAULT_COMPRESSION, reuse=True):
+        """Arguments:
+        stm           -- The output stream.
+        version ...   -- Header fields (see Font).
+        num_glyphs    -- Number of glyphs to be written, None if not known.
+        workers       -- Number of worker threads to compress glyphs (see write_glyphs).
+        compresslevel -- Compression level of zipped glyphs (0-9, -1 for zlib default).
+        reuse         -- Copy zipped files of unchanged glyphs (see Font.save).
+        """
+        self._stm = stm
+        self._header = (version, vendor, type, name, author, description, boundary, password, unknown, uuid)
+        self.num_glyphs = num_glyphs
+        self.workers = workers
+        self.compresslevel = compresslevel
+        self.reuse = reuse
+        self.count = 0
+        self._preview = []
+        self._zip = None
+
+        self._header_pos = None
+        if hasattr(stm, 'seekable') and stm.seekable():
+            self._header_pos = stm.tell()
+        elif num_glyphs is None:
+            raise Exception('Number of glyphs is required for non-seekable stream')
+        write_int(stm, version)
+        head_block = self._header_block(num_glyphs or 0)
         write_int(stm, len(head_block))
         stm.write(head_block)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+
+    def _header_block(self, num_glyphs):
+        (version, vendor, type, name, author, description, boundary, password, unknown, uuid) = self._header
+        head_stm = BinaryWriter()
+        write_utf_string(head_stm, vendor)
+        write_int(head_stm, type)
+        write_utf_string(head_stm, name)
+        write_utf_string(head_stm, author)
+        write_utf_string(head_stm, description)
+        write_int(head_stm, boundary)
+        write_int(head_stm, num_glyphs)
+        if version >= 2:
+            write_utf_string(head_stm, password)
+        if version >= 4:
+            write_raw_string(head_stm, unknown)
+        if version >= 7:
+            write_utf_string(head_stm, uuid)
+        head_block = head_stm.getvalue()
+        if version >= 5:
+            head_block = kvenjoy.cipher.encrypt(head_block, Font.key)
+        return head_block
+
+    def write(self, glyph):
+        """Write a glyph.
+
+        Arguments:
+        glyph -- The Glyph object.
+        """
+        self._write(glyph, _compress_glyph(glyph, self.compresslevel, self.reuse))
+
+    def write_glyphs(self, glyphs):
+        """Write glyphs from an iterable (e.g. a generator).
+
+        Glyphs are compressed by a pool of worker threads if there are workers,
+        only a bounded number of glyphs is in flight at any time.
+
+        Arguments:
+        glyphs -- Iterable of Glyph objects.
+        """
+        if self.workers is None or self.workers <= 1:
+            for g in glyphs:
+                self.write(g)
+            return
+        # Imported on demand, it's costly and only needed with workers
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = collections.deque()
+            for g in glyphs:
+                pending.append((g, executor.submit(_compress_glyph, g, self.compresslevel, self.reuse)))
+                if len(pending) >= self.workers * 16:
+                    (g, f) = pending.popleft()
+                    self._write(g, f.result())
+            while pending:
+                (g, f) = pending.popleft()
+                self._write(g, f.result())
+
+    def _write(self, glyph, member):
+        self.count += 1
+        if self._preview is not None:
+            self._preview.append((glyph, member))
+            if len(self._preview) >= FontWriter.max_preview:
+                self._flush_preview()
+        else:
+            self._zip.write_raw(*member)
+
+    def _flush_preview(self):
         # Write some non-zipped glyphs
         # TODO: Find out what exactly these non-zipped glyphs are for.
-        write_int(stm, min(30, len(self.glyphs)))
-        for g in self.glyphs:
-            g.save(stm)
+        write_int(self._stm, len(self._preview))
+        for (g, member) in self._preview:
+            if isinstance(g, Glyph):
+                g.save(self._stm)
+            else:
+                # Zipped file content is the same as a non-zipped glyph
+                (name, raw, crc, size, compress_type) = member
+                self._stm.write(kvenjoy.archive.inflate_member(
+                    raw, kvenjoy.archive.MemberInfo(name, 0, compress_type, crc, len(raw), size)))
 
         # Write zipped glyphs
-        zstm = io.BytesIO()
-        z = zipfile.ZipFile(zstm, mode='w', compression=zipfile.ZIP_DEFLATED)
-        for g in self.glyphs:
-            gstm = io.BytesIO()
-            g.save(gstm)
-            z.writestr('{:d}'.format(g.code), gstm.getvalue())
-        z.close()
-        stm.write(zstm.getvalue())
+        self._zip = kvenjoy.archive.ZipWriter(self._stm)
+        for (g, member) in self._preview:
+            self._zip.write_raw(*member)
+        self._preview = None
+
+    def close(self):
+        """Finish the zipped glyphs archive and fix number of glyphs in header if needed.
+
+        The output stream is not closed.
+        """
+        if self._preview is not None:
+            self._flush_preview()
+        if self._zip is None:
+            return
+        self._zip.close()
+        self._zip = None
+        if self.count != self.num_glyphs:
+            if self._header_pos is None:
+                raise Exception('Number of glyphs written {} does not match declared {}'.format(self.count, self.num_glyphs))
+            end = self._stm.tell()
+            head_block = self._header_block(self.count)
+            self._stm.seek(self._header_pos + 8)
+            self._stm.write(head_block)
+            self._stm.seek(end)
+            self.num_glyphs = self.count
+
+# Original zipped file of a glyph
+_RawMember = collections.namedtuple('_RawMember', ('raw', 'CRC', 'file_size', 'compress_type'))
+
+def _load_member(raw, zi):
+    """Inflate and parse a raw glyph member, the member is kept in the glyph."""
+    g = Glyph.load(BinaryReader(kvenjoy.archive.inflate_member(raw, zi)))
+    g.member = _RawMember(raw, zi.CRC, zi.file_size, zi.compress_type)
+    return g
+
+def _encode_glyph(g):
+    gstm = BinaryWriter()
+    g.save(gstm)
+    return gstm.getvalue()
+
+def _snapshot(g):
+    """Take references to content of a glyph (compared by identity first).
+
+    Buffers of strokes may be modified in place, a checksum of their content
+    is taken as well.
+    """
+    crc = 0
+    for stroke in g.strokes:
+        crc = zlib.crc32(stroke.cmds, zlib.crc32(stroke.floats, crc))
+    return (g.code, g.strokes, tuple(g.strokes), crc)
+
+def _changed(g):
+    """Tell if a glyph is no longer encoded as its original zipped file."""
+    m = g.member
+    data = _encode_glyph(g)
+    return len(data) != m.file_size or zlib.crc32(data) != m.CRC
+
+def _compress_glyph(g, compresslevel, reuse=True):
+    """Encode and compress a glyph.
+
+    Arguments:
+    g             -- The glyph, or an already complete tuple (see return).
+    compresslevel -- Compression level (0-9, -1 for zlib default).
+    reuse         -- Copy original zipped file of unchanged glyph.
+    return        -- (name, compressed bytes, CRC-32, size, compression type) of the zipped file.
+    """
+    if isinstance(g, tuple):
+        return g
+    name = '{:d}'.format(g.code)
+    m = g.member if reuse else None
+    data = _encode_glyph(g)
+    crc = zlib.crc32(data)
+    if m is not None and m.CRC == crc and m.file_size == len(data):
+        return (name, m.raw, m.CRC, m.file_size, m.compress_type)
+    return (name, kvenjoy.archive.deflate(data, compresslevel), crc, len(data), kvenjoy.archive.ZIP_DEFLATED)
+
+def _load_glyphs_parallel(stm, infos, workers):
+    """Inflate and parse zipped glyphs with a pool of worker processes."""
+    # Raw members are read here, sequentially, and split into a few chunks
+    # per worker so that slow chunks do not stall the pool.
+    num_chunks = min(len(infos), workers * 4)
+    chunk_size = (len(infos) + num_chunks - 1) // num_chunks
+    chunks = []
+    for i in range(0, len(infos), chunk_size):
+        chunks.append([(kvenjoy.archive.MemberInfo(zi.filename, zi.header_offset, zi.compress_type, zi.CRC,
+                                                   zi.compress_size, zi.file_size),
+                        kvenjoy.archive.read_raw_member(stm, zi))
+                       for zi in infos[i:i + chunk_size]])
+
+    import concurrent.futures
+    glyphs = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_parse_members, chunks)
+        for (chunk, (codes, counts, float_bounds, cmd_bounds, float_bytes, cmds)) in zip(chunks, results):
+            floats = array('f')
+            floats.frombytes(float_bytes)
+            si = 0
+            for ((zi, raw), code, n) in zip(chunk, codes, counts):
+                strokes = []
+                for k in range(si, si + n):
+                    strokes.append(Stroke.from_buffers(floats[float_bounds[k]:float_bounds[k + 1]],
+                                                       cmds[cmd_bounds[k]:cmd_bounds[k + 1]]))
+                g = Glyph(code, strokes)
+                g.member = _RawMember(raw, zi.CRC, zi.file_size, zi.compress_type)
+                glyphs.append(g)
+                si += n
+    return glyphs
+
+def _parse_members(members):
+    """Inflate and parse raw glyph members (runs in a worker process).
+
+    Strokes of all glyphs are packed into one coordinates buffer (native byte
+    order) and one command buffer so that results are cheap to send back.
+
+    Arguments:
+    members -- List of (MemberInfo, raw bytes).
+    return  -- (codes, stroke counts, float bounds, command bounds, float bytes, command bytes).
+    """
+    codes = []
+    counts = array('I')
+    float_bounds = array('I', [0])
+    cmd_bounds = array('I', [0])
+    floats = array('f')
+    cmds = bytearray()
+    for (zi, raw) in members:
+        g = Glyph.load(BinaryReader(kvenjoy.archive.inflate_member(raw, zi)))
+        codes.append(g.code)
+        counts.append(len(g.strokes))
+        for s in g.strokes:
+            floats.extend(s.floats)
+            cmds.extend(s.cmds)
+            float_bounds.append(len(floats))
+            cmd_bounds.append(len(cmds))
+    return (codes, counts, float_bounds, cmd_bounds, floats.tobytes(), bytes(cmds))
+
+def open_font(path, lazy=True, cache_size=256, workers=None, keep_preview=False, mapped=True):
+    """Open a font file through a read-only memory mapping.
+
+    Header and ZIP central directory are read straight from the mapping and
+    glyphs are inflated from it on demand, so file content is never copied
+    into a stream buffer. In lazy mode the mapping is kept open until the
+    font is closed, otherwise it is closed once all glyphs are loaded.
+
+    NOTE: Accessing a mapping of a file truncated by someone else kills the
+    process (SIGBUS), long running processes that keep fonts open should
+    rather read through a file object (mapped=False).
+
+    Arguments:
+    path         -- Path of the font file.
+    lazy         -- Load glyphs on demand (see Font.load).
+    cache_size   -- Maximum number of parsed glyphs cached in lazy mode.
+    workers      -- Number of worker processes (eager mode only).
+    keep_preview -- Parse non-zipped glyphs (see Font.load).
+    mapped       -- Read through a memory mapping rather than a file object.
+    return       -- A new Font object.
+    """
+    if mapped:
+        with open(path, 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        m = open(path, 'rb')
+    try:
+        font = Font.load(m, lazy=lazy, cache_size=cache_size, workers=workers, keep_preview=keep_preview)
+    except BaseException:
+        m.close()
+        raise
+    if lazy:
+        font.glyphs._owned = m
+    else:
+        m.close()
+    return font
@@ -1,12 +1,23 @@
 
+from array import array
 from kvenjoy.io import *
 
 class Point:
-    """A 2D point with x, y coordinates"""
+    """A 2D point with x, y coordinates
+
+    Points are immutable, create a new point to change coordinates.
+    """
+    __slots__ = ('x', 'y')
 
     def __init__(self, x, y):
-        self.x = float(x)
-        self.y = float(y)
+        _set_x(self, float(x))
+        _set_y(self, float(y))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable, assign new points to Stroke.points'
+                             .format(type(self).__name__))
+
+    __delattr__ = __setattr__
 
     def bounding_box(self):
         """Calculate bounding box that could just hold this point
@@ -14,35 +25,245 @@ class Point:
         return (self.x, self.y, self.x, self.y)
 
 class BezierPoint:
-    """A Bezier point with two extra control points"""
+    """A Bezier point with two extra control points
+
+    Bezier points are immutable like Point.
+    """
+    __slots__ = ('cx1', 'cy1', 'cx2', 'cy2', 'x', 'y')
 
     def __init__(self, cx1, cy1, cx2, cy2, x, y):
-        self.cx1 = float(cx1)
-        self.cy1 = float(cy1)
-        self.cx2 = float(cx2)
-        self.cy2 = float(cy2)
-        self.x = float(x)
-        self.y = float(y)
+        _set_cx1(self, float(cx1))
+        _set_cy1(self, float(cy1))
+        _set_cx2(self, float(cx2))
+        _set_cy2(self, float(cy2))
+        _set_bx(self, float(x))
+        _set_by(self, float(y))
+
+    __setattr__ = Point.__setattr__
+    __delattr__ = Point.__delattr__
 
     def bounding_box(self):
         """Calculate bounding box that could just hold this Bezier point
+
+        NOTE: This is the hull of control points, see Stroke.bounding_box for
+        the tight box of the curve.
         """
         return (min(self.cx1, self.cx2, self.x),
                 min(self.cy1, self.cy2, self.y),
                 max(self.cx1, self.cx2, self.x),
                 max(self.cy1, self.cy2, self.y))
 
+# Slot setters bypassing __setattr__ of immutable points
+_set_x = Point.x.__set__
+_set_y = Point.y.__set__
+_set_cx1 = BezierPoint.cx1.__set__
+_set_cy1 = BezierPoint.cy1.__set__
+_set_cx2 = BezierPoint.cx2.__set__
+_set_cy2 = BezierPoint.cy2.__set__
+_set_bx = BezierPoint.x.__set__
+_set_by = BezierPoint.y.__set__
+
+def bezier_extrema(p0, p1, p2, p3):
+    """Calculate range of a cubic Bezier curve along one axis.
+
+    Arguments:
+    p0, p3 -- Coordinates of start/end points.
+    p1, p2 -- Coordinates of control points.
+    return -- (min, max) of the curve.
+    """
+    lo = min(p0, p3)
+    hi = max(p0, p3)
+    if lo <= p1 <= hi and lo <= p2 <= hi:
+        # Curve lies within the hull of its control points
+        return (lo, hi)
+    # Roots of derivative (divided by 3): a*t^2 + b*t + c
+    a = 3 * (p1 - p2) + p3 - p0
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    if abs(a) < 1e-12:
+        ts = [-c / b] if b != 0 else []
+    else:
+        d = b * b - 4 * a * c
+        if d < 0:
+            ts = []
+        else:
+            d = d ** 0.5
+            ts = [(-b + d) / (2 * a), (-b - d) / (2 * a)]
+    for t in ts:
+        if 0 < t < 1:
+            u = 1 - t
+            v = u * u * u * p0 + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t * t * t * p3
+            if v < lo:
+                lo = v
+            elif v > hi:
+                hi = v
+    return (lo, hi)
+
+def union_boxes(boxes):
+    """Calculate bounding box that could just hold all given boxes.
+
+    Arguments:
+    boxes  -- Iterable of (x0, y0, x1, y1), boxes of None are ignored.
+    return -- (x0, y0, x1, y1), all None if there is no box.
+    """
+    (x0, y0, x1, y1) = (None, None, None, None)
+    for (bx0, by0, bx1, by1) in boxes:
+        if bx0 is None:
+            continue
+        if x0 is None:
+            (x0, y0, x1, y1) = (bx0, by0, bx1, by1)
+            continue
+        if bx0 < x0:
+            x0 = bx0
+        if by0 < y0:
+            y0 = by0
+        if bx1 > x1:
+            x1 = bx1
+        if by1 > y1:
+            y1 = by1
+    return (x0, y0, x1, y1)
 
 class Stroke:
     """Represents a continuous mark (path).
 
-    A stroke contains a list of several Point or BezierPoint instances, from
-    start point to end point of the path.
+    A stroke contains several Point or BezierPoint instances, from start point
+    to end point of the path.
+
+    Internally a stroke is stored the same way as it is on disk: a coordinates
+    buffer (array of 32-bit floats) and a command buffer (bytes), see README.md
+    for details. Point/BezierPoint objects are only created on access of the
+    'points' member.
+
+    Bounding box is calculated once from the buffers, it's invalidated when
+    points are assigned but not when the buffers are modified in place.
     """
+    __slots__ = ('_floats', '_cmds', '_bbox')
 
     def __init__(self, points):
         self.points = points
 
+    @classmethod
+    def from_buffers(cls, floats, cmds):
+        """Construct a stroke from coordinates and command buffers.
+
+        Arguments:
+        floats -- Coordinates buffer (array of 'f').
+        cmds   -- Command buffer (bytes).
+        return -- New Stroke object.
+        """
+        stroke = cls.__new__(cls)
+        stroke._floats = floats
+        stroke._cmds = bytes(cmds)
+        stroke._bbox = None
+        return stroke
+
+    @property
+    def floats(self):
+        """Coordinates buffer (array of 'f')"""
+        return self._floats
+
+    @property
+    def cmds(self):
+        """Command buffer (bytes)"""
+        return self._cmds
+
+    @property
+    def points(self):
+        """Tuple of Point/BezierPoint objects built from the buffers.
+
+        The tuple is a snapshot of immutable points, assign a new sequence of
+        points to this member to modify the stroke.
+        """
+        floats = self._floats
+        points = []
+        pi = 0
+        for cmd in self._cmds:
+            if cmd == 2:
+                points.append(BezierPoint(*floats[pi:pi + 6]))
+                pi += 6
+            else:
+                points.append(Point(floats[pi], floats[pi + 1]))
+                pi += 2
+        return tuple(points)
+
+    @points.setter
+    def points(self, points):
+        floats = array('f')
+        cmds = bytearray()
+        for p in points:
+            if not cmds:
+                # Start a new stroke
+                cmds.append(0)
+                floats.append(p.x)
+                floats.append(p.y)
+            elif isinstance(p, Point):
+                cmds.append(1)
+                floats.append(p.x)
+                floats.append(p.y)
+            elif isinstance(p, BezierPoint):
+                cmds.append(2)
+                floats.extend((p.cx1, p.cy1, p.cx2, p.cy2, p.x, p.y))
+            else:
+                raise Exception('Unknown point type "{}"'.format(type(p).__name__))
+        self._floats = floats
+        self._cmds = bytes(cmds)
+        self._bbox = None
+
+    def bounding_box(self):
+        """Calculate bounding box that could just hold this stroke
+
+        Extrema of Bezier curves are taken into account, rather than their
+        control points.
+
+        Arguments:
+        return -- (x0, y0, x1, y1) Left top and right bottom coordinates of the bounding box.
+        """
+        if self._bbox is None:
+            self._bbox = self._calc_bounding_box()
+        return self._bbox
+
+    def _calc_bounding_box(self):
+        floats = self._floats
+        cmds = self._cmds
+        if not cmds:
+            return (None, None, None, None)
+        if 2 not in cmds:
+            # Polyline, all coordinates are end points
+            xs = floats[0::2]
+            ys = floats[1::2]
+            return (min(xs), min(ys), max(xs), max(ys))
+
+        # Box of end points first, then extend it by curves whose control
+        # points stick out of it
+        xs = []
+        ys = []
+        curves = []
+        pi = 0
+        for cmd in cmds:
+            if cmd == 2:
+                if pi > 0:
+                    curves.append(pi)
+                else:
+                    # No start point, take control points as is
+                    xs.extend(floats[0:4:2])
+                    ys.extend(floats[1:4:2])
+                pi += 4
+            xs.append(floats[pi])
+            ys.append(floats[pi + 1])
+            pi += 2
+        (x0, y0, x1, y1) = (min(xs), min(ys), max(xs), max(ys))
+        for pi in curves:
+            (cx1, cy1, cx2, cy2, x, y) = floats[pi:pi + 6]
+            if not (x0 <= cx1 <= x1 and x0 <= cx2 <= x1):
+                (lo, hi) = bezier_extrema(floats[pi - 2], cx1, cx2, x)
+                x0 = min(x0, lo)
+                x1 = max(x1, hi)
+            if not (y0 <= cy1 <= y1 and y0 <= cy2 <= y1):
+                (lo, hi) = bezier_extrema(floats[pi - 1], cy1, cy2, y)
+                y0 = min(y0, lo)
+                y1 = max(y1, hi)
+        return (x0, y0, x1, y1)
+
     @classmethod
     def load_list(cls, stm):
         """Construct list of Stroke from given input stream.
@@ -55,37 +276,34 @@ class Stroke:
         """
         # Read coordinates buffer
         (num_floats,) = read_int(stm)
-        floats = list(read_float(stm, num_floats))
+        floats = read_float_array(stm, num_floats)
 
         # Read command buffer
         (num_cmds,) = read_int(stm)
-        cmds = list(read_byte(stm, num_cmds))
+        cmds = stm.read(num_cmds)
+        if len(cmds) != num_cmds:
+            raise Exception('Unexpected end of stream')
 
-        # Construct strokes from command and coordinates buffer
+        bad = cmds.translate(None, b'\x00\x01\x02')
+        if bad:
+            raise Exception('Unknown glyph command "0x{:02x}"'.format(bad[0]))
+
+        # Split buffers into strokes, each stroke starts with command 0
         strokes = []
-        points = []
-        pi = 0
-        for cmd in cmds:
-            if cmd == 0:
-                # Start a new stroke
-                if points:
-                    strokes.append(cls(points))
-                    points = []
-                points.append(Point(floats[pi], floats[pi + 1]))
-                pi += 2
-            elif cmd == 1:
-                # Append a point to current stroke
-                points.append(Point(floats[pi], floats[pi + 1]))
-                pi += 2
-            elif cmd == 2:
-                # Append a Bezier point to current stroke
-                points.append(BezierPoint(floats[pi], floats[pi + 1], floats[pi + 2], floats[pi + 3], floats[pi + 4], floats[pi + 5]))
-                pi += 6
-            else:
-                raise Exception('Unknown glyph command "0x{:02x}"'.format(cmd))
-        # Append last stroke (if there's any)
-        if points:
-            strokes.append(cls(points))
+        ci = 0
+        fi = 0
+        while ci < num_cmds:
+            cj = cmds.find(0, ci + 1)
+            if cj < 0:
+                cj = num_cmds
+            fj = fi + 2 * (cj - ci) + 4 * cmds.count(2, ci, cj)
+            stroke = cls.from_buffers(floats[fi:fj], cmds[ci:cj])
+            if cmds[ci] != 0:
+                # Leading point without a start command
+                stroke = cls(stroke.points)
+            strokes.append(stroke)
+            ci = cj
+            fi = fj
 
         return strokes
 
@@ -100,32 +318,14 @@ class Stroke:
         return -- List of Stroke objects to be written to the stream.
         """
         # Rebuild coordinate and command buffer
-        floats = []
-        cmds = []
+        floats = array('f')
+        cmds = bytearray()
         for stroke in strokes:
-            cmds.append(0)
-            floats.append(stroke.points[0].x)
-            floats.append(stroke.points[0].y)
-            for p in stroke.points[1:]:
-                if isinstance(p, Point):
-                    cmds.append(1)
-                    floats.append(p.x)
-                    floats.append(p.y)
-                elif isinstance(p, BezierPoint):
-                    cmds.append(2)
-                    floats.append(p.cx1)
-                    floats.append(p.cy1)
-                    floats.append(p.cx2)
-                    floats.append(p.cy2)
-                    floats.append(p.x)
-                    floats.append(p.y)
-                else:
-                    raise Exception('Unknown point type "{}"'.format(type(p).__name__))
+            floats.extend(stroke.floats)
+            cmds.extend(stroke.cmds)
 
         # Write coordinates buffer
         write_int(stm, len(floats))
-        for f in floats:
-            write_float(stm, f)
+        write_float_array(stm, floats)
         write_int(stm, len(cmds))
-        for c in cmds:
-            write_byte(stm, c)
+        stm.write(cmds)
@@ -2,8 +2,363 @@
 Stream input/output wrappers.
 
 Byte order is big endian.
+
+BinaryReader/BinaryWriter work on in-memory buffers with precompiled structs,
+StreamReader does the same on a buffered input stream. Module level functions
+accept either a stream or a BinaryReader/BinaryWriter.
 """
+import sys
 import struct
+import functools
+from array import array
+
+@functools.lru_cache(maxsize=256)
+def _struct(code, count):
+    """Return a cached big endian struct for given type code and count."""
+    return struct.Struct('>{}{}'.format(count, code))
+
+class BinaryReader:
+    """Reads values from an in-memory buffer.
+
+    The buffer (any object that supports buffer protocol) is accessed through
+    a memoryview with a cursor, it is never copied. A BinaryReader also
+    provides read() so it could be used wherever an input stream is expected.
+    """
+
+    def __init__(self, buf, offset=0):
+        """Arguments:
+        buf    -- The buffer to read from.
+        offset -- Initial cursor position.
+        """
+        self._view = memoryview(buf).cast('B')
+        self.offset = offset
+
+    def __len__(self):
+        return len(self._view)
+
+    def remaining(self):
+        """Return number of bytes after the cursor."""
+        return len(self._view) - self.offset
+
+    def _fill(self, size):
+        """Try to make given number of bytes available after the cursor.
+
+        The view and cursor might be changed, a plain buffer can't grow though.
+
+        return -- True if there are enough bytes.
+        """
+        return False
+
+    def _take(self, size):
+        """Advance cursor by given size and return previous cursor."""
+        offset = self.offset
+        if offset + size > len(self._view):
+            if not self._fill(size):
+                raise Exception('Unexpected end of buffer')
+            offset = self.offset
+        self.offset = offset + size
+        return offset
+
+    def read(self, size=-1):
+        """Read raw bytes like a stream would do.
+
+        Arguments:
+        size   -- Number of bytes to be read, negative for all the rest.
+        return -- Bytes read (might be shorter at end of buffer).
+        """
+        offset = self.offset
+        if size < 0 or offset + size > len(self._view):
+            size = len(self._view) - offset
+        self.offset = offset + size
+        return self._view[offset:offset + size].tobytes()
+
+    def skip(self, size):
+        """Skip given number of bytes."""
+        self._take(size)
+
+    def _unpack(self, code, count):
+        s = _struct(code, count)
+        offset = self.offset
+        if offset + s.size > len(self._view):
+            offset = self._take(s.size)
+        else:
+            self.offset = offset + s.size
+        return s.unpack_from(self._view, offset)
+
+    def read_byte(self, count=1):
+        """Read byte(s).
+
+        Arguments:
+        count  -- Number of bytes to be read.
+        return -- Tuple of bytes.
+        """
+        return self._unpack('B', count)
+
+    def read_short(self, count=1):
+        """Read half word(s).
+
+        Arguments:
+        count  -- Number of half words to be read.
+        return -- Tuple of half words.
+        """
+        return self._unpack('H', count)
+
+    def read_int(self, count=1):
+        """Read integer(s).
+
+        Arguments:
+        count  -- Number of integers to be read.
+        return -- Tuple of integers.
+        """
+        return self._unpack('I', count)
+
+    def read_float(self, count=1):
+        """Read float(s).
+
+        Arguments:
+        count  -- Number of floats to be read.
+        return -- Tuple of floats.
+        """
+        return self._unpack('f', count)
+
+    def read_float_array(self, count):
+        """Read float(s) into an array of 'f' in one go.
+
+        Arguments:
+        count  -- Number of floats to be read.
+        return -- The array of floats.
+        """
+        offset = self._take(4 * count)
+        floats = array('f')
+        floats.frombytes(self._view[offset:offset + 4 * count])
+        if sys.byteorder == 'little':
+            floats.byteswap()
+        return floats
+
+    def read_c_string(self, count=1):
+        """Read NULL terminated C string(s).
+
+        Arguments:
+        count  -- Number of strings to be read.
+        return -- Tuple of strings.
+        """
+        ss = []
+        for _ in range(count):
+            # Number of bytes after cursor known not to be NULL
+            scanned = 0
+            step = 64
+            while True:
+                if self.offset + scanned >= len(self._view) and not self._fill(scanned + 1):
+                    raise Exception('Unexpected end of buffer')
+                pos = self.offset + scanned
+                chunk = self._view[pos:pos + step].tobytes()
+                i = chunk.find(0)
+                if i >= 0:
+                    break
+                scanned += len(chunk)
+                step *= 2
+            begin = self.offset
+            end = pos + i
+            self.offset = end + 1
+            ss.append(str(self._view[begin:end], 'utf-8'))
+        return tuple(ss)
+
+    def read_utf_string(self, count=1):
+        """Read UTF-8 encoded string(s).
+
+        Arguments:
+        count  -- Number of strings to be read.
+        return -- Tuple of strings.
+        """
+        ss = []
+        for _ in range(count):
+            (size,) = self._unpack('H', 1)
+            offset = self._take(size)
+            ss.append(str(self._view[offset:offset + size], 'utf-8'))
+        return tuple(ss)
+
+    def read_raw_string(self, count=1):
+        """Read raw string(s).
+
+        Arguments:
+        count  -- Number of strings to be read.
+        return -- Tuple of bytes.
+        """
+        ss = []
+        for _ in range(count):
+            (size,) = self._unpack('H', 1)
+            offset = self._take(size)
+            ss.append(self._view[offset:offset + size].tobytes())
+        return tuple(ss)
+
+class StreamReader(BinaryReader):
+    """Reads values from an input stream through a buffer.
+
+    Buffer is refilled from the stream as needed, so a (possibly huge or
+    decompressing) stream could be parsed incrementally with BinaryReader
+    methods. Only the unread part of the buffer is kept on refill.
+    """
+
+    def __init__(self, stm, buffer_size=1 << 16):
+        """Arguments:
+        stm         -- The input stream.
+        buffer_size -- Minimum number of bytes to be read from the stream at once.
+        """
+        BinaryReader.__init__(self, b'')
+        self._stm = stm
+        self.buffer_size = buffer_size
+
+    def remaining(self):
+        """Return number of buffered bytes after the cursor."""
+        return len(self._view) - self.offset
+
+    def _fill(self, size):
+        buf = bytearray(self._view[self.offset:])
+        while len(buf) < size:
+            bs = self._stm.read(max(self.buffer_size, size - len(buf)))
+            if not bs:
+                break
+            buf += bs
+        self._view = memoryview(buf)
+        self.offset = 0
+        return len(buf) >= size
+
+    def skip(self, size):
+        """Skip given number of bytes, skipped bytes are not buffered."""
+        rest = size - (len(self._view) - self.offset)
+        if rest <= 0:
+            self.offset += size
+            return
+        self._view = memoryview(b'')
+        self.offset = 0
+        while rest > 0:
+            chunk = self._stm.read(min(rest, self.buffer_size))
+            if not chunk:
+                raise Exception('Unexpected end of stream')
+            rest -= len(chunk)
+
+    def read(self, size=-1):
+        """Read raw bytes like a stream would do.
+
+        Arguments:
+        size   -- Number of bytes to be read, negative for all the rest.
+        return -- Bytes read (might be shorter at end of stream).
+        """
+        offset = self.offset
+        if size >= 0 and offset + size <= len(self._view):
+            self.offset = offset + size
+            return self._view[offset:offset + size].tobytes()
+        bs = self._view[offset:].tobytes()
+        self._view = memoryview(b'')
+        self.offset = 0
+        if size < 0:
+            return bs + self._stm.read()
+        rest = size - len(bs)
+        chunks = [bs]
+        while rest > 0:
+            chunk = self._stm.read(rest)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            rest -= len(chunk)
+        return b''.join(chunks)
+
+class BinaryWriter:
+    """Writes values into a growing in-memory buffer.
+
+    A BinaryWriter also provides write() so it could be used wherever an output
+    stream is expected.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def __len__(self):
+        return len(self._buf)
+
+    def getvalue(self):
+        """Return content written so far (bytes)."""
+        return bytes(self._buf)
+
+    def write(self, bs):
+        """Write raw bytes like a stream would do."""
+        self._buf += bs
+        return len(bs)
+
+    def _pack(self, code, *args):
+        self._buf += _struct(code, len(args)).pack(*args)
+
+    def write_byte(self, *args):
+        """Write byte(s).
+
+        Arguments:
+        *args -- Bytes to be written.
+        """
+        self._pack('B', *args)
+
+    def write_short(self, *args):
+        """Write half word(s).
+
+        Arguments:
+        *args -- Half words to be written.
+        """
+        self._pack('H', *args)
+
+    def write_int(self, *args):
+        """Write integer(s).
+
+        Arguments:
+        *args -- Integers to be written.
+        """
+        self._pack('I', *args)
+
+    def write_float(self, *args):
+        """Write float(s).
+
+        Arguments:
+        *args -- Floats to be written.
+        """
+        self._pack('f', *args)
+
+    def write_float_array(self, floats):
+        """Write an array of 'f' in one go.
+
+        Arguments:
+        floats -- Array of floats to be written.
+        """
+        if sys.byteorder == 'little':
+            floats = array('f', floats)
+            floats.byteswap()
+        self._buf += floats
+
+    def write_c_string(self, *args):
+        """Write NULL terminated string(s).
+
+        Arguments:
+        *args -- Strings to be written.
+        """
+        for s in args:
+            self._buf += s.encode('utf-8')
+            self._buf.append(0)
+
+    def write_utf_string(self, *args):
+        """Write UTF-8 encoded string(s).
+
+        Arguments:
+        *args -- Strings to be written.
+        """
+        for s in args:
+            self.write_raw_string(s.encode('utf-8'))
+
+    def write_raw_string(self, *args):
+        """Write raw string(s).
+
+        Arguments:
+        *args -- Strings to be written.
+        """
+        for bs in args:
+            self._pack('H', len(bs))
+            self._buf += bs
 
 def read_byte(stm, count = 1):
     """Read byte(s) from stream.
@@ -12,7 +367,7 @@ def read_byte(stm, count = 1):
     stm   -- Input stream.
     count -- Number of bytes to be read.
     """
-    return _read(stm, '>{}B'.format(count))
+    return _read(stm, 'B', count)
 
 def read_short(stm, count = 1):
     """Read half word(s) from stream.
@@ -21,7 +376,7 @@ def read_short(stm, count = 1):
     stm   -- Input stream.
     count -- Number of half words to be read.
     """
-    return _read(stm, '>{}H'.format(count))
+    return _read(stm, 'H', count)
 
 def read_int(stm, count = 1):
     """Read integer(s) from stream.
@@ -30,7 +385,7 @@ def read_int(stm, count = 1):
     stm   -- Input stream.
     count -- Number of integers to be read.
     """
-    return _read(stm, '>{}I'.format(count))
+    return _read(stm, 'I', count)
 
 def read_float(stm, count = 1):
     """Read float(s) from stream.
@@ -39,7 +394,26 @@ def read_float(stm, count = 1):
     stm   -- Input stream.
     count -- Number of floats to be read.
     """
-    return _read(stm, '>{}f'.format(count))
+    return _read(stm, 'f', count)
+
+def read_float_array(stm, count):
+    """Read float(s) from stream into an array of 'f' in one go.
+
+    Arguments:
+    stm    -- Input stream.
+    count  -- Number of floats to be read.
+    return -- The array of floats.
+    """
+    if isinstance(stm, BinaryReader):
+        return stm.read_float_array(count)
+    floats = array('f')
+    bs = stm.read(4 * count)
+    if len(bs) != 4 * count:
+        raise Exception('Unexpected end of stream')
+    floats.frombytes(bs)
+    if sys.byteorder == 'little':
+        floats.byteswap()
+    return floats
 
 def read_c_string(stm, count = 1):
     """Read NULL terminated C strings from stream.
@@ -48,13 +422,17 @@ def read_c_string(stm, count = 1):
     stm   -- Input stream.
     count -- Number of strings to be read.
     """
+    if isinstance(stm, BinaryReader):
+        return stm.read_c_string(count)
     ss = []
     for _ in range(count):
         bs = bytearray()
-        (b,) = read_byte(stm)
-        while b != 0:
-            bs.append(b)
-            (b,) = read_byte(stm)
+        b = stm.read(1)
+        while b != b'\x00':
+            if not b:
+                raise Exception('Unexpected end of stream')
+            bs += b
+            b = stm.read(1)
         ss.append(bs.decode('utf-8'))
     return tuple(ss)
 
@@ -67,6 +445,8 @@ def read_utf_string(stm, count = 1):
     stm   -- Input stream.
     count -- Number of strings to be read.
     """
+    if isinstance(stm, BinaryReader):
+        return stm.read_utf_string(count)
     ss = []
     for i in range(count):
         (size,) = read_short(stm)
@@ -81,6 +461,8 @@ def read_raw_string(stm, count = 1):
     stm   -- Input stream.
     count -- Number of strings to be read.
     """
+    if isinstance(stm, BinaryReader):
+        return stm.read_raw_string(count)
     ss = []
     for i in range(count):
         (size,) = read_short(stm)
@@ -88,6 +470,26 @@ def read_raw_string(stm, count = 1):
         ss.append(bs)
     return tuple(ss)
 
+def skip(stm, size):
+    """Skip given number of bytes of stream.
+
+    Seekable streams are seeked, others are read and the bytes discarded.
+
+    Arguments:
+    stm  -- Input stream.
+    size -- Number of bytes to be skipped.
+    """
+    if isinstance(stm, BinaryReader):
+        stm.skip(size)
+    elif hasattr(stm, 'seek') and (not hasattr(stm, 'seekable') or stm.seekable()):
+        stm.seek(size, 1)
+    else:
+        while size > 0:
+            bs = stm.read(min(size, 65536))
+            if not bs:
+                raise Exception('Unexpected end of stream')
+            size -= len(bs)
+
 def write_byte(stm, *args):
     """Write byte(s) to stream.
 
@@ -95,7 +497,7 @@ def write_byte(stm, *args):
     stm   -- Output stream.
     *args -- Bytes to be written.
     """
-    _write(stm, '>{}B'.format(len(args)), *args)
+    _write(stm, 'B', *args)
 
 def write_short(stm, *args):
     """Write half word(s) to stream.
@@ -104,7 +506,7 @@ def write_short(stm, *args):
     stm   -- Output stream.
     *args -- Half words to be written.
     """
-    _write(stm, '>{}H'.format(len(args)), *args)
+    _write(stm, 'H', *args)
 
 def write_int(stm, *args):
     """Write integer(s) to stream.
@@ -113,7 +515,7 @@ def write_int(stm, *args):
     stm   -- Output stream.
     *args -- Integers to be written.
     """
-    _write(stm, '>{}I'.format(len(args)), *args)
+    _write(stm, 'I', *args)
 
 def write_float(stm, *args):
     """Write float(s) to stream.
@@ -122,7 +524,19 @@ def write_float(stm, *args):
     stm   -- Output stream.
     *args -- Floats to be written.
     """
-    _write(stm, '>{}f'.format(len(args)), *args)
+    _write(stm, 'f', *args)
+
+def write_float_array(stm, floats):
+    """Write an array of 'f' to stream in one go.
+
+    Arguments:
+    stm    -- Output stream.
+    floats -- Array of floats to be written.
+    """
+    if sys.byteorder == 'little':
+        floats = array('f', floats)
+        floats.byteswap()
+    stm.write(floats.tobytes())
 
 def write_c_string(stm, *args):
     """Write NULL terminated string(s) to stream.
@@ -162,11 +576,12 @@ def write_raw_string(stm, *args):
         write_short(stm, len(bs))
         stm.write(bs)
 
-def _read(stm, fmt):
-    bs = stm.read(struct.calcsize(fmt))
-    return struct.unpack_from(fmt, bs, 0)
+def _read(stm, code, count):
+    s = _struct(code, count)
+    if isinstance(stm, BinaryReader):
+        offset = stm._take(s.size)
+        return s.unpack_from(stm._view, offset)
+    return s.unpack(stm.read(s.size))
 
-def _write(stm, fmt, *args):
-    bs = bytearray(struct.calcsize(fmt))
-    struct.pack_into(fmt, bs, 0, *args)
-    stm.write(bs)
+def _write(stm, code, *args):
+    stm.write(_struct(code, len(args)).pack(*args))
@@ -0,0 +1,367 @@
+"""
+Long running service that answers requests from fonts kept in memory.
+
+Recently used fonts and GAPs are kept open in a LRU cache of bounded size,
+an entry is reopened when size, modification time or inode of its file
+change. Fonts are loaded lazily and read through file objects rather than
+memory mappings, so files replaced or truncated under the service only make
+requests fail.
+
+Requests are dicts with an 'op' ('dump', 'export', 'render' or 'stats') and
+parameters of the operation, they could be sent either as JSON lines over a
+Unix socket or as HTTP GET requests (/OP?PARAM=VALUE&...) to a local port.
+"""
+import os
+import re
+import socket
+import inspect
+import threading
+import contextlib
+import collections
+import socketserver
+import http.server
+import urllib.parse
+import kvenjoy.gap
+import kvenjoy.gfont
+import kvenjoy.sniff
+from kvenjoy.converter import *
+
+CacheStats = collections.namedtuple('CacheStats', ('size', 'hits', 'misses'))
+
+class _Entry:
+    __slots__ = ('stamp', 'doc', 'lock', 'closed')
+
+    def __init__(self, stamp, doc):
+        self.stamp = stamp
+        self.doc = doc
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if isinstance(self.doc, kvenjoy.gfont.Font):
+                self.doc.close()
+
+class DocumentCache:
+    """LRU cache of open Font and Gap objects.
+
+    A document is only used by one thread at a time (see use()), since lazily
+    loaded fonts share a file position among all their glyphs.
+    """
+
+    def __init__(self, max_size=256, glyph_cache_size=256):
+        """Arguments:
+        max_size         -- Maximum number of open documents.
+        glyph_cache_size -- Maximum number of parsed glyphs cached per font.
+        """
+        self.max_size = max_size
+        self.glyph_cache_size = glyph_cache_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close all documents."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for e in entries:
+            e.close()
+
+    def stats(self):
+        """return -- CacheStats of the cache."""
+        with self._lock:
+            return CacheStats(len(self._entries), self._hits, self._misses)
+
+    @contextlib.contextmanager
+    def use(self, path):
+        """Context manager that gives exclusive access to a document.
+
+        Arguments:
+        path   -- Path of a GFONT/GAP file.
+        return -- Font or Gap object, valid only inside the context.
+        """
+        path = os.path.realpath(path)
+        while True:
+            e = self._get(path)
+            with e.lock:
+                if not e.closed:
+                    yield e.doc
+                    return
+            # Evicted by another thread before being used, try again
+
+    def _get(self, path):
+        st = os.stat(path)
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            e = self._entries.get(path)
+            if e is not None and e.stamp == stamp:
+                self._entries.move_to_end(path)
+                self._hits += 1
+                return e
+
+        # Open the document without blocking other documents
+        e = _Entry(stamp, self._open(path))
+        evicted = []
+        with self._lock:
+            self._misses += 1
+            old = self._entries.pop(path, None)
+            if old is not None:
+                evicted.append(old)
+            self._entries[path] = e
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for x in evicted:
+            x.close()
+        return e
+
+    def _open(self, path):
+        if kvenjoy.sniff.detect(path).type == 'gap':
+            with open(path, 'rb') as f:
+                return kvenjoy.gap.Gap.load(f)
+        return kvenjoy.gfont.open_font(path, lazy=True, cache_size=self.glyph_cache_size, mapped=False)
+
+class Service:
+    """Answers requests from cached documents.
+
+    Results are either dicts/json structs or texts (SVG or JSON).
+    """
+
+    def __init__(self, cache_size=256, root=None, path_cache=None):
+        """Arguments:
+        cache_size -- Maximum number of open documents.
+        root       -- Only files under this directory are served, None for any
+                      file readable by the process (explicit opt-in).
+        path_cache -- PathCache of SVG path data, a new one if None.
+        """
+        self.documents = DocumentCache(cache_size)
+        self.root = None if root is None else os.path.realpath(root)
+        self.path_cache = PathCache() if path_cache is None else path_cache
+        self._ops = {'dump': self.dump, 'export': self.export, 'render': self.render, 'stats': self.stats}
+
+    def close(self):
+        self.documents.close()
+
+    def handle(self, request):
+        """Dispatch a request.
+
+        Arguments:
+        request -- Dict of 'op' and parameters of the operation.
+        return  -- Result of the operation.
+        """
+        params = dict(request)
+        op = params.pop('op', None)
+        func = self._ops.get(op)
+        if func is None:
+            raise Exception('Unknown operation "{}"'.format(op))
+        try:
+            inspect.signature(func).bind(**params)
+        except TypeError as e:
+            raise Exception('Bad parameters of "{}": {}'.format(op, e))
+        return func(**params)
+
+    def dump(self, path, codes=False):
+        """Header fields of a document (and codes of glyphs of a font if codes is set)."""
+        with self.documents.use(self._check(path)) as doc:
+            o = {}
+            if isinstance(doc, kvenjoy.gap.Gap):
+                o['type'] = 'gap'
+                for k in ('version', 'uuid', 'name', 'author', 'description'):
+                    o[k] = getattr(doc, k)
+                o['num_variables'] = len(doc.variables)
+                o['num_strokes'] = sum(len(sg) for sg in doc.stroke_groups)
+            else:
+                o['type'] = 'gfont'
+                for k in ('version', 'vendor', 'name', 'author', 'description', 'boundary', 'uuid'):
+                    o[k] = getattr(doc, k)
+                o['num_glyphs'] = len(doc.glyphs)
+                if _flag(codes):
+                    o['codes'] = doc.glyphs.codes()
+            return o
+
+    def export(self, path, format='svg', precision=None, compact=False):
+        """Whole document as SVG, JSON or JSON Lines text."""
+        precision = None if precision is None else int(precision)
+        compact = _flag(compact)
+        with self.documents.use(self._check(path)) as doc:
+            is_gap = isinstance(doc, kvenjoy.gap.Gap)
+            if format == 'svg':
+                if is_gap:
+                    return ''.join(iter_gap_svg(doc, precision=precision))
+                return ''.join(iter_gfont_svg(doc, precision=precision, cache=self.path_cache))
+            elif format == 'json':
+                return json_dumps(gap_to_json(doc, compact) if is_gap else gfont_to_json(doc, compact))
+            elif format == 'jsonl' and not is_gap:
+                return ''.join(iter_gfont_jsonl(doc, compact))
+            raise Exception('Unsupported export format "{}"'.format(format))
+
+    def render(self, path, code, size=64, precision=None):
+        """A glyph of a font as standalone SVG document."""
+        code = _code(code)
+        precision = None if precision is None else int(precision)
+        with self.documents.use(self._check(path)) as doc:
+            if not isinstance(doc, kvenjoy.gfont.Font):
+                raise Exception('Not a font "{}"'.format(path))
+            g = doc.glyphs.get(code)
+            if g is None:
+                raise KeyError('No glyph U+{:04X} in "{}"'.format(code, path))
+            return ''.join(iter_glyph_svg(g, doc.boundary, int(size), precision, self.path_cache))
+
+    def stats(self):
+        """Statistics of caches."""
+        s = self.documents.stats()
+        return {'documents': s.size, 'hits': s.hits, 'misses': s.misses,
+                'paths': len(self.path_cache), 'path_hits': self.path_cache.hits,
+                'path_misses': self.path_cache.misses}
+
+    def _check(self, path):
+        if self.root is not None:
+            real = os.path.realpath(path)
+            if os.path.commonpath([self.root, real]) != self.root:
+                raise PermissionError('"{}" is out of served directory'.format(path))
+        return path
+
+def _flag(v):
+    if isinstance(v, str):
+        return v.lower() in ('1', 'true', 'yes')
+    return bool(v)
+
+def _code(v):
+    # Accept a number, a single character, "U+4E2D" or "0x4e2d"
+    if isinstance(v, int):
+        return v
+    m = re.match(r'^(?:[uU]\+|0[xX])([0-9a-fA-F]+)$', v)
+    if m:
+        return int(m.group(1), 16)
+    if v.isdigit():
+        return int(v)
+    if len(v) == 1:
+        return ord(v)
+    raise Exception('Invalid character "{}"'.format(v))
+
+# Media types of texts by export format
+_CONTENT_TYPES = {'svg': 'image/svg+xml', 'json': 'application/json', 'jsonl': 'application/x-ndjson'}
+
+def _content_type(request, result):
+    # Texts are either rendered glyphs (SVG) or exported documents, other
+    # results are sent as JSON
+    if not isinstance(result, str):
+        return 'application/json'
+    if request['op'] == 'render':
+        return _CONTENT_TYPES['svg']
+    return _CONTENT_TYPES[request.get('format', 'svg')]
+
+def _error_status(e):
+    if isinstance(e, (FileNotFoundError, KeyError)):
+        return 404
+    if isinstance(e, PermissionError):
+        return 403
+    return 400
+
+def _error_message(e):
+    if isinstance(e, KeyError) and e.args:
+        return str(e.args[0])
+    return str(e)
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered by {"result": ...} or {"error": ...}
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json_loads(line)
+                if not isinstance(request, dict):
+                    raise Exception('Request must be a JSON object')
+                o = {'result': self.server.service.handle(request)}
+            except Exception as e:
+                o = {'error': _error_message(e), 'status': _error_status(e)}
+            self.wfile.write(json_dumps(o).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        self.service = service
+        super().__init__(path, _UnixHandler)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(OSError):
+            os.remove(self.server_address)
+
+class _HTTPHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        request = dict(urllib.parse.parse_qsl(url.query))
+        request['op'] = url.path.strip('/')
+        try:
+            result = self.server.service.handle(request)
+            status = 200
+            content_type = _content_type(request, result)
+            body = result if isinstance(result, str) else json_dumps(result)
+        except Exception as e:
+            status = _error_status(e)
+            content_type = 'application/json'
+            body = json_dumps({'error': _error_message(e)})
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, _HTTPHandler)
+
+def make_unix_server(path, service):
+    """Create a server listening on a Unix socket.
+
+    A stale socket file (nobody listening) is removed first.
+
+    Arguments:
+    path    -- Path of the socket.
+    service -- The Service object.
+    return  -- socketserver.BaseServer, call serve_forever() to run it.
+    """
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(path)
+            except ConnectionRefusedError:
+                os.remove(path)
+            else:
+                raise Exception('Socket "{}" is in use'.format(path))
+    return _UnixServer(path, service)
+
+def make_http_server(host, port, service, verbose=False):
+    """Create a HTTP server.
+
+    Arguments:
+    host    -- Address to listen on (e.g. '127.0.0.1').
+    port    -- Port to listen on, 0 for any free port.
+    service -- The Service object.
+    verbose -- Log requests to stderr.
+    return  -- socketserver.BaseServer, call serve_forever() to run it.
+    """
+    return _HTTPServer((host, port), service, verbose)
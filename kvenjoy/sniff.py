@@ -0,0 +1,111 @@
+"""
+Detects format and version of GFONT/GAP files from their first bytes.
+
+A GFONT file starts with format version and header size (big endian
+integers), a GAP file is gzipped and starts with format version and header
+strings once decompressed. Both are validated so that other files are
+rejected right away rather than after a costly load fails.
+
+Results are cached per file and reused as long as size, modification time
+and inode of the file stay the same.
+"""
+import os
+import zlib
+import struct
+import functools
+import collections
+
+FileInfo = collections.namedtuple('FileInfo', ('type', 'version'))
+
+# Known GFONT format versions, GAP files of any version are parsed the same
+GFONT_VERSIONS = range(1, 8)
+
+# Size of the first read, enough for a GAP version behind a gzip header with
+# file name (at most 255 bytes on common file systems)
+_HEAD_SIZE = 4096
+
+_ints = struct.Struct('>2i')
+
+# GAP version, 4 UTF-8 strings (16-bit size first) and number of variables
+_GAP_HEADER_MAX = 4 + 4 * (2 + 0xffff) + 4
+
+def sniff(head, size=None):
+    """Detect format of a file from its first bytes.
+
+    Arguments:
+    head   -- First bytes of the file (at least 8 bytes unless the file is smaller).
+    size   -- Total size of the file, None if not known.
+    return -- FileInfo(type, version), type is either 'gfont' or 'gap'.
+    """
+    if head[:3] == b'\x1f\x8b\x08':
+        # GZIP magic and DEFLATE method
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = d.decompress(head, _GAP_HEADER_MAX)
+        except zlib.error as e:
+            raise Exception('Bad GAP file ({})'.format(e))
+        return FileInfo('gap', _check_gap_header(data, d.eof))
+
+    if len(head) < _ints.size:
+        raise Exception('Unknown file format (too small)')
+    (version, header_size) = _ints.unpack_from(head, 0)
+    if version not in GFONT_VERSIONS:
+        raise Exception('Unknown file format')
+    # Header fields take 20 bytes at least, encrypted header is made of
+    # 64-bit blocks
+    if header_size < 20 or (version >= 5 and header_size % 8 != 0) or \
+       (size is not None and header_size > size - 2 * _ints.size):
+        raise Exception('Bad GFONT header size {}'.format(header_size))
+    return FileInfo('gfont', version)
+
+def _check_gap_header(data, complete):
+    """Validate header fields of decompressed GAP content.
+
+    Fields beyond the data are not checked unless the data is complete.
+
+    Arguments:
+    data     -- Beginning of decompressed content.
+    complete -- The data is the whole decompressed content.
+    return   -- Format version.
+    """
+    if len(data) < 4:
+        raise Exception('Bad GAP file (truncated)')
+    (version,) = struct.unpack_from('>i', data, 0)
+    offset = 4
+    for i in range(4):
+        if offset + 2 > len(data):
+            break
+        (size,) = struct.unpack_from('>H', data, offset)
+        offset += 2
+        if offset + size > len(data):
+            break
+        try:
+            str(data[offset:offset + size], 'utf-8')
+        except UnicodeDecodeError:
+            raise Exception('Bad GAP file (invalid header string)')
+        offset += size
+    else:
+        if offset + 4 <= len(data):
+            (num_vars,) = struct.unpack_from('>i', data, offset)
+            if num_vars < 0:
+                raise Exception('Bad GAP file (negative number of variables)')
+            return version
+    if complete:
+        raise Exception('Bad GAP file (truncated)')
+    return version
+
+def detect(path):
+    """Detect format of a file (see sniff), with a single small read.
+
+    Arguments:
+    path   -- Path of the file.
+    return -- FileInfo(type, version).
+    """
+    st = os.stat(path)
+    return _detect(os.path.abspath(path), st.st_ino, st.st_size, st.st_mtime_ns)
+
+@functools.lru_cache(maxsize=4096)
+def _detect(path, ino, size, mtime):
+    with open(path, 'rb') as f:
+        head = f.read(_HEAD_SIZE)
+    return sniff(head, size)
@@ -1,8 +1,131 @@
 """
 Implements a 16-round [TEA](https://en.wikipedia.org/wiki/Tiny_Encryption_Algorithm).
+
+Besides single block encryption/decryption, a KeySchedule could be used to
+process many 64-bit blocks at once. NumPy is used to process blocks in batch if
+it is available, otherwise a pure Python loop is used. NumPy is only imported
+once there are enough blocks to make it worthwhile.
 """
 import struct
 
+_DELTA = 0x9e3779b9
+_ROUNDS = 16
+_SUMS = tuple((_DELTA * (i + 1)) & 0xffffffff for i in range(_ROUNDS))
+
+# Minimum number of blocks to make NumPy worthwhile
+_NUMPY_MIN_BLOCKS = 32
+
+_numpy = None
+
+def _import_numpy():
+    """Import NumPy on first use, return the module or None if not available."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+class KeySchedule:
+    """Unpacked TEA key which could be reused for many blocks.
+
+    Blocks are passed around either as a pair of 32-bit integers (x0, x1) or as
+    'bytes'/'bytearray' buffers of multiple of 64 bits.
+    """
+
+    def __init__(self, key):
+        """Arguments:
+        key -- Encryption/decryption key (128 bits).
+        """
+        self.words = struct.unpack_from('>4I', key, 0)
+
+    def encrypt_words(self, x0, x1):
+        """Encrypt a block given as two 32-bit integers.
+
+        Arguments:
+        x0, x1 -- Plaintext block (big endian words).
+        return -- Ciphertext block as (x0, x1).
+        """
+        (k0, k1, k2, k3) = self.words
+        for s in _SUMS:
+            x0 = (x0 + ((((x1 << 4) + k0) ^ (x1 + s) ^ ((x1 >> 5) + k1)))) & 0xffffffff
+            x1 = (x1 + ((((x0 << 4) + k2) ^ (x0 + s) ^ ((x0 >> 5) + k3)))) & 0xffffffff
+        return (x0, x1)
+
+    def decrypt_words(self, x0, x1):
+        """Decrypt a block given as two 32-bit integers.
+
+        Arguments:
+        x0, x1 -- Ciphertext block (big endian words).
+        return -- Plaintext block as (x0, x1).
+        """
+        (k0, k1, k2, k3) = self.words
+        for s in reversed(_SUMS):
+            x1 = (x1 - ((((x0 << 4) + k2) ^ (x0 + s) ^ ((x0 >> 5) + k3)))) & 0xffffffff
+            x0 = (x0 - ((((x1 << 4) + k0) ^ (x1 + s) ^ ((x1 >> 5) + k1)))) & 0xffffffff
+        return (x0, x1)
+
+    def encrypt_blocks(self, plain):
+        """Encrypt many independent blocks.
+
+        Arguments:
+        plain  -- Plaintext buffer, size must be multiple of 64 bits.
+        return -- Ciphertext buffer (bytearray).
+        """
+        if len(plain) >= 8 * _NUMPY_MIN_BLOCKS:
+            numpy = _import_numpy()
+            if numpy is not None:
+                return self._process_numpy(numpy, plain, True)
+        return self._process(plain, self.encrypt_words)
+
+    def decrypt_blocks(self, cipher):
+        """Decrypt many independent blocks.
+
+        Arguments:
+        cipher -- Ciphertext buffer, size must be multiple of 64 bits.
+        return -- Plaintext buffer (bytearray).
+        """
+        if len(cipher) >= 8 * _NUMPY_MIN_BLOCKS:
+            numpy = _import_numpy()
+            if numpy is not None:
+                return self._process_numpy(numpy, cipher, False)
+        return self._process(cipher, self.decrypt_words)
+
+    def _process(self, src, func):
+        if len(src) % 8 != 0:
+            raise Exception('Buffer size {} is not multiple of 8'.format(len(src)))
+        dst = bytearray(len(src))
+        offset = 0
+        pack_into = struct.pack_into
+        for (x0, x1) in struct.iter_unpack('>2I', src):
+            pack_into('>2I', dst, offset, *func(x0, x1))
+            offset += 8
+        return dst
+
+    def _process_numpy(self, numpy, src, encrypting):
+        if len(src) % 8 != 0:
+            raise Exception('Buffer size {} is not multiple of 8'.format(len(src)))
+        words = numpy.frombuffer(src, dtype='>u4').astype(numpy.uint32)
+        x0 = words[0::2].copy()
+        x1 = words[1::2].copy()
+        (k0, k1, k2, k3) = (numpy.uint32(k) for k in self.words)
+        if encrypting:
+            for s in _SUMS:
+                s = numpy.uint32(s)
+                x0 += ((x1 << 4) + k0) ^ (x1 + s) ^ ((x1 >> 5) + k1)
+                x1 += ((x0 << 4) + k2) ^ (x0 + s) ^ ((x0 >> 5) + k3)
+        else:
+            for s in reversed(_SUMS):
+                s = numpy.uint32(s)
+                x1 -= ((x0 << 4) + k2) ^ (x0 + s) ^ ((x0 >> 5) + k3)
+                x0 -= ((x1 << 4) + k0) ^ (x1 + s) ^ ((x1 >> 5) + k1)
+        words = numpy.empty(len(words), dtype='>u4')
+        words[0::2] = x0
+        words[1::2] = x1
+        return bytearray(words.tobytes())
+
 def encrypt(plain, key):
     """Encrypt given plaintext block (64 bits).
 
@@ -10,19 +133,12 @@ def encrypt(plain, key):
 
     Arguments:
     plain  -- Plaintext to be encrypted (64 bits).
-    key    -- Encryption key (128 bits).
+    key    -- Encryption key (128 bits) or a KeySchedule.
     return -- Ciphertext (64 bits).
     """
     (x0, x1) = struct.unpack_from('>2I', plain, 0)
-    (k0, k1, k2, k3) = struct.unpack_from('>4I', key, 0)
-    d = 0x9e3779b9
-    s = 0
-    for i in range(16):
-        s = _m32(s + d)
-        x0 = _m32(x0 + _m32((_lshift(x1, 4) + k0) ^ (x1 + s) ^ (_rshift(x1, 5) + k1)))
-        x1 = _m32(x1 + _m32((_lshift(x0, 4) + k2) ^ (x0 + s) ^ (_rshift(x0, 5) + k3)))
     bs = bytearray(8)
-    struct.pack_into('>2I', bs, 0, x0, x1)
+    struct.pack_into('>2I', bs, 0, *key_schedule(key).encrypt_words(x0, x1))
     return bs
 
 def decrypt(cipher, key):
@@ -32,26 +148,35 @@ def decrypt(cipher, key):
 
     Arguments:
     cipher -- Ciphertext to be decrypt (64 bits).
-    key    -- Decryption key (128 bits).
+    key    -- Decryption key (128 bits) or a KeySchedule.
     return -- Plaintext (64 bits).
     """
     (x0, x1) = struct.unpack_from('>2I', cipher, 0)
-    (k0, k1, k2, k3) = struct.unpack_from('>4I', key, 0)
-    d = 0x9e3779b9
-    s = _m32(d * 16)
-    for i in range(16):
-        x1 = _m32(x1 - _m32(_m32(_lshift(x0, 4) + k2) ^ _m32(x0 + s) ^ _m32(_rshift(x0, 5) + k3)))
-        x0 = _m32(x0 - _m32(_m32(_lshift(x1, 4) + k0) ^ _m32(x1 + s) ^ _m32(_rshift(x1, 5) + k1)))
-        s = _m32(s - d)
     bs = bytearray(8)
-    struct.pack_into('>2I', bs, 0, x0, x1)
+    struct.pack_into('>2I', bs, 0, *key_schedule(key).decrypt_words(x0, x1))
     return bs
 
-def _m32(x):
-    return x & 0xffffffff
+def encrypt_blocks(plain, key):
+    """Encrypt many independent plaintext blocks (multiple of 64 bits).
 
-def _lshift(x, n):
-    return _m32(x << n)
+    Arguments:
+    plain  -- Plaintext to be encrypted.
+    key    -- Encryption key (128 bits) or a KeySchedule.
+    return -- Ciphertext (bytearray).
+    """
+    return key_schedule(key).encrypt_blocks(plain)
+
+def decrypt_blocks(cipher, key):
+    """Decrypt many independent ciphertext blocks (multiple of 64 bits).
+
+    Arguments:
+    cipher -- Ciphertext to be decrypted.
+    key    -- Decryption key (128 bits) or a KeySchedule.
+    return -- Plaintext (bytearray).
+    """
+    return key_schedule(key).decrypt_blocks(cipher)
 
-def _rshift(x, n):
-    return _m32((x % 0x100000000) >> n)
+def key_schedule(key):
+    if isinstance(key, KeySchedule):
+        return key
+    return KeySchedule(key)
@@ -1,12 +1,30 @@
 import unittest
 import random
 import io
+import gzip
+import os
+import tempfile
+import struct
+import kvenjoy
+import zipfile
+import subprocess
+import sys
+import time
+import socket
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from array import array
 import kvenjoy.tea
 import kvenjoy.cipher
 import kvenjoy.io
+import kvenjoy.sniff
 from kvenjoy.gfont import *
 from kvenjoy.gap import *
 from kvenjoy.converter import *
+from kvenjoy.catalog import Catalog
+from kvenjoy.server import Service, make_unix_server, make_http_server
 
 class TestTEA(unittest.TestCase):
     plain = bytes([2, 0, 0, 9, 0, 2, 1, 6])
@@ -21,6 +39,21 @@ class TestTEA(unittest.TestCase):
         p = kvenjoy.tea.decrypt(TestTEA.cipher, TestTEA.key)
         self.assertEqual(p, TestTEA.plain)
 
+    def test_key_schedule(self):
+        ks = kvenjoy.tea.KeySchedule(TestTEA.key)
+        self.assertEqual(kvenjoy.tea.encrypt(TestTEA.plain, ks), TestTEA.cipher)
+        self.assertEqual(kvenjoy.tea.decrypt(TestTEA.cipher, ks), TestTEA.plain)
+
+    def test_blocks(self):
+        ks = kvenjoy.tea.KeySchedule(TestTEA.key)
+        for n in (0, 1, 7, 100):
+            plain = bytes([random.randint(0, 255) for x in range(n * 8)])
+            c = kvenjoy.tea.encrypt_blocks(plain, ks)
+            self.assertEqual(c, b''.join(kvenjoy.tea.encrypt(plain[i:i + 8], ks) for i in range(0, len(plain), 8)))
+            self.assertEqual(kvenjoy.tea.decrypt_blocks(c, TestTEA.key), plain)
+        self.assertEqual(kvenjoy.tea.encrypt_blocks(TestTEA.plain * 64, ks), TestTEA.cipher * 64)
+        self.assertRaises(Exception, kvenjoy.tea.encrypt_blocks, bytes(7), ks)
+
 class TestCipher(unittest.TestCase):
     key = bytes([1, 9, 8, 9, 0, 8, 2, 6, 1, 9, 9, 2, 0, 8, 2, 8])
 
@@ -32,12 +65,63 @@ class TestCipher(unittest.TestCase):
             self.assertEqual(','.join([' {:02x}'.format(x) for x in p]),
                              ','.join([' {:02x}'.format(x) for x in plain]))
 
+    def test_buffer_inputs(self):
+        plain = bytes(range(100))
+        c = kvenjoy.cipher.encrypt(memoryview(plain), TestCipher.key)
+        self.assertEqual(len(c), 112)
+        self.assertEqual(kvenjoy.cipher.decrypt(bytes(c), TestCipher.key), plain)
+        self.assertEqual(kvenjoy.cipher.decrypt(memoryview(c), TestCipher.key), plain)
+
+    def _chunks(self, buf):
+        chunks = []
+        i = 0
+        while i < len(buf):
+            n = random.randint(0, 20)
+            chunks.append(buf[i:i + n])
+            i += n
+        return chunks
+
+    def test_streaming(self):
+        for i in range(64):
+            plain = bytes([random.randint(0, 255) for x in range(i)])
+            encryptor = kvenjoy.cipher.Encryptor(TestCipher.key, len(plain))
+            c = bytearray()
+            for chunk in self._chunks(plain):
+                c.extend(encryptor.update(chunk))
+            c.extend(encryptor.finalize())
+            self.assertEqual(kvenjoy.cipher.decrypt(c, TestCipher.key), plain)
+
+            decryptor = kvenjoy.cipher.Decryptor(TestCipher.key)
+            p = bytearray()
+            for chunk in self._chunks(bytes(c)):
+                p.extend(decryptor.update(chunk))
+            p.extend(decryptor.finalize())
+            self.assertEqual(p, plain)
+
+    def test_streaming_size_mismatch(self):
+        encryptor = kvenjoy.cipher.Encryptor(TestCipher.key, 4)
+        encryptor.update(b'abc')
+        self.assertRaises(Exception, encryptor.finalize)
+        self.assertRaises(Exception, encryptor.update, b'de')
+
 class TestIO(unittest.TestCase):
     def test_read_byte(self):
         stm = io.BytesIO(bytes(range(16)))
         bs = kvenjoy.io.read_byte(stm, 16)
         self.assertEqual(bs, (0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x0e, 0x0f))
 
+    def test_skip(self):
+        class Stream:
+            def __init__(self, bs):
+                self.stm = io.BytesIO(bs)
+            def read(self, size):
+                return self.stm.read(size)
+        for stm in (io.BytesIO(bytes(range(8))), Stream(bytes(range(8))), kvenjoy.io.BinaryReader(bytes(range(8)))):
+            kvenjoy.io.skip(stm, 5)
+            self.assertEqual(stm.read(3), bytes([5, 6, 7]))
+        with self.assertRaises(Exception):
+            kvenjoy.io.skip(Stream(bytes(4)), 5)
+
     def test_write_byte(self):
         stm = io.BytesIO(bytearray())
         kvenjoy.io.write_byte(stm, 0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x0e, 0x0f)
@@ -73,6 +157,16 @@ class TestIO(unittest.TestCase):
         kvenjoy.io.write_float(stm, 1978, 1981, 1999, 2001)
         self.assertEqual(stm.getvalue(),bytes([0x44, 0xf7, 0x40, 0x00, 0x44, 0xf7, 0xa0, 0x00, 0x44, 0xf9, 0xe0, 0x00, 0x44, 0xfa, 0x20, 0x00]))
 
+    def test_read_float_array(self):
+        stm = io.BytesIO(bytes([0x44, 0xf7, 0x40, 0x00, 0x44, 0xf7, 0xa0, 0x00, 0x44, 0xf9, 0xe0, 0x00, 0x44, 0xfa, 0x20, 0x00]))
+        floats = kvenjoy.io.read_float_array(stm, 4)
+        self.assertEqual(floats.tolist(), [1978, 1981, 1999, 2001])
+
+    def test_write_float_array(self):
+        stm = io.BytesIO(bytearray())
+        kvenjoy.io.write_float_array(stm, array('f', [1978, 1981, 1999, 2001]))
+        self.assertEqual(stm.getvalue(),bytes([0x44, 0xf7, 0x40, 0x00, 0x44, 0xf7, 0xa0, 0x00, 0x44, 0xf9, 0xe0, 0x00, 0x44, 0xfa, 0x20, 0x00]))
+
     def test_read_c_string(self):
         stm = io.BytesIO(bytes([0x59, 0x49, 0x4e, 0x00, 0x59, 0x41, 0x4e, 0x47, 0x00]))
         strings = kvenjoy.io.read_c_string(stm, 2)
@@ -103,40 +197,142 @@ class TestIO(unittest.TestCase):
         kvenjoy.io.write_raw_string(stm, b'YIN', b'\xedANG')
         self.assertEqual(stm.getvalue(), bytes([0x00, 0x03, 0x59, 0x49, 0x4e, 0x00, 0x04, 0xed, 0x41, 0x4e, 0x47]))
 
+    def test_binary_reader(self):
+        r = kvenjoy.io.BinaryReader(bytes([0x00, 0x01, 0x02, 0x03, 0x00, 0x03, 0x59, 0x49, 0x4e, 0x59, 0x41, 0x4e, 0x47, 0x00,
+                                           0x44, 0xf7, 0x40, 0x00, 0x44, 0xf7, 0xa0, 0x00]))
+        self.assertEqual(kvenjoy.io.read_short(r, 2), (0x0001, 0x0203))
+        self.assertEqual(r.read_utf_string(), ('YIN',))
+        self.assertEqual(kvenjoy.io.read_c_string(r), ('YANG',))
+        self.assertEqual(kvenjoy.io.read_float_array(r, 1).tolist(), [1978])
+        self.assertEqual(r.remaining(), 4)
+        self.assertEqual(r.read(), bytes([0x44, 0xf7, 0xa0, 0x00]))
+        self.assertRaises(Exception, r.read_int)
+
+    def test_stream_reader(self):
+        content = bytes([0x00, 0x01, 0x02, 0x03, 0x00, 0x03, 0x59, 0x49, 0x4e, 0x59, 0x41, 0x4e, 0x47, 0x00,
+                         0x44, 0xf7, 0x40, 0x00, 0x44, 0xf7, 0xa0, 0x00, 0x01, 0x02, 0x03])
+        for buffer_size in (1, 3, 64):
+            r = kvenjoy.io.StreamReader(io.BytesIO(content), buffer_size)
+            self.assertEqual(kvenjoy.io.read_short(r, 2), (0x0001, 0x0203))
+            self.assertEqual(r.read_utf_string(), ('YIN',))
+            self.assertEqual(kvenjoy.io.read_c_string(r), ('YANG',))
+            self.assertEqual(kvenjoy.io.read_float_array(r, 2).tolist(), [1978, 1981])
+            kvenjoy.io.skip(r, 1)
+            self.assertEqual(r.read(1), bytes([0x02]))
+            self.assertEqual(r.read(), bytes([0x03]))
+            self.assertRaises(Exception, r.read_int)
+
+            r = kvenjoy.io.StreamReader(io.BytesIO(content), buffer_size)
+            self.assertEqual(r.read_byte(), (0x00,))
+            self.assertEqual(r.read(20), content[1:21])
+            r.skip(2)
+            self.assertEqual(r.read(5), content[23:])
+
+    def test_binary_writer(self):
+        w = kvenjoy.io.BinaryWriter()
+        kvenjoy.io.write_short(w, 0x0001, 0x0203)
+        w.write_utf_string('YIN')
+        kvenjoy.io.write_c_string(w, 'YANG')
+        w.write_float_array(array('f', [1978]))
+        self.assertEqual(w.getvalue(), bytes([0x00, 0x01, 0x02, 0x03, 0x00, 0x03, 0x59, 0x49, 0x4e, 0x59, 0x41, 0x4e, 0x47, 0x00,
+                                              0x44, 0xf7, 0x40, 0x00]))
+
+class TestGraph(unittest.TestCase):
+    def test_stroke_buffers(self):
+        s = Stroke([Point(1, 2), BezierPoint(3, 4, 5, 6, 7, 8), Point(9, 10)])
+        self.assertEqual(s.floats.tolist(), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(s.cmds, bytes([0, 2, 1]))
+        self.assertEqual(len(s.points), 3)
+        self.assertIsInstance(s.points[1], BezierPoint)
+        self.assertEqual((s.points[1].cx2, s.points[1].y), (5, 8))
+
+    def test_stroke_points_immutable(self):
+        s = Stroke([Point(1, 2), BezierPoint(3, 4, 5, 6, 7, 8)])
+        with self.assertRaises(AttributeError):
+            s.points[0].x = 0
+        with self.assertRaises(AttributeError):
+            s.points[1].cx1 = 0
+        with self.assertRaises(AttributeError):
+            s.points.append(Point(9, 10))
+        s.points = s.points + (Point(9, 10),)
+        self.assertEqual(s.floats.tolist(), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+
+    def test_stroke_bounding_box(self):
+        s = Stroke([Point(0.0, 0.0), Point(10.0, -5.0), Point(4.0, 8.0)])
+        self.assertEqual(s.bounding_box(), (0.0, -5.0, 10.0, 8.0))
+        self.assertIs(s.bounding_box(), s.bounding_box())
+
+        # Extrema of the curve rather than its control points
+        s.points = [Point(0.0, 0.0), BezierPoint(0.0, 100.0, 100.0, 100.0, 100.0, 0.0)]
+        (x0, y0, x1, y1) = s.bounding_box()
+        self.assertEqual((x0, y0, x1), (0.0, 0.0, 100.0))
+        self.assertAlmostEqual(y1, 75.0)
+        s.points = [Point(0.0, 0.0), BezierPoint(-30.0, 10.0, 20.0, 10.0, 10.0, 0.0)]
+        (x0, y0, x1, y1) = s.bounding_box()
+        self.assertLess(x0, 0.0)
+        self.assertGreater(x0, -30.0)
+        self.assertAlmostEqual(y1, 7.5)
+        self.assertEqual(Stroke([]).bounding_box(), (None, None, None, None))
+
+    def test_stroke_list(self):
+        strokes = [
+            Stroke([Point(1, 2), Point(3, 4)]),
+            Stroke([Point(5, 6), BezierPoint(7, 8, 9, 10, 11, 12)]),
+            Stroke([Point(13, 14)])
+        ]
+        stm = io.BytesIO()
+        Stroke.save_list(stm, strokes)
+        stm.seek(0)
+        strokes1 = Stroke.load_list(stm)
+        self.assertEqual(len(strokes1), 3)
+        for (s, s1) in zip(strokes, strokes1):
+            self.assertEqual(s.floats, s1.floats)
+            self.assertEqual(s.cmds, s1.cmds)
+
+    def test_stroke_list_unknown_command(self):
+        stm = io.BytesIO()
+        kvenjoy.io.write_int(stm, 2)
+        kvenjoy.io.write_float(stm, 1, 2)
+        kvenjoy.io.write_int(stm, 1)
+        kvenjoy.io.write_byte(stm, 3)
+        stm.seek(0)
+        self.assertRaises(Exception, Stroke.load_list, stm)
+
 class TestGFont(unittest.TestCase):
+    gfont_content = bytes([
+        0x00, 0x00, 0x00, 0x07, 0x00, 0x00, 0x00, 0x70, 0x44, 0x62, 0x13, 0x7e, 0x0e, 0xd6, 0x64, 0x3f,
+        0x50, 0xf6, 0x03, 0x3a, 0xd0, 0xd0, 0x44, 0x12, 0xe6, 0x79, 0xb7, 0x23, 0x45, 0xb1, 0x4a, 0x5c,
+        0x55, 0x5b, 0x68, 0x51, 0x17, 0x91, 0x57, 0xe0, 0x6e, 0x7b, 0x7c, 0x98, 0xb0, 0xec, 0x64, 0x00,
+        0x01, 0x07, 0x59, 0x97, 0xf3, 0xf5, 0x28, 0x6e, 0xff, 0xc8, 0x55, 0x62, 0x22, 0xa1, 0x9b, 0xf7,
+        0xee, 0xdd, 0x4a, 0x3a, 0xc4, 0x7a, 0xa8, 0xcc, 0xd7, 0x73, 0xfe, 0x66, 0x44, 0xef, 0x04, 0x0d,
+        0x64, 0x5d, 0x76, 0x4c, 0xa0, 0xb2, 0x22, 0xbc, 0x6a, 0x39, 0x6f, 0x5a, 0x8f, 0xf0, 0xe8, 0x07,
+        0xa0, 0x60, 0x9d, 0xa0, 0x2a, 0xba, 0xab, 0x8a, 0xf7, 0xe8, 0xef, 0xdf, 0x92, 0xea, 0x9a, 0x28,
+        0x06, 0xae, 0x1c, 0x29, 0xa3, 0x78, 0x17, 0x67, 0x00, 0x00, 0x00, 0x02, 0x00, 0x21, 0x00, 0x00,
+        0x00, 0x08, 0xbe, 0xff, 0xff, 0xfe, 0xc2, 0x94, 0x00, 0x00, 0xc1, 0xab, 0xff, 0xff, 0xc2, 0x36,
+        0x00, 0x02, 0xc2, 0x3b, 0xff, 0xff, 0xc2, 0xbf, 0x00, 0x00, 0xc2, 0x79, 0xff, 0xfe, 0xc2, 0x8f,
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00, 0x02, 0x00, 0x22, 0x00, 0x00, 0x00, 0x04, 0x00, 0x00,
+        0x00, 0x00, 0xc2, 0x98, 0x00, 0x00, 0xc2, 0x45, 0xff, 0xfe, 0xc2, 0x97, 0x00, 0x00, 0x00, 0x00,
+        0x00, 0x02, 0x00, 0x01, 0x50, 0x4b, 0x03, 0x04, 0x14, 0x00, 0x08, 0x08, 0x08, 0x00, 0x5a, 0x4b,
+        0xac, 0x52, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00,
+        0x00, 0x00, 0x33, 0x33, 0x63, 0x50, 0x64, 0x60, 0x60, 0xe0, 0xd8, 0xf7, 0xff, 0xff, 0xbf, 0x43,
+        0x53, 0x18, 0x18, 0x0e, 0xae, 0xfe, 0xff, 0xff, 0x90, 0x19, 0x03, 0xd3, 0x21, 0x6b, 0x20, 0xbd,
+        0x9f, 0x81, 0xe1, 0x50, 0x25, 0x50, 0xbc, 0x9f, 0x01, 0x04, 0x98, 0x18, 0x98, 0x00, 0x50, 0x4b,
+        0x07, 0x08, 0x7b, 0x0d, 0x8f, 0xd5, 0x2a, 0x00, 0x00, 0x00, 0x2c, 0x00, 0x00, 0x00, 0x50, 0x4b,
+        0x03, 0x04, 0x14, 0x00, 0x08, 0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0x00, 0x00, 0x00, 0x00,
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x33, 0x34, 0x63, 0x50,
+        0x62, 0x60, 0x60, 0x60, 0x01, 0x62, 0x86, 0x43, 0x33, 0x80, 0xd8, 0xf5, 0xff, 0xbf, 0x43, 0xd3,
+        0x41, 0x3c, 0x06, 0x26, 0x06, 0x46, 0x00, 0x50, 0x4b, 0x07, 0x08, 0xa1, 0x80, 0xb5, 0x73, 0x19,
+        0x00, 0x00, 0x00, 0x1c, 0x00, 0x00, 0x00, 0x50, 0x4b, 0x01, 0x02, 0x14, 0x00, 0x14, 0x00, 0x08,
+        0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0x7b, 0x0d, 0x8f, 0xd5, 0x2a, 0x00, 0x00, 0x00, 0x2c,
+        0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x33, 0x33, 0x50, 0x4b, 0x01, 0x02, 0x14, 0x00, 0x14, 0x00, 0x08,
+        0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0xa1, 0x80, 0xb5, 0x73, 0x19, 0x00, 0x00, 0x00, 0x1c,
+        0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+        0x00, 0x5a, 0x00, 0x00, 0x00, 0x33, 0x34, 0x50, 0x4b, 0x05, 0x06, 0x00, 0x00, 0x00, 0x00, 0x02,
+        0x00, 0x02, 0x00, 0x60, 0x00, 0x00, 0x00, 0xa3, 0x00, 0x00, 0x00, 0x00, 0x00])
+
     def test_load(self):
-        gfont_content = bytes([
-            0x00, 0x00, 0x00, 0x07, 0x00, 0x00, 0x00, 0x70, 0x44, 0x62, 0x13, 0x7e, 0x0e, 0xd6, 0x64, 0x3f,
-            0x50, 0xf6, 0x03, 0x3a, 0xd0, 0xd0, 0x44, 0x12, 0xe6, 0x79, 0xb7, 0x23, 0x45, 0xb1, 0x4a, 0x5c,
-            0x55, 0x5b, 0x68, 0x51, 0x17, 0x91, 0x57, 0xe0, 0x6e, 0x7b, 0x7c, 0x98, 0xb0, 0xec, 0x64, 0x00,
-            0x01, 0x07, 0x59, 0x97, 0xf3, 0xf5, 0x28, 0x6e, 0xff, 0xc8, 0x55, 0x62, 0x22, 0xa1, 0x9b, 0xf7,
-            0xee, 0xdd, 0x4a, 0x3a, 0xc4, 0x7a, 0xa8, 0xcc, 0xd7, 0x73, 0xfe, 0x66, 0x44, 0xef, 0x04, 0x0d,
-            0x64, 0x5d, 0x76, 0x4c, 0xa0, 0xb2, 0x22, 0xbc, 0x6a, 0x39, 0x6f, 0x5a, 0x8f, 0xf0, 0xe8, 0x07,
-            0xa0, 0x60, 0x9d, 0xa0, 0x2a, 0xba, 0xab, 0x8a, 0xf7, 0xe8, 0xef, 0xdf, 0x92, 0xea, 0x9a, 0x28,
-            0x06, 0xae, 0x1c, 0x29, 0xa3, 0x78, 0x17, 0x67, 0x00, 0x00, 0x00, 0x02, 0x00, 0x21, 0x00, 0x00,
-            0x00, 0x08, 0xbe, 0xff, 0xff, 0xfe, 0xc2, 0x94, 0x00, 0x00, 0xc1, 0xab, 0xff, 0xff, 0xc2, 0x36,
-            0x00, 0x02, 0xc2, 0x3b, 0xff, 0xff, 0xc2, 0xbf, 0x00, 0x00, 0xc2, 0x79, 0xff, 0xfe, 0xc2, 0x8f,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00, 0x02, 0x00, 0x22, 0x00, 0x00, 0x00, 0x04, 0x00, 0x00,
-            0x00, 0x00, 0xc2, 0x98, 0x00, 0x00, 0xc2, 0x45, 0xff, 0xfe, 0xc2, 0x97, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x02, 0x00, 0x01, 0x50, 0x4b, 0x03, 0x04, 0x14, 0x00, 0x08, 0x08, 0x08, 0x00, 0x5a, 0x4b,
-            0xac, 0x52, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00,
-            0x00, 0x00, 0x33, 0x33, 0x63, 0x50, 0x64, 0x60, 0x60, 0xe0, 0xd8, 0xf7, 0xff, 0xff, 0xbf, 0x43,
-            0x53, 0x18, 0x18, 0x0e, 0xae, 0xfe, 0xff, 0xff, 0x90, 0x19, 0x03, 0xd3, 0x21, 0x6b, 0x20, 0xbd,
-            0x9f, 0x81, 0xe1, 0x50, 0x25, 0x50, 0xbc, 0x9f, 0x01, 0x04, 0x98, 0x18, 0x98, 0x00, 0x50, 0x4b,
-            0x07, 0x08, 0x7b, 0x0d, 0x8f, 0xd5, 0x2a, 0x00, 0x00, 0x00, 0x2c, 0x00, 0x00, 0x00, 0x50, 0x4b,
-            0x03, 0x04, 0x14, 0x00, 0x08, 0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x33, 0x34, 0x63, 0x50,
-            0x62, 0x60, 0x60, 0x60, 0x01, 0x62, 0x86, 0x43, 0x33, 0x80, 0xd8, 0xf5, 0xff, 0xbf, 0x43, 0xd3,
-            0x41, 0x3c, 0x06, 0x26, 0x06, 0x46, 0x00, 0x50, 0x4b, 0x07, 0x08, 0xa1, 0x80, 0xb5, 0x73, 0x19,
-            0x00, 0x00, 0x00, 0x1c, 0x00, 0x00, 0x00, 0x50, 0x4b, 0x01, 0x02, 0x14, 0x00, 0x14, 0x00, 0x08,
-            0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0x7b, 0x0d, 0x8f, 0xd5, 0x2a, 0x00, 0x00, 0x00, 0x2c,
-            0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x00, 0x00, 0x00, 0x00, 0x33, 0x33, 0x50, 0x4b, 0x01, 0x02, 0x14, 0x00, 0x14, 0x00, 0x08,
-            0x08, 0x08, 0x00, 0x5a, 0x4b, 0xac, 0x52, 0xa1, 0x80, 0xb5, 0x73, 0x19, 0x00, 0x00, 0x00, 0x1c,
-            0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-            0x00, 0x5a, 0x00, 0x00, 0x00, 0x33, 0x34, 0x50, 0x4b, 0x05, 0x06, 0x00, 0x00, 0x00, 0x00, 0x02,
-            0x00, 0x02, 0x00, 0x60, 0x00, 0x00, 0x00, 0xa3, 0x00, 0x00, 0x00, 0x00, 0x00])
-        stm = io.BytesIO(gfont_content)
+        stm = io.BytesIO(TestGFont.gfont_content)
         font = Font.load(stm)
         self.assertEqual(font.version, 7)
         self.assertEqual(font.vendor, 'kvenjoy')
@@ -176,6 +372,260 @@ class TestGFont(unittest.TestCase):
         self.assertEqual(s.points[1].x, -49.49999237060547)
         self.assertEqual(s.points[1].y, -75.5)
 
+    def test_glyph_bounding_box(self):
+        s = Stroke([Point(0.0, 0.0), Point(10.0, -5.0)])
+        g = Glyph(0x21, [s, Stroke([Point(-1.0, 2.0)])])
+        self.assertEqual(g.bounding_box(), (-1.0, -5.0, 10.0, 2.0))
+        s.points = [Point(0.0, 0.0), Point(20.0, -5.0)]
+        self.assertEqual(g.bounding_box(), (-1.0, -5.0, 20.0, 2.0))
+        g.strokes = []
+        self.assertEqual(g.bounding_box(), (None, None, None, None))
+
+    def test_load_preview(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        self.assertIsNone(font.preview)
+        font = Font.load(io.BytesIO(TestGFont.gfont_content), keep_preview=True)
+        self.assertEqual([g.code for g in font.preview], [0x21, 0x22])
+        self.assertEqual(font.preview[0].strokes[0].points[1].x, -62.49999237060547)
+
+        # Skipping a glyph consumes exactly what loading it does
+        stm = io.BytesIO()
+        font.preview[0].save(stm)
+        font.preview[1].save(stm)
+        for s in (io.BytesIO(stm.getvalue()), BinaryReader(stm.getvalue())):
+            self.assertEqual(Glyph.skip(s), 0x21)
+            self.assertEqual(Glyph.load(s).code, 0x22)
+            self.assertEqual(s.read(), b'')
+
+    def test_load_lazy(self):
+        stm = io.BytesIO(TestGFont.gfont_content)
+        font = Font.load(stm, lazy=True, cache_size=1)
+        self.assertEqual(font.name, 'Test')
+        self.assertEqual(len(font.glyphs), 2)
+        self.assertEqual(font.glyphs.codes(), [0x21, 0x22])
+        self.assertIsNone(font.glyphs.get(0x23))
+
+        g = font.glyphs.get(0x22)
+        self.assertEqual(g.code, 0x22)
+        self.assertIs(font.glyphs[1], g)
+        self.assertEqual(font.glyphs[1].strokes[0].points[1].x, -49.49999237060547)
+        self.assertEqual([g1.code for g1 in font.glyphs], [0x21, 0x22])
+        # Evicted but still referenced, so that changes to it are not lost
+        self.assertIs(font.glyphs.get(0x22), g)
+
+    def test_load_parallel(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        font1 = Font.load(io.BytesIO(TestGFont.gfont_content), workers=2)
+        self.assertEqual([g.code for g in font1.glyphs], [g.code for g in font.glyphs])
+        for (g, g1) in zip(font.glyphs, font1.glyphs):
+            self.assertEqual(len(g.strokes), len(g1.strokes))
+            for (s, s1) in zip(g.strokes, g1.strokes):
+                self.assertEqual(s.floats, s1.floats)
+                self.assertEqual(s.cmds, s1.cmds)
+
+    def test_open_font(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'test.gfont')
+            with open(fn, 'wb') as f:
+                f.write(TestGFont.gfont_content)
+            with open_font(fn) as font:
+                self.assertEqual(font.uuid, '379865e6-84d8-4310-b227-45249f5afb44')
+                self.assertEqual(font.glyphs.get(0x21).strokes[0].points[0].y, -74.0)
+            font = open_font(fn, lazy=False)
+            self.assertEqual([g.code for g in font.glyphs], [0x21, 0x22])
+
+    def test_save_parallel(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        stm = io.BytesIO()
+        font.save(stm)
+        for (workers, level) in ((2, 9), (2, 0), (None, 1)):
+            stm1 = io.BytesIO()
+            font.save(stm1, workers=workers, compresslevel=level)
+            stm1.seek(0)
+            font1 = Font.load(stm1)
+            self.assertEqual([g.code for g in font1.glyphs], [0x21, 0x22])
+            for (g, g1) in zip(font.glyphs, font1.glyphs):
+                for (s, s1) in zip(g.strokes, g1.strokes):
+                    self.assertEqual(s.floats, s1.floats)
+                    self.assertEqual(s.cmds, s1.cmds)
+            stm1.seek(0)
+            z = zipfile.ZipFile(stm1)
+            self.assertIsNone(z.testzip())
+        stm1 = io.BytesIO()
+        font.save(stm1, workers=2)
+        self.assertEqual(len(stm1.getvalue()), len(stm.getvalue()))
+
+    def test_save_incremental(self):
+        def compress_sizes(bs):
+            return {zi.filename: zi.compress_size for zi in zipfile.ZipFile(io.BytesIO(bs)).infolist()}
+        sizes = compress_sizes(TestGFont.gfont_content)
+
+        for font in (Font.load(io.BytesIO(TestGFont.gfont_content)),
+                     Font.load(io.BytesIO(TestGFont.gfont_content), workers=2)):
+            self.assertIsNotNone(font.glyphs[0].member)
+            font.glyphs[1].strokes = [Stroke([Point(1.0, 2.0), Point(3.0, 4.0)])]
+            stm = io.BytesIO()
+            font.save(stm, compresslevel=0)
+            sizes1 = compress_sizes(stm.getvalue())
+            # Untouched glyph is copied as is, the edited one is stored at level 0
+            self.assertEqual(sizes1['33'], sizes['33'])
+            self.assertNotEqual(sizes1['34'], sizes['34'])
+            stm.seek(0)
+            font1 = Font.load(stm)
+            self.assertEqual(font1.glyphs[0].strokes[0].floats, font.glyphs[0].strokes[0].floats)
+            self.assertEqual(font1.glyphs[1].strokes[0].points[1].x, 3.0)
+
+        # In-place changes are detected as well
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        font.glyphs[0].strokes[0].points = [Point(5.0, 6.0), Point(7.0, 8.0)]
+        stm = io.BytesIO()
+        font.save(stm, compresslevel=0)
+        self.assertNotEqual(compress_sizes(stm.getvalue())['33'], sizes['33'])
+        stm.seek(0)
+        self.assertEqual(Font.load(stm).glyphs[0].strokes[0].points[1].x, 7.0)
+
+        # Unchanged content is copied even if glyph was modified back and forth
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        font.glyphs[0].strokes = list(font.glyphs[0].strokes)
+        stm = io.BytesIO()
+        font.save(stm, compresslevel=0)
+        self.assertEqual(compress_sizes(stm.getvalue()), sizes)
+        stm = io.BytesIO()
+        font.save(stm, compresslevel=0, reuse=False)
+        self.assertNotEqual(compress_sizes(stm.getvalue()), sizes)
+
+        # Glyphs not accessed in lazy mode are copied without being parsed
+        font = Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True)
+        font.glyphs.get(0x21).code = 0x23
+        stm = io.BytesIO()
+        font.save(stm, compresslevel=0)
+        sizes1 = compress_sizes(stm.getvalue())
+        self.assertEqual(sorted(sizes1), ['34', '35'])
+        self.assertEqual(sizes1['34'], sizes['34'])
+        stm.seek(0)
+        self.assertEqual([g.code for g in Font.load(stm).glyphs], [0x23, 0x22])
+
+    def test_save_lazy_evicted(self):
+        # Changed glyphs survive eviction from the cache of parsed glyphs
+        font = Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True, cache_size=1)
+        font.glyphs.get(0x21).strokes[0].points = [Point(5.0, 6.0), Point(7.0, 8.0)]
+        font.glyphs.get(0x22)
+        g = font.glyphs.get(0x22)
+        font.glyphs.get(0x21)
+        g.code = 0x23
+        font.glyphs.get(0x21)
+        self.assertEqual(len(font.glyphs._cache), 1)
+        stm = io.BytesIO()
+        font.save(stm)
+        stm.seek(0)
+        font1 = Font.load(stm)
+        self.assertEqual([g.code for g in font1.glyphs], [0x21, 0x23])
+        self.assertEqual(font1.glyphs[0].strokes[0].points[1].x, 7.0)
+
+        # So are glyphs whose buffers were modified in place
+        font = Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True, cache_size=1)
+        font.glyphs.get(0x21).strokes[0].floats[2] = 9.0
+        font.glyphs.get(0x22)
+        self.assertEqual(len(font.glyphs._edited), 1)
+        stm = io.BytesIO()
+        font.save(stm)
+        stm.seek(0)
+        self.assertEqual(Font.load(stm).glyphs[0].strokes[0].points[1].cx1, 9.0)
+
+        # Unchanged glyphs are not kept
+        font = Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True, cache_size=1)
+        for g in font.glyphs:
+            pass
+        self.assertEqual(len(font.glyphs._edited), 0)
+
+    def test_font_writer(self):
+        class Sink:
+            def __init__(self):
+                self.chunks = []
+            def write(self, bs):
+                self.chunks.append(bytes(bs))
+                return len(bs)
+
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        header = (font.version, font.vendor, font.type, font.name, font.author, font.description,
+                  font.boundary, font.password, font.unknown, font.uuid)
+        def glyphs(n):
+            for i in range(n):
+                yield Glyph(0x4e00 + i, [Stroke([Point(float(i), 0.0), Point(0.0, float(i))])])
+
+        # Number of glyphs is patched into header of a seekable stream
+        for workers in (None, 2):
+            stm = io.BytesIO()
+            with FontWriter(stm, *header, workers=workers) as w:
+                w.write_glyphs(glyphs(45))
+            stm.seek(0)
+            font1 = Font.load(stm)
+            self.assertEqual(font1.uuid, font.uuid)
+            self.assertEqual([g.code for g in font1.glyphs], list(range(0x4e00, 0x4e00 + 45)))
+            self.assertEqual(font1.glyphs[44].strokes[0].points[0].x, 44.0)
+
+            # Only the first 30 glyphs are non-zipped
+            stm.seek(0)
+            read_int(stm)
+            (header_size,) = read_int(stm)
+            stm.seek(header_size, io.SEEK_CUR)
+            self.assertEqual(read_int(stm), (30,))
+            for i in range(30):
+                self.assertEqual(Glyph.load(stm).code, 0x4e00 + i)
+            self.assertEqual(stm.read(4), b'PK\x03\x04')
+
+        # Non-seekable stream requires number of glyphs in advance
+        sink = Sink()
+        with self.assertRaises(Exception):
+            FontWriter(sink, *header)
+        with FontWriter(sink, *header, num_glyphs=3) as w:
+            for g in glyphs(3):
+                w.write(g)
+        font1 = Font.load(io.BytesIO(b''.join(sink.chunks)))
+        self.assertEqual(len(font1.glyphs), 3)
+        w = FontWriter(Sink(), *header, num_glyphs=3)
+        w.write_glyphs(glyphs(2))
+        with self.assertRaises(Exception):
+            w.close()
+
+        # Non-zipped glyphs of a lazily loaded font are taken from zipped files
+        def preview_block(bs):
+            (header_size,) = struct.unpack_from('>I', bs, 4)
+            return bs[8 + header_size:bs.index(b'PK\x03\x04')]
+        stm = io.BytesIO()
+        font.save(stm)
+        stm1 = io.BytesIO()
+        Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True).save(stm1)
+        self.assertEqual(preview_block(stm1.getvalue()), preview_block(stm.getvalue()))
+        font1 = Font.load(io.BytesIO(stm1.getvalue()))
+        self.assertEqual([g.code for g in font1.glyphs], [0x21, 0x22])
+
+    def test_subset(self):
+        def compress_sizes(bs):
+            return {zi.filename: zi.compress_size for zi in zipfile.ZipFile(io.BytesIO(bs)).infolist()}
+        sizes = compress_sizes(TestGFont.gfont_content)
+
+        for lazy in (True, False):
+            font = Font.load(io.BytesIO(TestGFont.gfont_content), lazy=lazy)
+            stm = io.BytesIO()
+            self.assertEqual(font.subset(stm, [0x22, 0x4e2d]), 1)
+            if lazy:
+                # Selected by name of zipped files, nothing is parsed
+                self.assertEqual(len(font.glyphs._cache), 0)
+            self.assertEqual(compress_sizes(stm.getvalue()), {'34': sizes['34']})
+            stm.seek(0)
+            font1 = Font.load(stm, keep_preview=True)
+            self.assertEqual(font1.name, font.name)
+            self.assertEqual(font1.uuid, font.uuid)
+            self.assertEqual([g.code for g in font1.glyphs], [0x22])
+            self.assertEqual([g.code for g in font1.preview], [0x22])
+            self.assertEqual(font1.glyphs[0].strokes[0].floats, font.glyphs[1].strokes[0].floats)
+
+        stm = io.BytesIO()
+        self.assertEqual(Font.load(io.BytesIO(TestGFont.gfont_content), lazy=True).subset(stm, []), 0)
+        stm.seek(0)
+        self.assertEqual(len(Font.load(stm).glyphs), 0)
+
     def test_save(self):
         version = 7
         vendor = 'kvenjoy'
@@ -374,7 +824,264 @@ class TestGAP(unittest.TestCase):
         self.assertEqual(sg[0].points[1].x, 77.0)
         self.assertEqual(sg[0].points[1].y, -93.0)
 
+    def test_open_gap(self):
+        variables = [Variable(-72.0, 15.0, 'V1')]
+        stroke_groups = [[Stroke([Point(-202.0, -113.0), Point(23.0, -112.0)])]]
+        gap = Gap(1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description', variables, stroke_groups)
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'test.gap')
+            with open(fn, 'wb') as f:
+                gap.save(f)
+            gap = open_gap(fn)
+        self.assertEqual(gap.name, 'test')
+        self.assertEqual(gap.variables[0].name, 'V1')
+        self.assertEqual(gap.stroke_groups[0][0].points[1].x, 23.0)
+
+    def test_bounding_box(self):
+        gap = Gap(1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description',
+                  [Variable(-72.0, 15.0, 'V1')], [[Stroke([Point(-10.0, -113.0), Point(23.0, 30.0)])]])
+        self.assertEqual(gap.bounding_box(), (-72.0, -113.0, 23.0, 30.0))
+        gap.stroke_groups.append([Stroke([Point(0.0, 0.0), BezierPoint(0.0, 100.0, 100.0, 100.0, 100.0, 0.0)])])
+        self.assertEqual(gap.bounding_box(), (-72.0, -113.0, 100.0, 75.0))
+        gap.stroke_groups[0][0].points = [Point(-10.0, -120.0)]
+        self.assertEqual(gap.bounding_box(), (-72.0, -120.0, 100.0, 75.0))
+        gap.variables = []
+        gap.stroke_groups = []
+        self.assertEqual(gap.bounding_box(), (None, None, None, None))
+
+    def test_iter_stroke_groups(self):
+        variables = [Variable(-72.0, 15.0, 'V1'), Variable(54.0, 16.0, 'V2')]
+        stroke_groups = [[Stroke([Point(float(i), 0.0), Point(0.0, float(i))])] for i in range(100)]
+        gap = Gap(1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description', variables, stroke_groups)
+        stm = io.BytesIO()
+        gap.save(stm)
+        groups = Gap.iter_stroke_groups(io.BytesIO(stm.getvalue()))
+        self.assertEqual(next(groups)[0].points[1].y, 0.0)
+        self.assertEqual([sg[0].points[0].x for sg in groups], [float(i) for i in range(1, 100)])
+
+        # Multi-member GZIP is decompressed as a whole
+        bs = stm.getvalue()
+        cut = len(bs) // 2
+        raw = gzip.decompress(bs)
+        gap1 = Gap.load(io.BytesIO(gzip.compress(raw[:cut]) + gzip.compress(raw[cut:])))
+        self.assertEqual(gap1.variables[1].name, 'V2')
+        self.assertEqual(len(gap1.stroke_groups), 100)
+
+    def test_load_header(self):
+        gap = Gap(1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description', [], [])
+        stm = io.BytesIO()
+        gap.save(stm)
+        stm.seek(0)
+        self.assertEqual(Gap.load_header(stm), (1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description'))
+
+class TestSniff(unittest.TestCase):
+    def test_sniff(self):
+        self.assertEqual(kvenjoy.sniff.sniff(TestGFont.gfont_content), ('gfont', 7))
+        self.assertEqual(kvenjoy.sniff.sniff(TestGFont.gfont_content[:8], len(TestGFont.gfont_content)), ('gfont', 7))
+        stm = io.BytesIO()
+        Gap(1, '', 'test', '', '', [], []).save(stm)
+        self.assertEqual(kvenjoy.sniff.sniff(stm.getvalue()), ('gap', 1))
+        stm = io.BytesIO()
+        Gap(3, '', 'test', '', '', [], []).save(stm)
+        self.assertEqual(kvenjoy.sniff.sniff(stm.getvalue()), ('gap', 3))
+        # Header strings beyond the first bytes are not checked
+        stm = io.BytesIO()
+        Gap(1, '', 'x' * 60000, '', '', [], []).save(stm)
+        self.assertEqual(kvenjoy.sniff.sniff(stm.getvalue()[:40]), ('gap', 1))
+
+        bad = [b'', b'PK\x03\x04' + bytes(60), struct.pack('>2i', 8, 64), struct.pack('>2i', 7, 63),
+               struct.pack('>2i', 7, 1 << 20), gzip.compress(struct.pack('>i', 2)), b'\x1f\x8b\x08' + bytes(7),
+               gzip.compress(struct.pack('>iH2s', 1, 2, b'\xff\xfe') + bytes(10)),
+               gzip.compress(struct.pack('>i4Hi', 1, 0, 0, 0, 0, -1))]
+        for head in bad:
+            self.assertRaises(Exception, kvenjoy.sniff.sniff, head, 1024)
+
+    def test_detect(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'test.gap')
+            with open(fn, 'wb') as f:
+                f.write(TestGFont.gfont_content)
+            self.assertEqual(kvenjoy.sniff.detect(fn), ('gfont', 7))
+            with open(fn, 'wb') as f:
+                Gap(1, '', 'test', '', '', [], []).save(f)
+            os.utime(fn, ns=(0, 0))
+            self.assertEqual(kvenjoy.sniff.detect(fn).type, 'gap')
+
+class TestCatalog(unittest.TestCase):
+    def test_update_and_find(self):
+        gap = Gap(1, 'c3668f19-0ca4-4929-af60-98e0db960533', 'test', 'Author', 'Description', [], [])
+        with tempfile.TemporaryDirectory() as d:
+            os.mkdir(os.path.join(d, 'sub'))
+            font_fn = os.path.join(d, 'test.gfont')
+            with open(font_fn, 'wb') as f:
+                f.write(TestGFont.gfont_content)
+            with open(os.path.join(d, 'sub', 'test.gap'), 'wb') as f:
+                gap.save(f)
+            with open(os.path.join(d, 'sub', 'bad.gfont'), 'wb') as f:
+                f.write(b'bad')
+
+            with Catalog(os.path.join(d, 'index.sqlite')) as catalog:
+                self.assertEqual(catalog.update(d), (3, 0, 0, 0))
+                self.assertEqual(catalog.update(d), (0, 0, 0, 3))
+                files = catalog.files()
+                self.assertEqual([(f.type, f.name) for f in files], [('gfont', None), ('gap', 'test'), ('gfont', 'Test')])
+                self.assertIsNotNone(files[0].error)
+                self.assertEqual(files[2].uuid, '379865e6-84d8-4310-b227-45249f5afb44')
+                self.assertEqual(files[2].num_glyphs, 2)
+                self.assertEqual([f.path for f in catalog.find(0x22)], [font_fn])
+                self.assertEqual(catalog.find(0x4e2d), [])
+                self.assertEqual(catalog.coverage(font_fn), [0x21, 0x22])
+
+                # Changed files are read again, removed ones are dropped
+                font = Font.load(io.BytesIO(TestGFont.gfont_content))
+                font.glyphs[1].code = 0x4e2d
+                with open(font_fn, 'wb') as f:
+                    font.save(f)
+                os.utime(font_fn, ns=(0, 0))
+                os.remove(os.path.join(d, 'sub', 'bad.gfont'))
+                self.assertEqual(catalog.update(d), (0, 1, 1, 1))
+                self.assertEqual(catalog.find(0x22), [])
+                self.assertEqual([f.path for f in catalog.find(0x4e2d)], [font_fn])
+                self.assertEqual(catalog.coverage(font_fn), [0x21, 0x4e2d])
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.font_fn = os.path.join(self.dir.name, 'test.gfont')
+        with open(self.font_fn, 'wb') as f:
+            f.write(TestGFont.gfont_content)
+        self.gap_fn = os.path.join(self.dir.name, 'test.gap')
+        with open(self.gap_fn, 'wb') as f:
+            Gap(1, '', 'test', '', '', [], [[Stroke([Point(0, 1), Point(2, 3)])]]).save(f)
+        self.service = Service(cache_size=1, root=self.dir.name)
+
+    def tearDown(self):
+        self.service.close()
+        self.dir.cleanup()
+
+    def test_service(self):
+        service = self.service
+        self.assertEqual(service.handle({'op': 'dump', 'path': self.font_fn, 'codes': True})['codes'], [0x21, 0x22])
+        self.assertEqual(service.handle({'op': 'dump', 'path': self.font_fn})['num_glyphs'], 2)
+        self.assertEqual(service.handle({'op': 'stats'})['hits'], 1)
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        self.assertEqual(service.handle({'op': 'export', 'path': self.font_fn}), ''.join(gfont_to_svg(font)))
+        self.assertEqual(json_loads(service.handle({'op': 'export', 'path': self.font_fn, 'format': 'json'})),
+                         gfont_to_json(font))
+        svg = service.handle({'op': 'render', 'path': self.font_fn, 'code': 'U+0022', 'size': '128'})
+        self.assertTrue(svg.startswith('<svg version="1.1" width="128" height="128"'))
+        self.assertEqual(svg, ''.join(iter_glyph_svg(font.glyphs[1], font.boundary, 128)))
+        self.assertRaises(KeyError, service.handle, {'op': 'render', 'path': self.font_fn, 'code': 0x4e2d})
+        self.assertRaises(Exception, service.handle, {'op': 'render', 'path': self.font_fn})
+        self.assertRaises(Exception, service.handle, {'op': 'remove', 'path': self.font_fn})
+        self.assertRaises(PermissionError, service.handle, {'op': 'dump', 'path': __file__})
+
+        # Least recently used document is closed, changed files are reopened
+        self.assertEqual(service.handle({'op': 'dump', 'path': self.gap_fn})['num_strokes'], 1)
+        self.assertEqual(service.handle({'op': 'stats'})['documents'], 1)
+        with open(self.gap_fn, 'wb') as f:
+            Gap(1, '', 'test', '', '', [], []).save(f)
+        os.utime(self.gap_fn, ns=(0, 0))
+        self.assertEqual(service.handle({'op': 'dump', 'path': self.gap_fn})['num_strokes'], 0)
+        self.assertEqual(service.handle({'op': 'stats'})['misses'], 3)
+
+    def _serve(self, server):
+        t = threading.Thread(target=server.serve_forever)
+        t.start()
+        self.addCleanup(t.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def test_unix_server(self):
+        path = os.path.join(self.dir.name, 'ku.sock')
+        self._serve(make_unix_server(path, self.service))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+            f = s.makefile('rwb')
+            f.write(b'{"op": "dump", "path": "' + self.font_fn.encode() + b'"}\n\n[]\n')
+            f.flush()
+            self.assertEqual(json_loads(f.readline())['result']['name'], 'Test')
+            self.assertIn('error', json_loads(f.readline()))
+
+    def test_http_server(self):
+        server = make_http_server('127.0.0.1', 0, self.service)
+        self._serve(server)
+        url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        q = urllib.parse.urlencode({'path': self.font_fn, 'code': '"'})
+        with urllib.request.urlopen(url + 'render?' + q) as r:
+            self.assertEqual(r.headers['Content-Type'], 'image/svg+xml')
+            self.assertIn('<title>0022</title>', r.read().decode())
+        for (fmt, content_type) in (('svg', 'image/svg+xml'), ('json', 'application/json'),
+                                    ('jsonl', 'application/x-ndjson')):
+            q = urllib.parse.urlencode({'path': self.font_fn, 'format': fmt})
+            with urllib.request.urlopen(url + 'export?' + q) as r:
+                self.assertEqual(r.headers['Content-Type'], content_type)
+        with urllib.request.urlopen(url + 'stats') as r:
+            self.assertEqual(r.headers['Content-Type'], 'application/json')
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            urllib.request.urlopen(url + 'dump?' + urllib.parse.urlencode({'path': self.font_fn + 'x'}))
+        self.assertEqual(cm.exception.code, 404)
+
 class TestConverter(unittest.TestCase):
+    def test_stroke_to_svg(self):
+        s = Stroke([Point(-0.5, -74.0), BezierPoint(-21.5, -45.25, -47.0, -95.5, -62.0, 71.5), Point(0.0, 1.0)])
+        self.assertEqual(stroke_to_path_data(s), ' M -0.5 -74.0 C -21.5 -45.25, -47.0 -95.5, -62.0 71.5 L 0.0 1.0')
+        self.assertEqual(stroke_to_path_data(s, precision=1), ' M -0.5 -74 C -21.5 -45.2, -47 -95.5, -62 71.5 L 0 1')
+        self.assertEqual(stroke_to_path_data(s, precision=0), ' M 0 -74 C -22 -45, -47 -96, -62 72 L 0 1')
+        self.assertEqual(stroke_to_svg(s), ['<path d=" M -0.5 -74.0 C -21.5 -45.25, -47.0 -95.5, -62.0 71.5 L 0.0 1.0" '
+                                             'stroke="black" fill="transparent" vector-effect="non-scaling-stroke"/>'])
+        self.assertEqual(stroke_to_path_data(Stroke([])), '')
+        # Negative zeros, consecutive and at the end
+        s = Stroke([Point(-0.001, -0.001), Point(-10.0, -0.001), BezierPoint(-0.001, 0.5, -0.004, -0.001, 1.0, -0.001)])
+        self.assertEqual(stroke_to_path_data(s, precision=2), ' M 0 0 L -10 0 C 0 0.5, 0 0, 1 0')
+        self.assertEqual(stroke_to_path_data(s, precision=0), ' M 0 0 L -10 0 C 0 0, 0 0, 1 0')
+
+    def test_number_formatter(self):
+        self.assertEqual(number_formatter()(1.5), '1.5')
+        fmt = number_formatter(2)
+        self.assertEqual([fmt(v) for v in (1.0, 100.0, 10.5, 1.05, -0.001, 0.0, -150.125)],
+                         ['1', '100', '10.5', '1.05', '0', '0', '-150.12'])
+        fmt = number_formatter(0)
+        self.assertEqual([fmt(v) for v in (100.0, -0.4, 10.5)], ['100', '0', '10'])
+
+    def test_write_svg(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        for chunk_size in (1, 1 << 16):
+            stm = io.StringIO()
+            write_svg(stm, iter_gfont_svg(font), chunk_size)
+            self.assertEqual(stm.getvalue(), ''.join(gfont_to_svg(font)))
+        stm = io.StringIO()
+        write_svg(stm, iter_gfont_svg(font, precision=2))
+        self.assertIn('<path d=" M -0.5 -74 C -21.5 -45.5, -47 -95.5, -62.5 -71.5"', stm.getvalue())
+
+    def test_path_cache(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        expected = gfont_to_svg(font, precision=1)
+        cache = PathCache()
+        self.assertEqual(gfont_to_svg(font, precision=1, cache=cache), expected)
+        self.assertEqual(gfont_to_svg(font, precision=1, cache=cache), expected)
+        self.assertEqual((len(cache), cache.hits, cache.misses), (2, 2, 2))
+        # Least recently used glyph is evicted
+        cache = PathCache(max_size=1)
+        for g in font.glyphs + font.glyphs[-1:]:
+            cache.paths(g)
+        self.assertEqual((len(cache), cache.hits, cache.misses), (1, 1, 2))
+
+        # Key depends on content and precision only
+        g = font.glyphs[0]
+        same = Glyph(0xffff, [Stroke.from_buffers(s.floats, s.cmds) for s in g.strokes])
+        self.assertEqual(PathCache.key(same, 1), PathCache.key(g, 1))
+        self.assertNotEqual(PathCache.key(g, 2), PathCache.key(g, 1))
+        same.strokes[0].points = same.strokes[0].points[:-1]
+        self.assertNotEqual(PathCache.key(same, 1), PathCache.key(g, 1))
+
+        with tempfile.TemporaryDirectory() as d:
+            cache = PathCache(directory=d)
+            self.assertEqual(gfont_to_svg(font, cache=cache), gfont_to_svg(font))
+            cache = PathCache(directory=d)
+            self.assertEqual(gfont_to_svg(font, cache=cache), gfont_to_svg(font))
+            self.assertEqual((cache.hits, cache.misses), (2, 0))
+
     def test_gap_to_json(self):
         version = 1
         uuid = 'c3668f19-0ca4-4929-af60-98e0db960533'
@@ -534,5 +1241,259 @@ class TestConverter(unittest.TestCase):
                     else:
                         raise Exception('Unknown type "{}"'.format(type(p).__name__))
 
+    def test_font_json_compact(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        jo = gfont_to_json(font, compact=True)
+        self.assertEqual(jo['schema'], JSON_SCHEMA_COMPACT)
+        self.assertEqual(jo['glyphs'][0]['strokes'][0],
+                         {'floats': list(font.glyphs[0].strokes[0].floats), 'cmds': 'MC'})
+        for indent in (None, 2, 4):
+            decoded = gfont_from_json(json_loads(json_dumps(jo, indent)))
+            self.assertEqual(gfont_to_json(decoded), gfont_to_json(font))
+            self.assertIs(type(decoded.glyphs[0].strokes[0].floats), type(font.glyphs[0].strokes[0].floats))
+
+        gap = Gap(1, '', 'test', '', '', [], [[Stroke([Point(0, 1), Point(2, 3)])]])
+        jo = gap_to_json(gap, compact=True)
+        self.assertEqual(jo['stroke_groups'], [[{'floats': [0.0, 1.0, 2.0, 3.0], 'cmds': 'ML'}]])
+        self.assertEqual(gap_to_json(gap_from_json(jo)), gap_to_json(gap))
+
+        self.assertRaises(Exception, stroke_from_json, {'floats': [0.0, 1.0], 'cmds': 'X'})
+        self.assertRaises(Exception, stroke_from_json, {'floats': [0.0, 1.0, 2.0, 3.0], 'cmds': 'LM'})
+        self.assertRaises(Exception, stroke_from_json, {'floats': [0.0, 1.0, 2.0], 'cmds': 'ML'})
+        jo['schema'] = 3
+        self.assertRaises(Exception, gap_from_json, jo)
+
+    def test_font_jsonl(self):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        for compact in (False, True):
+            lines = list(iter_gfont_jsonl(font, compact))
+            self.assertEqual(len(lines), 1 + len(font.glyphs))
+            self.assertTrue(all(l.endswith('\n') and l.count('\n') == 1 for l in lines))
+            (header, glyphs) = read_gfont_jsonl([l.encode('utf-8') for l in lines[:1]] + ['\n'] + lines[1:])
+            self.assertEqual(header['num_glyphs'], len(font.glyphs))
+            header['glyphs'] = [glyph_to_json(g) for g in glyphs]
+            del header['num_glyphs']
+            self.assertEqual(gfont_to_json(gfont_from_json(header)), gfont_to_json(font))
+
+            # Glyphs stream into a font writer
+            (header, glyphs) = read_gfont_jsonl(lines)
+            stm = io.BytesIO()
+            with FontWriter(stm, header['version'], header['vendor'], header['type'], header['name'],
+                            header['author'], header['description'], header['boundary'], header['password'],
+                            bytes(header['unknown']), header['uuid'], header['num_glyphs']) as w:
+                w.write_glyphs(glyphs)
+            self.assertEqual(gfont_to_json(Font.load(io.BytesIO(stm.getvalue()))), gfont_to_json(font))
+        self.assertRaises(Exception, read_gfont_jsonl, lines[1:])
+        self.assertRaises(Exception, read_gfont_jsonl, [])
+
+class TestBatch(unittest.TestCase):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.files = []
+        for name in ('a.gfont', 'b.gfont'):
+            self.files.append(self.path(name))
+            with open(self.path(name), 'wb') as f:
+                f.write(TestGFont.gfont_content)
+        # Valid header, truncated archive
+        self.files.append(self.path('bad.gfont'))
+        with open(self.path('bad.gfont'), 'wb') as f:
+            f.write(TestGFont.gfont_content[:200])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.dir, *names)
+
+    def ku(self, *args, env=None):
+        env = dict(os.environ, PYTHONPATH=TestBatch.root, **(env or {}))
+        return subprocess.run([sys.executable, os.path.join(TestBatch.root, 'ku.py')] + list(args), env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def summary(self, name):
+        with open(self.path(name), 'rb') as f:
+            return json_loads(f.read())
+
+    def test_export_and_import(self):
+        # One bad file does not stop the others, but fails the command
+        p = self.ku('export', '-f', 'json', '-j', '2', '-o', self.path('json'), '--summary', self.path('export.json'),
+                    *self.files)
+        self.assertEqual(p.returncode, 1)
+        self.assertIn('1 failed', p.stderr)
+        jo = self.summary('export.json')
+        self.assertEqual((jo['command'], jo['jobs'], jo['succeeded'], jo['failed']), ('export', 2, 2, 1))
+        self.assertEqual([f['input'] for f in jo['files']], self.files)
+        self.assertEqual([f['error'] is None for f in jo['files']], [True, True, False])
+        self.assertEqual(sorted(os.listdir(self.path('json'))), ['a.gfont.json', 'b.gfont.json'])
+        with open(self.path('json', 'b.gfont.json'), 'rb') as f:
+            self.assertEqual(json_loads(f.read())['name'], 'Test')
+
+        p = self.ku('import', '-f', 'json', '-j', '2', '-o', self.path('gfont'), '--summary', self.path('import.json'),
+                    self.path('json', 'a.gfont.json'), self.path('json', 'b.gfont.json'))
+        self.assertEqual(p.returncode, 0, p.stderr)
+        jo = self.summary('import.json')
+        self.assertEqual((jo['succeeded'], jo['failed']), (2, 0))
+        self.assertEqual([f['output'] for f in jo['files']], [self.path('gfont', 'a.gfont'), self.path('gfont', 'b.gfont')])
+        font = open_font(self.path('gfont', 'b.gfont'), lazy=False)
+        self.assertEqual([g.code for g in font.glyphs], [0x21, 0x22])
+
+    def test_dump(self):
+        p = self.ku('dump', '-j', '2', '--summary', self.path('dump.json'), *self.files)
+        self.assertEqual(p.returncode, 1)
+        # Output of each file is kept together
+        self.assertEqual(p.stdout.count('Name\t\tTest'), 2)
+        self.assertRegex(p.stderr, r'FAILED\t.*bad.gfont')
+        jo = self.summary('dump.json')
+        self.assertEqual(jo['files'][2]['input'], self.files[2])
+        self.assertIsNotNone(jo['files'][2]['error'])
+
+        # A single file is summarized too
+        p = self.ku('dump', '--summary', self.path('dump1.json'), self.files[0])
+        self.assertEqual(p.returncode, 0, p.stderr)
+        jo = self.summary('dump1.json')
+        self.assertEqual((jo['succeeded'], jo['failed']), (1, 0))
+
+    def test_subset_in_place(self):
+        p = self.ku('subset', '--chars', '"', '-o', self.files[0], self.files[0])
+        self.assertEqual(p.returncode, 0, p.stderr)
+        self.assertEqual(os.listdir(self.dir).count('a.gfont'), 1)
+        self.assertEqual(len(os.listdir(self.dir)), 3)
+        font = open_font(self.files[0], lazy=False)
+        self.assertEqual([g.code for g in font.glyphs], [0x22])
+        font.close()
+
+    # Locale with ASCII encoding, UTF-8 mode disabled
+    ascii_locale = {'LC_ALL': 'C', 'PYTHONUTF8': '0', 'PYTHONCOERCECLOCALE': '0'}
+
+    def save_non_ascii(self, name):
+        font = Font.load(io.BytesIO(TestGFont.gfont_content))
+        font.name = '测试'
+        with open(self.path(name), 'wb') as f:
+            font.save(f)
+
+    def test_non_ascii_json(self):
+        self.save_non_ascii('c.gfont')
+        p = self.ku('export', '-f', 'json', '--no-indent', '-o', self.path('c.json'), '--summary', self.path('s.json'),
+                    self.path('c.gfont'), env=TestBatch.ascii_locale)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        self.assertEqual(self.summary('s.json')['succeeded'], 1)
+        p = self.ku('import', '-f', 'json', '-i', self.path('c.json'), self.path('d.gfont'), env=TestBatch.ascii_locale)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        with open_font(self.path('d.gfont')) as font:
+            self.assertEqual(font.name, '测试')
+
+    def test_non_ascii_jsonl(self):
+        self.save_non_ascii('c.gfont')
+        p = self.ku('export', '-f', 'jsonl', '-o', self.path('c.jsonl'), self.path('c.gfont'), env=TestBatch.ascii_locale)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        p = self.ku('import', '-f', 'jsonl', '-i', self.path('c.jsonl'), self.path('d.gfont'), env=TestBatch.ascii_locale)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        with open_font(self.path('d.gfont')) as font:
+            self.assertEqual(font.name, '测试')
+            self.assertEqual(font.glyphs.codes(), [0x21, 0x22])
+
+    def test_no_format(self):
+        p = self.ku('export', '-o', self.path('out'), *self.files[:2])
+        self.assertEqual(p.returncode, 2)
+        self.assertIn('-f/--format', p.stderr)
+        self.assertFalse(os.path.exists(self.path('out')))
+
+    def test_unknown_format(self):
+        # A single unrecognized file is reported without a traceback
+        with open(self.path('c.txt'), 'w') as f:
+            f.write('Not a font file at all, just some text.\n')
+        for args in (('dump',), ('export', '-f', 'svg', '-o', self.path('c.svg'))):
+            p = self.ku(*(args + (self.path('c.txt'),)))
+            self.assertEqual(p.returncode, 1)
+            self.assertEqual(p.stderr, '{}: Unknown file format\n'.format(self.path('c.txt')))
+        self.assertFalse(os.path.exists(self.path('c.svg')))
+
+    def test_serve_root(self):
+        # Only files under the current directory are served by default
+        os.mkdir(self.path('srv'))
+        with open(self.path('srv', 'c.gfont'), 'wb') as f:
+            f.write(TestGFont.gfont_content)
+        sock = self.path('ku.sock')
+        env = dict(os.environ, PYTHONPATH=TestBatch.root)
+        p = subprocess.Popen([sys.executable, os.path.join(TestBatch.root, 'ku.py'), 'serve', '-s', sock],
+                             cwd=self.path('srv'), env=env, stderr=subprocess.DEVNULL)
+        self.addCleanup(p.wait)
+        self.addCleanup(p.terminate)
+        for _ in range(100):
+            if os.path.exists(sock):
+                break
+            time.sleep(0.05)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(sock)
+            f = s.makefile('rwb')
+            f.write(b'{"op": "dump", "path": "c.gfont"}\n{"op": "dump", "path": "../a.gfont"}\n')
+            f.flush()
+            self.assertEqual(json_loads(f.readline())['result']['name'], 'Test')
+            self.assertIn('error', json_loads(f.readline()))
+
+class TestStartup(unittest.TestCase):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    # Generous budget of total import time (microseconds) of a dump
+    budget = 120000
+
+    # Modules that no dump needs
+    unneeded = ('kvenjoy.converter', 'json', 'concurrent.futures', 'numpy', 'sqlite3', 'http.server')
+
+    def importtime(self, *args):
+        # Return import times by module and modules loaded at exit (if listed
+        # on a "modules:" line of stderr)
+        env = dict(os.environ, PYTHONPATH=TestStartup.root)
+        p = subprocess.run([sys.executable, '-X', 'importtime'] + list(args), env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True, universal_newlines=True)
+        times = {}
+        modules = None
+        for line in p.stderr.splitlines():
+            if line.startswith('import time:') and 'self [us]' not in line:
+                (us, _, name) = line[len('import time:'):].split('|')
+                times[name.strip()] = int(us)
+            elif line.startswith('modules:'):
+                modules = set(line.split()[1:])
+        return (times, modules)
+
+    def dump(self, fn):
+        argv = [os.path.join(TestStartup.root, 'ku.py'), 'dump', fn]
+        code = ('import runpy, sys; sys.argv = {!r}; runpy.run_path(sys.argv[0], run_name="__main__"); '
+                'print("modules:", *sys.modules, file=sys.stderr)').format(argv)
+        return self.importtime('-c', code)
+
+    def test_lazy_package(self):
+        self.assertIs(kvenjoy.Font, kvenjoy.gfont.Font)
+        self.assertIs(kvenjoy.detect, kvenjoy.sniff.detect)
+        self.assertIn('open_gap', dir(kvenjoy))
+        self.assertRaises(AttributeError, getattr, kvenjoy, 'nothing')
+        (times, _) = self.importtime('-c', 'import kvenjoy')
+        self.assertEqual([m for m in times if m.startswith('kvenjoy.')], [])
+
+    def test_import_time(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'test.gap')
+            with open(fn, 'wb') as f:
+                Gap(1, '', 'test', '', '', [], []).save(f)
+            (times, modules) = self.dump(fn)
+        for m in ('kvenjoy.gfont', 'kvenjoy.cipher', 'zipfile') + TestStartup.unneeded:
+            self.assertNotIn(m, modules)
+        self.assertIn('kvenjoy.gap', modules)
+        self.assertLess(sum(times.values()), TestStartup.budget)
+
+        # Header of a GFONT v5+ is decrypted
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'test.gfont')
+            with open(fn, 'wb') as f:
+                f.write(TestGFont.gfont_content)
+            (times, modules) = self.dump(fn)
+        for m in ('kvenjoy.gap', 'zipfile') + TestStartup.unneeded:
+            self.assertNotIn(m, modules)
+        self.assertIn('kvenjoy.cipher', modules)
+        self.assertLess(sum(times.values()), TestStartup.budget)
+
 if __name__ == '__main__':
     unittest.main(),